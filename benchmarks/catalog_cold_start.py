@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import resource
+import tempfile
+import multiprocessing
+
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM belongs to the current address space, ru_maxrss survives exec and
+    # would report the peak of the parent that spawned us
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is reported in KB on linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != 'darwin' else 1024 ** 2)
+
+
+def _load_csv(track_path: str, artist_path: str):
+    from common.database.local_storage import LocalStorage
+    df_artists = LocalStorage.parse_artists_csv(artist_path)
+    df_tracks = LocalStorage.parse_tracks_csv(track_path)
+    return len(df_tracks), len(df_artists)
+
+
+def _load_snapshot(snapshot_path: str):
+    from common.database.catalog_snapshot import CatalogSnapshot
+    snapshot = CatalogSnapshot(snapshot_path)
+    df_artists = snapshot.read_artists()
+    df_tracks = snapshot.read_tracks()
+    return len(df_tracks), len(df_artists)
+
+
+def _measure(queue, loader, args):
+    import pandas  # noqa: F401 - import cost is not part of the load
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    rows = loader(*args)
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, _peak_rss_mb(), baseline_rss, rows))
+
+
+def run_isolated(loader, *args):
+    """Runs a loader in a fresh interpreter so that peak RSS is not shared between runs"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(queue, loader, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+@app.command()
+def main(
+    tracks_csv: str = None,
+    artists_csv: str = None,
+    synthetic_tracks: int = 200_000,
+    synthetic_artists: int = 50_000,
+    repeat: int = 3
+):
+    """Cold start of the catalog: CSV parsing vs binary columnar snapshot
+
+    Uses the given CSV files, or a synthetic catalog when none are given.
+    """
+    from common.database.local_storage import LocalStorage
+    from common.database.catalog_snapshot import CatalogSnapshot
+
+    workdir = tempfile.mkdtemp(prefix='catalog_bench_')
+
+    if tracks_csv is None or artists_csv is None:
+        from benchmarks.synthetic_catalog import write_synthetic_catalog
+        tracks_csv, artists_csv = write_synthetic_catalog(workdir, synthetic_tracks, synthetic_artists)
+
+    snapshot_path = os.path.join(workdir, 'snapshot')
+    CatalogSnapshot(snapshot_path).write(
+        df_tracks=LocalStorage.parse_tracks_csv(tracks_csv),
+        df_artists=LocalStorage.parse_artists_csv(artists_csv)
+    )
+
+    for name, loader, args in [
+        ('csv', _load_csv, (tracks_csv, artists_csv)),
+        ('snapshot', _load_snapshot, (snapshot_path,))
+    ]:
+        runs = [run_isolated(loader, *args) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run[0])
+        echo(
+            f"{name:>9}: {best[3][0]} tracks, {best[3][1]} artists | "
+            f"best of {repeat}: {best[0]:.2f}s | "
+            f"peak RSS {best[1]:.0f} MB (+{best[1] - best[2]:.0f} MB over interpreter)"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _latencies(search, queries: np.ndarray, batch: int):
+    """Run the queries in batches of the given size, latency of every batch"""
+    distances, neighbors, latencies = [], [], []
+    for start in range(0, len(queries), batch):
+        begin = time.perf_counter()
+        batch_distances, batch_neighbors = search(queries[start:start + batch])
+        latencies.append(time.perf_counter() - begin)
+        distances.append(batch_distances)
+        neighbors.append(batch_neighbors)
+    return np.array(latencies), np.vstack(distances), np.vstack(neighbors)
+
+
+@app.command()
+def main(
+    synthetic_tracks: int = 500_000,
+    synthetic_artists: int = 100_000,
+    catalog_sizes: str = '10000,100000,500000',
+    queries: int = 200,
+    pool_size: int = 8,
+    batch: int = 8,
+    k: int = 100
+):
+    """Exact kNN of the recommender (BlockWeightedCosineIndex) vs sklearn NearestNeighbors(metric='cosine')
+    fitted on the weighted vectors, across catalog sizes
+
+    Reports the fit time, the latency of single queries and of batches of queries (the eigen tracks of
+    a profile) and, on a fixed evaluation set, whether both return the same neighbors and distances.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    from benchmarks.float32_vectors import _evaluation_set
+    from benchmarks.synthetic_catalog import create_synthetic_catalog
+    from benchmarks.vector_build_scaling import _environment
+    from common.database.local_storage import LocalStorage
+    from common.database.track_store import TrackStore
+    from common.domain.models import Artist
+
+    df_tracks, df_artists = create_synthetic_catalog(synthetic_tracks, synthetic_artists)
+    df_tracks['id_artists'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_tracks['id_artists']]
+    df_artists['genres'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_artists['genres']]
+    df_tracks['release_date'] = df_tracks['release_date'].astype('datetime64[ns]')
+    artists = {record['id']: Artist(**record) for record in df_artists.to_dict(orient='records')}
+    tracks = TrackStore.from_frame(LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=artists))
+
+    workdir = tempfile.mkdtemp(prefix='exact_knn_bench_')
+    _environment(workdir, artists.keys())
+
+    from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    store = data_processor.construct_track_representation_vectors(tracks)
+
+    echo(f"{store.dimension} dimensions, {queries} queries, top {k}, batches of {batch}")
+    for size in [min(int(value), len(store)) for value in catalog_sizes.split(',')]:
+        matrix = store.matrix[:size]
+        evaluation_set = _evaluation_set(matrix, queries, pool_size)
+
+        start = time.perf_counter()
+        index = BlockWeightedCosineIndex(matrix, blocks=store.blocks)
+        index_fit = time.perf_counter() - start
+        column_weights = index.column_weights()
+
+        start = time.perf_counter()
+        model = NearestNeighbors(n_neighbors=k, metric='cosine').fit(matrix * column_weights)
+        sklearn_fit = time.perf_counter() - start
+
+        results = {
+            'sklearn': (sklearn_fit, lambda batch_queries: model.kneighbors(batch_queries * column_weights)),
+            'index': (index_fit, lambda batch_queries: index.kneighbors(batch_queries, n_neighbors=k))
+        }
+        echo(f"  {size} vectors")
+        outputs = {}
+        for name, (fit_seconds, search) in results.items():
+            single_latencies, distances, neighbors = _latencies(search, evaluation_set, 1)
+            batch_latencies, _, _ = _latencies(search, evaluation_set, batch)
+            outputs[name] = (distances, neighbors)
+            echo(
+                f"    {name:>7}: fit {fit_seconds * 1000:.1f}ms | query median {np.median(single_latencies) * 1000:.2f}ms, "
+                f"p95 {np.percentile(single_latencies, 95) * 1000:.2f}ms | batch of {batch} median "
+                f"{np.median(batch_latencies) * 1000:.2f}ms"
+            )
+
+        (sklearn_distances, sklearn_neighbors), (index_distances, index_neighbors) = outputs['sklearn'], outputs['index']
+        overlap = np.array([len(np.intersect1d(a, b)) / k for a, b in zip(sklearn_neighbors, index_neighbors)])
+        echo(
+            f"    identical neighbor lists {np.mean((sklearn_neighbors == index_neighbors).all(axis=1)):.2%}, "
+            f"mean overlap {overlap.mean():.4f} | max distance difference "
+            f"{np.abs(sklearn_distances - index_distances).max():.2e}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _evaluation_set(matrix: np.ndarray, queries: int, pool_size: int) -> np.ndarray:
+    """Fixed evaluation queries: catalog vectors and centroids of random track pools (as eigen tracks)"""
+    rng = np.random.default_rng(23)
+    tracks = matrix[rng.choice(len(matrix), queries // 2, replace=False)]
+    pools = rng.integers(0, len(matrix), (queries - len(tracks), pool_size))
+    centroids = np.asarray(matrix, dtype=np.float64)[pools].mean(axis=1)
+    return np.concatenate([np.asarray(tracks, dtype=np.float64), centroids])
+
+
+def _knn(matrix: np.ndarray, queries: np.ndarray, k: int):
+    """Fit and query sklearn NearestNeighbors(metric='cosine'): one query at a time, in the dtype of the matrix"""
+    from sklearn.neighbors import NearestNeighbors
+
+    start = time.perf_counter()
+    model = NearestNeighbors(n_neighbors=k, metric='cosine').fit(matrix)
+    fit_seconds = time.perf_counter() - start
+
+    distances, neighbors, latencies = [], [], []
+    for query in queries.astype(matrix.dtype):
+        start = time.perf_counter()
+        query_distances, query_neighbors = model.kneighbors(query.reshape(1, -1), return_distance=True)
+        latencies.append(time.perf_counter() - start)
+        distances.append(query_distances[0])
+        neighbors.append(query_neighbors[0])
+    return fit_seconds, np.array(latencies), np.array(distances), np.array(neighbors)
+
+
+@app.command()
+def main(
+    synthetic_tracks: int = 500_000,
+    synthetic_artists: int = 100_000,
+    queries: int = 200,
+    pool_size: int = 8,
+    k: int = 100
+):
+    """Representation vectors stored and searched in float64 vs float32
+
+    Reports the size of the stored matrix, the kNN fit and query latency and, on a fixed
+    evaluation set, the overlap of the float32 top-k with the float64 top-k.
+    """
+    from benchmarks.synthetic_catalog import create_synthetic_catalog
+    from benchmarks.vector_build_scaling import _environment
+    from common.database.local_storage import LocalStorage
+    from common.database.track_store import TrackStore
+    from common.domain.models import Artist
+    from settings import get_settings
+
+    df_tracks, df_artists = create_synthetic_catalog(synthetic_tracks, synthetic_artists)
+    df_tracks['id_artists'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_tracks['id_artists']]
+    df_artists['genres'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_artists['genres']]
+    df_tracks['release_date'] = df_tracks['release_date'].astype('datetime64[ns]')
+    artists = {record['id']: Artist(**record) for record in df_artists.to_dict(orient='records')}
+    tracks = TrackStore.from_frame(LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=artists))
+
+    workdir = tempfile.mkdtemp(prefix='float32_vectors_bench_')
+    _environment(workdir, artists.keys())
+
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    results, evaluation_set = {}, None
+    for dtype in ['float64', 'float32']:
+        os.environ['track_representation_vectors_dtype'] = dtype
+        os.environ['track_representation_vectors_stored_path'] = os.path.join(workdir, f"vectors_{dtype}")
+        get_settings.cache_clear()
+
+        data_processor = DataProcessor()
+        data_processor.fit_normalizer(tracks)
+        store = data_processor.construct_track_representation_vectors(tracks)
+        # the same fixed queries for both dtypes
+        if evaluation_set is None:
+            evaluation_set = _evaluation_set(store.matrix, queries, pool_size)
+        results[dtype] = (store.matrix.nbytes, *_knn(store.matrix, evaluation_set, k))
+
+    echo(f"{len(store)} vectors of {store.dimension} dimensions, {queries} queries, top {k}")
+    for dtype, (nbytes, fit_seconds, latencies, _, _) in results.items():
+        echo(
+            f"  {dtype}: matrix {nbytes / 2 ** 20:.1f} MiB | fit {fit_seconds * 1000:.1f}ms | "
+            f"query median {np.median(latencies) * 1000:.2f}ms, p95 {np.percentile(latencies, 95) * 1000:.2f}ms"
+        )
+
+    _, _, _, distances_64, neighbors_64 = results['float64']
+    _, _, _, distances_32, neighbors_32 = results['float32']
+    overlap = np.array([len(np.intersect1d(a, b)) / k for a, b in zip(neighbors_64, neighbors_32)])
+    echo(
+        f"  top {k} overlap float32 vs float64: mean {overlap.mean():.4f}, min {overlap.min():.2f}, "
+        f"identical lists {np.mean((neighbors_64 == neighbors_32).all(axis=1)):.2%} | "
+        f"max distance difference {np.abs(distances_64 - distances_32).max():.2e}"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+import numpy as np
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+@app.command()
+def main(
+    synthetic_tracks: int = 500_000,
+    synthetic_artists: int = 100_000,
+    n_lists: str = '300,600,1200',
+    n_probes: str = '4,8,16,32,64',
+    weights: str = '{"genres": 3, "artist": 0.5}',
+    queries: int = 200,
+    pool_size: int = 8,
+    k: int = 100
+):
+    """Recall@k vs latency of the IVF index (IVFCosineIndex) against the exact one (BlockWeightedCosineIndex)
+
+    For every number of lists: the build time, then for every number of probed lists the
+    recall@k (share of the exact top k found) and the latency of single queries, with the
+    default block weights and with other weights (the lists are built for the default ones).
+    """
+    from benchmarks.float32_vectors import _evaluation_set
+    from benchmarks.synthetic_catalog import create_synthetic_catalog
+    from benchmarks.vector_build_scaling import _environment
+    from common.database.local_storage import LocalStorage
+    from common.database.track_store import TrackStore
+    from common.domain.models import Artist
+
+    df_tracks, df_artists = create_synthetic_catalog(synthetic_tracks, synthetic_artists)
+    df_tracks['id_artists'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_tracks['id_artists']]
+    df_artists['genres'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_artists['genres']]
+    df_tracks['release_date'] = df_tracks['release_date'].astype('datetime64[ns]')
+    artists = {record['id']: Artist(**record) for record in df_artists.to_dict(orient='records')}
+    tracks = TrackStore.from_frame(LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=artists))
+
+    workdir = tempfile.mkdtemp(prefix='ivf_recall_bench_')
+    _environment(workdir, artists.keys())
+
+    from recommender_system.algorithm.ivf_index import IVFCosineIndex
+    from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    store = data_processor.construct_track_representation_vectors(tracks)
+    evaluation_set = _evaluation_set(store.matrix, queries, pool_size)
+    exact = BlockWeightedCosineIndex(store.matrix, blocks=store.blocks)
+
+    def search(index, query_weights):
+        neighbors, latencies = [], []
+        for query in evaluation_set:
+            start = time.perf_counter()
+            neighbors.append(index.kneighbors(query, n_neighbors=k, weights=query_weights)[1][0])
+            latencies.append(time.perf_counter() - start)
+        return np.array(neighbors), np.array(latencies)
+
+    echo(f"{len(store)} vectors of {store.dimension} dimensions, {queries} queries, top {k}")
+    cases = {'default weights': None, f"weights {weights}": json.loads(weights)}
+    expected = {}
+    for case, query_weights in cases.items():
+        expected[case], latencies = search(exact, query_weights)
+        echo(f"  exact, {case}: query median {np.median(latencies) * 1000:.2f}ms, p95 {np.percentile(latencies, 95) * 1000:.2f}ms")
+
+    for lists in [int(value) for value in n_lists.split(',')]:
+        start = time.perf_counter()
+        ivf = IVFCosineIndex.build(exact, n_lists=lists)
+        ivf.save(store.path)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ivf = IVFCosineIndex.load(store.path, exact)
+        load_seconds = time.perf_counter() - start
+        list_sizes = np.diff(ivf.offsets)
+        echo(
+            f"  {lists} lists: build {build_seconds:.1f}s, load {load_seconds * 1000:.1f}ms | "
+            f"list size median {np.median(list_sizes):.0f}, max {list_sizes.max()}"
+        )
+
+        for n_probe in [int(value) for value in n_probes.split(',')]:
+            ivf.n_probe = n_probe
+            for case, query_weights in cases.items():
+                neighbors, latencies = search(ivf, query_weights)
+                recall = np.array([len(np.intersect1d(a, b)) / k for a, b in zip(expected[case], neighbors)])
+                echo(
+                    f"    n_probe {n_probe:>3}, {case}: recall@{k} mean {recall.mean():.4f}, min {recall.min():.2f} | "
+                    f"query median {np.median(latencies) * 1000:.2f}ms, p95 {np.percentile(latencies, 95) * 1000:.2f}ms"
+                )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+
+import numpy as np
+from pymongo import ReplaceOne
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _client(mongo_uri: str):
+    if mongo_uri is None:
+        import mongomock
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+    return MongoClient(mongo_uri)
+
+
+def _playlist_documents(playlist):
+    artists, albums = {}, {}
+    for track in playlist:
+        albums[track.album.id] = track.album
+        for artist in track.artists:
+            artists[artist.id] = artist
+    return artists, albums
+
+
+def _ingest_legacy(db, playlist, timings):
+    """Ingestion as it was: one find per track, ordered bulk writes, no index on id"""
+    start = time.perf_counter()
+    tracks = []
+    for track in playlist:
+        if len(list(db['Tracks'].find({'id': track.id}))) > 0:
+            continue
+        tracks.append(track)
+    timings['check'] += time.perf_counter() - start
+    timings['round trips'] += len(playlist)
+
+    start = time.perf_counter()
+    artists, albums = _playlist_documents(tracks)
+    for collection, documents in [('Tracks', tracks), ('Artists', artists.values()), ('Albums', albums.values())]:
+        operations = [ReplaceOne({'id': document.id}, document.dict(), upsert=True) for document in documents]
+        if len(operations) > 0:
+            db[collection].bulk_write(operations)
+            timings['round trips'] += 1
+    timings['write'] += time.perf_counter() - start
+
+
+def _ingest(mongo_db, playlist, timings):
+    # same database calls as SpotifyAPIDataLoader.load_playlist_tracks
+    start = time.perf_counter()
+    existing_track_ids = mongo_db.get_existing_track_ids([track.id for track in playlist])
+    tracks = []
+    for track in playlist:
+        if track.id in existing_track_ids:
+            continue
+        tracks.append(track)
+        existing_track_ids.add(track.id)
+    timings['check'] += time.perf_counter() - start
+    timings['round trips'] += -(-len(playlist) // mongo_db.IN_BATCH_SIZE)
+
+    start = time.perf_counter()
+    artists, albums = _playlist_documents(tracks)
+    mongo_db.upsert_multiple_tracks(tracks)
+    mongo_db.upsert_multiple_artists(artists.values())
+    mongo_db.upsert_multiple_albums(albums.values())
+    timings['write'] += time.perf_counter() - start
+    timings['round trips'] += sum(len(documents) > 0 for documents in [tracks, artists, albums])
+
+
+@app.command()
+def main(
+    tracks: int = 5_000,
+    artists: int = 1_500,
+    playlists: int = 100,
+    playlist_size: int = 100,
+    mongo_uri: str = None
+):
+    """Database side of a category crawl: existence checks and upserts per playlist
+
+    Playlists are drawn from a synthetic catalog, so later ones overlap with tracks already stored.
+    Runs against mongomock unless a mongod URI is given (its musicos database is dropped).
+    mongomock has no network and no indexes, the round trip count is what carries over to a real server.
+    """
+    from benchmarks.synthetic_catalog import create_synthetic_enhanced_tracks
+    from common.database.mongo_db import MongoDatabase
+
+    catalog = create_synthetic_enhanced_tracks(tracks, artists)
+    rng = np.random.default_rng(0)
+    crawl = [[catalog[i] for i in rng.choice(len(catalog), size=playlist_size, replace=False)] for _ in range(playlists)]
+
+    results = {}
+    for name in ['legacy', 'batched']:
+        client = _client(mongo_uri)
+        client.drop_database('musicos')
+        timings = {'check': 0.0, 'write': 0.0, 'round trips': 0}
+
+        if name == 'legacy':
+            for playlist in crawl:
+                _ingest_legacy(client['musicos'], playlist, timings)
+        else:
+            mongo_db = MongoDatabase(client=client)
+            for playlist in crawl:
+                _ingest(mongo_db, playlist, timings)
+
+        stored = client['musicos']['Tracks'].count_documents({})
+        elapsed = timings['check'] + timings['write']
+        results[name] = timings
+        echo(
+            f"{name:>8}: {playlists} playlists, {stored} tracks stored | "
+            f"existence checks {timings['check']:.2f}s, writes {timings['write']:.2f}s | "
+            f"{timings['round trips'] / playlists:.1f} round trips per playlist | "
+            f"{playlists * playlist_size / elapsed:,.0f} playlist tracks/s"
+        )
+        client.drop_database('musicos')
+
+    echo(
+        f"existence checks x{results['legacy']['check'] / results['batched']['check']:.1f} faster, "
+        f"round trips x{results['legacy']['round trips'] / results['batched']['round trips']:.1f} fewer"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+# Generates a catalog with the same layout as dataset/tracks.csv and dataset/artists.csv
+# so benchmarks can run without the real dataset.
+
+GENRES = [
+    'pop', 'dance pop', 'edm', 'house', 'deep house', 'techno', 'rock', 'indie rock',
+    'hip hop', 'trap', 'jazz', 'soul', 'r&b', 'latin', 'reggaeton', 'folk', 'metal',
+    'classical', 'ambient', 'chill', 'greek pop', 'uk garage', 'drum and bass', 'blues'
+]
+
+
+def _spotify_id(rng: np.random.Generator, n: int) -> np.ndarray:
+    alphabet = np.array(list('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    return np.array([''.join(row) for row in alphabet[rng.integers(0, len(alphabet), size=(n, 22))]])
+
+
+def create_synthetic_catalog(n_tracks: int, n_artists: int, seed: int = 23):
+    rng = np.random.default_rng(seed)
+    artist_ids = _spotify_id(rng, n_artists)
+
+    artist_genres = []
+    for _ in range(n_artists):
+        genres = rng.choice(GENRES, size=rng.integers(0, 4), replace=False)
+        artist_genres.append(str([str(genre) for genre in genres]))
+
+    df_artists = pd.DataFrame({
+        'id': artist_ids,
+        'followers': rng.integers(0, 1_000_000, size=n_artists).astype(float),
+        'genres': artist_genres,
+        'name': [f"Artist {i}" for i in range(n_artists)],
+        'popularity': rng.integers(0, 100, size=n_artists)
+    })
+
+    track_artists = [
+        artist_ids[rng.integers(0, n_artists, size=rng.integers(1, 3))] for _ in range(n_tracks)
+    ]
+    release_dates = pd.to_datetime('1960-01-01') + pd.to_timedelta(rng.integers(0, 60 * 365, size=n_tracks), unit='D')
+
+    df_tracks = pd.DataFrame({
+        'id': _spotify_id(rng, n_tracks),
+        'name': [f"Track {i}" for i in range(n_tracks)],
+        'popularity': rng.integers(0, 100, size=n_tracks),
+        'duration_ms': rng.integers(60_000, 600_000, size=n_tracks),
+        'explicit': rng.integers(0, 2, size=n_tracks),
+        'artists': [str([f"Artist {i}" for i in range(len(ids))]) for ids in track_artists],
+        'id_artists': [str([str(artist_id) for artist_id in ids]) for ids in track_artists],
+        'release_date': release_dates.strftime('%Y-%m-%d'),
+        'danceability': rng.random(n_tracks).round(3),
+        'energy': rng.random(n_tracks).round(3),
+        'key': rng.integers(0, 12, size=n_tracks),
+        'loudness': (-60 * rng.random(n_tracks)).round(3),
+        'mode': rng.integers(0, 2, size=n_tracks),
+        'speechiness': rng.random(n_tracks).round(4),
+        'acousticness': rng.random(n_tracks).round(4),
+        'instrumentalness': rng.random(n_tracks).round(6),
+        'liveness': rng.random(n_tracks).round(4),
+        'valence': rng.random(n_tracks).round(4),
+        'tempo': (60 + 140 * rng.random(n_tracks)).round(3),
+        'time_signature': rng.integers(3, 6, size=n_tracks)
+    })
+
+    return df_tracks, df_artists
+
+
+def write_synthetic_catalog(directory: str, n_tracks: int, n_artists: int, seed: int = 23):
+    os.makedirs(directory, exist_ok=True)
+    df_tracks, df_artists = create_synthetic_catalog(n_tracks, n_artists, seed)
+    track_path = os.path.join(directory, 'tracks.csv')
+    artist_path = os.path.join(directory, 'artists.csv')
+    df_tracks.to_csv(track_path, index=False)
+    df_artists.to_csv(artist_path, index=False)
+    return track_path, artist_path
+
+
+def create_synthetic_enhanced_tracks(n_tracks: int, n_artists: int, seed: int = 23):
+    """Same catalog as Spotify API objects (EnhancedTrack), as SpotifyAPIDataLoader stores them in Mongo"""
+    from common.data_transfer.models import Album, Artist, EnhancedTrack
+
+    df_tracks, df_artists = create_synthetic_catalog(n_tracks, n_artists, seed)
+
+    artists = {
+        row.id: Artist(
+            id=row.id, href=f"https://api.spotify.com/v1/artists/{row.id}", name=row.name, type='artist',
+            uri=f"spotify:artist:{row.id}", genres=eval(row.genres), popularity=float(row.popularity)
+        ) for row in df_artists.itertuples()
+    }
+
+    tracks = []
+    for row in df_tracks.itertuples():
+        track_artists = [artists[artist_id] for artist_id in eval(row.id_artists)]
+        album_id = row.id[::-1]
+        tracks.append(EnhancedTrack(
+            href=f"https://api.spotify.com/v1/tracks/{row.id}", id=row.id, name=row.name,
+            popularity=float(row.popularity), artists=track_artists, available_markets=['GR', 'US'],
+            disc_number=1, duration_ms=row.duration_ms, uri=f"spotify:track:{row.id}", type='track',
+            album=Album(
+                id=album_id, album_type='album', artists=track_artists, name=f"Album of {row.name}",
+                available_markets=['GR', 'US'], release_date=row.release_date, release_date_precision='day',
+                total_tracks=10, uri=f"spotify:album:{album_id}"
+            ),
+            audio_features=dict(
+                danceability=row.danceability, energy=row.energy, key=row.key, loudness=row.loudness,
+                mode=row.mode, speechiness=row.speechiness, acousticness=row.acousticness,
+                instrumentalness=row.instrumentalness, liveness=row.liveness, valence=row.valence,
+                tempo=row.tempo, duration_ms=row.duration_ms, time_signature=row.time_signature
+            )
+        ))
+
+    return tracks
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import tracemalloc
+
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+@app.command()
+def main(
+    synthetic_tracks: int = 200_000,
+    synthetic_artists: int = 50_000
+):
+    """Resident memory of the catalog: dict of pydantic Track vs TrackStore"""
+    from benchmarks.synthetic_catalog import create_synthetic_catalog
+    from common.database.local_storage import LocalStorage
+    from common.database.track_store import TrackStore
+    from common.domain.models import Artist, Track
+
+    df_tracks, df_artists = create_synthetic_catalog(synthetic_tracks, synthetic_artists)
+    df_tracks['id_artists'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_tracks['id_artists']]
+    df_artists['genres'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_artists['genres']]
+    df_tracks['release_date'] = df_tracks['release_date'].astype('datetime64[ns]')
+
+    artists = {record['id']: Artist(**record) for record in df_artists.to_dict(orient='records')}
+    df_enriched = LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=artists)
+
+    tracks, tracks_bytes, tracks_seconds = _measure(
+        lambda: {track['id']: Track(**track) for track in df_enriched.to_dict(orient='records')}
+    )
+    del tracks
+    store, store_bytes, store_seconds = _measure(lambda: TrackStore.from_frame(df_enriched))
+
+    echo(f"{synthetic_tracks} tracks")
+    echo(f"  Dict[str, Track]: {tracks_bytes / 2**20:8.1f} MB ({tracks_bytes / synthetic_tracks:6.0f} B/track), built in {tracks_seconds:.2f}s")
+    echo(f"  TrackStore:       {store_bytes / 2**20:8.1f} MB ({store_bytes / synthetic_tracks:6.0f} B/track), built in {store_seconds:.2f}s")
+    echo(f"  reduction:        {tracks_bytes / store_bytes:8.1f}x")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import hashlib
+import tempfile
+
+import numpy as np
+from typer import Typer, echo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+app = Typer()
+
+
+def _store_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    for name in ['meta.json', 'matrix.bin', 'ids.data', 'ids.offsets']:
+        with open(os.path.join(path, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _environment(workdir: str, artist_ids) -> None:
+    """Settings of the build: repo genre embeddings, random artist embeddings for the synthetic artists"""
+    from gensim.models import KeyedVectors
+    from settings import get_settings
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    artist_embeddings = KeyedVectors(vector_size=get_settings().artist_embeddings_size)
+    artist_embeddings.add_vectors(list(artist_ids), np.random.default_rng(0).random((len(artist_ids), artist_embeddings.vector_size)))
+    artist_embeddings.save(os.path.join(workdir, 'artist_embeddings.kv'))
+
+    # inherited by the workers of the pool
+    os.environ['artist_embeddings'] = os.path.join(workdir, 'artist_embeddings.kv')
+    os.environ['genre_embeddings'] = os.path.join(root, 'models', 'genre_embeddings_bert_v1.npy')
+    os.environ['genre_vocab_local_stored_path'] = os.path.join(workdir, 'genres_vocab.csv')
+    os.environ['track_representation_vectors_stored_path'] = os.path.join(workdir, 'track_representation_vectors')
+    get_settings.cache_clear()
+
+
+@app.command()
+def main(
+    synthetic_tracks: int = 1_000_000,
+    synthetic_artists: int = 100_000,
+    workers: str = '1,2,4,8',
+    chunk_size: int = 100_000,
+    repeat: int = 3
+):
+    """Representation vector build of a catalog, serial and with a pool of workers
+
+    Every parallel build is checked to be byte identical to the serial one.
+    """
+    from benchmarks.synthetic_catalog import create_synthetic_catalog
+    from common.database.local_storage import LocalStorage
+    from common.database.track_store import TrackStore
+    from common.domain.models import Artist
+    from settings import get_settings
+
+    df_tracks, df_artists = create_synthetic_catalog(synthetic_tracks, synthetic_artists)
+    df_tracks['id_artists'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_tracks['id_artists']]
+    df_artists['genres'] = [value[1:-1].strip().replace("'", "").split(',') for value in df_artists['genres']]
+    df_tracks['release_date'] = df_tracks['release_date'].astype('datetime64[ns]')
+    artists = {record['id']: Artist(**record) for record in df_artists.to_dict(orient='records')}
+    tracks = TrackStore.from_frame(LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=artists))
+
+    workdir = tempfile.mkdtemp(prefix='vector_build_bench_')
+    _environment(workdir, artists.keys())
+
+    from recommender_system.data_engineering.data_processing import DataProcessor
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    path = get_settings().track_representation_vectors_stored_path
+
+    echo(f"{synthetic_tracks} tracks, chunks of {chunk_size}, {os.cpu_count()} CPUs")
+    serial_digest, serial_seconds = None, None
+    for worker_count in [int(value) for value in workers.split(',')]:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            store = data_processor.construct_track_representation_vectors(tracks, workers=worker_count, chunk_size=chunk_size)
+            runs.append(time.perf_counter() - start)
+
+        digest = _store_digest(path)
+        serial_digest = serial_digest or digest
+        serial_seconds = serial_seconds or min(runs)
+        echo(
+            f"  workers {worker_count:>2}: {len(store)} vectors, best of {repeat} {min(runs):.2f}s "
+            f"(x{serial_seconds / min(runs):.2f}) | {'identical to' if digest == serial_digest else 'DIFFERS from'} serial"
+        )
+
+
+if __name__ == "__main__":
+    app()
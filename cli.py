@@ -5,6 +5,7 @@ from typer import Typer, echo
 from recommender_system.musicos import MusicOs
 from common.data_transfer.models import SessionSettings, Mode
 from spotify_connectors.spotify_web_api import SpotifyWebAPI
+from settings import get_settings
 
 
 app = Typer()
@@ -96,5 +97,147 @@ def get_enhanced_track_with_artist(track_id: str):
     echo(json.dumps(enhanced_track.dict(), indent=4, default=str))
 
 
+@app.command('build-catalog-snapshot')
+def build_catalog_snapshot():
+    from common.database.local_storage import LocalStorage
+    from common.database.catalog_snapshot import CatalogSnapshot
+
+    settings = get_settings()
+    snapshot = CatalogSnapshot(settings.catalog_snapshot_path)
+    snapshot.write(
+        df_tracks=LocalStorage.parse_tracks_csv(settings.track_local_stored_path),
+        df_artists=LocalStorage.parse_artists_csv(settings.artist_local_stored_path)
+    )
+    echo(f"Catalog snapshot written in {snapshot.path}")
+
+
+@app.command('build-catalog-sqlite')
+def build_catalog_sqlite():
+    from common.database.local_storage import LocalStorage
+    from common.database.sqlite_db import SqliteDatabase
+
+    path = get_settings().catalog_sqlite_path
+    storage = LocalStorage()
+    SqliteDatabase.build(
+        path=path,
+        df_tracks=LocalStorage.enrich_tracks(df_tracks=storage.get_all_tracks_df(), artists=storage.get_artists()),
+        artists=storage.get_artists(),
+        fingerprint=storage.get_catalog_fingerprint()
+    )
+    echo(f"SQLite catalog written in {path}")
+
+
+@app.command('export-artist-embeddings')
+def export_artist_embeddings(n_neighbors: int = 4):
+    from common.database.local_storage import LocalStorage
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    model_rows, fallback_rows = DataProcessor().export_artist_embeddings(LocalStorage().get_artists(), n_neighbors=n_neighbors)
+    echo(f"{model_rows} artist embeddings and {fallback_rows} genre based fallbacks written in {get_settings().artist_embedding_table}")
+
+
+@app.command('build-track-representation-vectors')
+def build_track_representation_vectors(workers: int = 1, chunk_size: int = 100_000):
+    from common.database.local_storage import LocalStorage
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    storage = LocalStorage()
+    tracks = storage.get_tracks()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    representation_vectors = data_processor.construct_track_representation_vectors(tracks, workers=workers, chunk_size=chunk_size)
+    data_processor.save_normalizer(fingerprint=storage.get_catalog_fingerprint())
+    echo(f"{len(representation_vectors)} track representation vectors written in {get_settings().track_representation_vectors_stored_path}")
+
+
+@app.command('update-track-representation-vectors')
+def update_track_representation_vectors(workers: int = 1, chunk_size: int = 100_000):
+    from common.database.local_storage import LocalStorage
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    storage = LocalStorage()
+    tracks = storage.get_tracks()
+    data_processor = DataProcessor()
+    # fitted as a full build, a new normalizer range changes the fingerprint of every vector
+    data_processor.fit_normalizer(tracks)
+    updated, added, removed = data_processor.update_track_representation_vectors(tracks, workers=workers, chunk_size=chunk_size)
+    data_processor.save_normalizer(fingerprint=storage.get_catalog_fingerprint())
+    echo(f"Track representation vectors: {updated} updated, {added} added, {removed} removed")
+
+
+@app.command('build-vector-index')
+def build_vector_index(n_lists: int = None, iterations: int = 10, sample_size: int = 100_000):
+    from common.database.vector_store import RepresentationVectorStore
+    from recommender_system.algorithm.ivf_index import IVFCosineIndex
+    from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+
+    path = get_settings().track_representation_vectors_stored_path
+    store = RepresentationVectorStore.open(path)
+    ivf_index = IVFCosineIndex.build(
+        BlockWeightedCosineIndex(store.matrix, blocks=store.blocks),
+        n_lists=n_lists,
+        iterations=iterations,
+        sample_size=sample_size
+    )
+    ivf_index.save(path, parameters={'iterations': iterations, 'sample_size': sample_size})
+    echo(f"IVF index of {len(store)} track representation vectors in {len(ivf_index.centroids)} lists written in {path}")
+
+
+@app.command('compact-write-back-log')
+def compact_write_back_log():
+    from common.database.local_storage import LocalStorage
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    storage = LocalStorage()
+    data_processor = DataProcessor()
+    # vectors of the log were built with the stored normalizer, it stays valid for the compacted catalog
+    normalizer_valid = data_processor.load_normalizer(fingerprint=storage.get_catalog_fingerprint())
+
+    tracks, artists, vectors = storage.compact_write_back_log()
+
+    if normalizer_valid:
+        data_processor.save_normalizer(fingerprint=storage.get_catalog_fingerprint())
+    echo(f"Write-back log compacted: {tracks} tracks, {artists} artists and {vectors} representation vectors added")
+
+
+@app.command('export-mongo-catalog')
+def export_mongo_catalog(batch_size: int = 5000, lag: float = 60.0):
+    from common.database.catalog_snapshot import CatalogSnapshot
+    from common.database.mongo_db import MongoDatabase
+    from common.database.mongo_export import MongoSnapshotExporter
+
+    mongo_db = MongoDatabase()
+    snapshot = CatalogSnapshot(get_settings().catalog_snapshot_path)
+    tracks, artists = MongoSnapshotExporter(mongo_db, snapshot, batch_size=batch_size, lag=lag).export()
+    mongo_db.disconnect()
+    echo(f"{tracks} tracks and {artists} artists exported in {snapshot.path}")
+
+
+@app.command('sync-mongo-catalog')
+def sync_mongo_catalog(batch_size: int = 5000, lag: float = 60.0):
+    from common.database.catalog_snapshot import CatalogSnapshot
+    from common.database.mongo_db import MongoDatabase
+    from recommender_system.data_engineering.mongo_sync import MongoDeltaSync
+
+    mongo_db = MongoDatabase()
+    snapshot = CatalogSnapshot(get_settings().catalog_snapshot_path)
+    tracks, artists, vectors = MongoDeltaSync(mongo_db, snapshot, batch_size=batch_size, lag=lag).sync()
+    mongo_db.disconnect()
+    echo(f"Catalog synced with Mongo: {tracks} tracks, {artists} artists and {vectors} representation vectors added")
+
+
+@app.command('convert-track-representation-vectors')
+def convert_track_representation_vectors(csv_path: str):
+    from common.database.vector_store import RepresentationVectorStore
+
+    store = RepresentationVectorStore.from_csv(csv_path)
+    RepresentationVectorStore.write(
+        path=get_settings().track_representation_vectors_stored_path,
+        ids=store.keys(),
+        matrix=store.matrix
+    )
+    echo(f"{len(store)} track representation vectors converted")
+
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -8,6 +8,7 @@ from common.data_transfer.models import (
     Artist as ArtistDto,
     Track as TrackDto
 )
+from common.domain.genre_vocabulary import GenreVocabulary
 from common.domain.models import (
     Track as Track,
     Artist as Artist
@@ -26,7 +27,11 @@ class TrackConversionInterface:
 
         domain_object_attrs['release_date'] = track.album.release_date
         domain_object_attrs['track_age'] = (datetime.today() - track.album.release_date).total_seconds()//(365*24*3600)
-        domain_object_attrs['genres'] = [genre.strip() for artist in track.artists for genre in getattr(artist,'genres',[]) if genre.strip() != ""]
+        domain_object_attrs['genres'] = [
+            genre for genre in (
+                GenreVocabulary.normalize(genre) for artist in track.artists for genre in getattr(artist,'genres',[])
+            ) if genre != ""
+        ]
         domain_object_attrs['artist_popularity'] = [artist.popularity for artist in track.artists]
         domain_object_attrs['artist_mean_popularity'] = np.nan
         domain_object_attrs['artist_max_popularity'] = np.nan
@@ -1,6 +1,6 @@
 import numpy as np
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date
 from dateutil import parser
 from enum import Enum
@@ -136,6 +136,15 @@ class SessionSettings(BaseModel):
     tempo: Optional[Mode] = Mode.Undefined
     include_genres: Optional[List[str]] = None
     exclude_genres: Optional[List[str]] = None
+    # weight by representation vector block name, over the venue weights
+    block_weights: Optional[Dict[str, float]] = None
+
+    @validator("block_weights")
+    def non_negative_block_weights(cls, value):
+        invalid = sorted(name for name, weight in (value or {}).items() if not weight >= 0)
+        if invalid:
+            raise ValueError(f"Block weights must be non-negative, invalid for {invalid}")
+        return value
     
     __filters__ = [
         'danceability',
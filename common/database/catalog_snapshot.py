@@ -0,0 +1,147 @@
+import os
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common.database import columnar
+
+
+class CatalogSnapshot:
+    """Binary columnar snapshot of the local catalog
+
+    Holds the same tables as tracks.csv / artists.csv, already parsed
+    (release dates as datetimes, artist ids and genres as lists),
+    so loading it skips all CSV parsing.
+
+        <snapshot>/tracks/    columnar frame of tracks
+        <snapshot>/artists/   columnar frame of artists
+    """
+
+    TRACKS = 'tracks'
+    ARTISTS = 'artists'
+
+    def __init__(self, path: str):
+        self._path = path
+
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+
+    def _frame_path(self, frame: str) -> str:
+        return os.path.join(self._path, frame)
+
+
+    def exists(self) -> bool:
+        return self._path is not None \
+            and columnar.frame_exists(self._frame_path(self.TRACKS)) \
+            and columnar.frame_exists(self._frame_path(self.ARTISTS))
+
+
+    def manifest_files(self) -> List[str]:
+        """Manifests of the snapshot frames, rewritten on every write"""
+        return [
+            os.path.join(self._frame_path(frame), columnar.MANIFEST_FILE) for frame in [self.TRACKS, self.ARTISTS]
+        ]
+
+
+    def read_tracks(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return columnar.read_frame(self._frame_path(self.TRACKS), columns=columns)
+
+
+    def read_artists(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return columnar.read_frame(self._frame_path(self.ARTISTS), columns=columns)
+
+
+    def write(
+        self,
+        df_tracks: pd.DataFrame,
+        df_artists: pd.DataFrame
+    ) -> None:
+        """Write (or overwrite) the snapshot
+
+        Args:
+            df_tracks (pd.DataFrame): parsed tracks table
+            df_artists (pd.DataFrame): parsed artists table
+        """
+        columnar.write_frame(df_artists, self._frame_path(self.ARTISTS))
+        columnar.write_frame(df_tracks, self._frame_path(self.TRACKS))
+
+
+    def write_chunks(
+        self,
+        track_chunks: Iterable[pd.DataFrame],
+        artist_chunks: Iterable[pd.DataFrame]
+    ) -> Tuple[int, int]:
+        """Write (or overwrite) the snapshot from streams of chunks,
+        memory use is bounded by the chunk size
+
+        Args:
+            track_chunks (Iterable[pd.DataFrame]): parsed tracks, all chunks with the same columns and dtypes
+            artist_chunks (Iterable[pd.DataFrame]): parsed artists, all chunks with the same columns and dtypes
+
+        Returns:
+            Tuple[int, int]: number of tracks and artists written
+        """
+        artists = columnar.write_frame_chunks(artist_chunks, self._frame_path(self.ARTISTS))
+        tracks = columnar.write_frame_chunks(track_chunks, self._frame_path(self.TRACKS))
+        return tracks, artists
+
+
+    def append(
+        self,
+        df_tracks: pd.DataFrame,
+        df_artists: pd.DataFrame
+    ) -> None:
+        """Append rows to the snapshot
+
+        Rows are conformed to the snapshot schema: columns the snapshot does not have are dropped,
+        missing columns are left empty (0 for integer columns).
+
+        Args:
+            df_tracks (pd.DataFrame): parsed tracks
+            df_artists (pd.DataFrame): parsed artists
+        """
+        for frame, df in [(self.ARTISTS, df_artists), (self.TRACKS, df_tracks)]:
+            if len(df) > 0:
+                columnar.append_frame(self._conform(frame, df), self._frame_path(frame))
+
+
+    def _conform(self, frame: str, df: pd.DataFrame) -> pd.DataFrame:
+        return self.conform(columnar.read_manifest(self._frame_path(frame))['columns'], df)
+
+
+    @staticmethod
+    def conform(columns: List[Dict], df: pd.DataFrame) -> pd.DataFrame:
+        """Cast a DataFrame to a frame schema (the 'columns' of a manifest)
+
+        Args:
+            columns (List[Dict]): name, kind and dtype of every column
+            df (pd.DataFrame): rows to conform
+
+        Returns:
+            pd.DataFrame: exactly the schema columns, in order
+        """
+        conformed = {}
+
+        for column in columns:
+            name, kind = column['name'], column['kind']
+            values = df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+            if kind == columnar.NUMERIC:
+                values = pd.to_numeric(values, errors='coerce')
+                if np.dtype(column['dtype']).kind in 'iub':
+                    values = values.fillna(0)
+                values = values.astype(column['dtype'])
+            elif kind == columnar.DATETIME:
+                values = pd.to_datetime(values)
+            elif kind == columnar.STRING_LIST:
+                values = pd.Series([value if isinstance(value, list) else [] for value in values], dtype=object)
+            else:
+                values = pd.Series([value if isinstance(value, str) else None for value in values], dtype=object)
+
+            conformed[name] = values.to_numpy() if kind != columnar.DATETIME else values.to_numpy(dtype='datetime64[ns]')
+
+        return pd.DataFrame(conformed)
@@ -0,0 +1,436 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from numpy.typing import NDArray
+from typing import Dict, Iterable, List, Optional
+
+
+# Columnar frame on disk
+#
+#   <frame>/manifest.json           schema and number of rows
+#   <frame>/<column>.values         numeric / datetime column (raw little endian)
+#   <frame>/<column>.data           utf-8 bytes of string items
+#   <frame>/<column>.offsets        int64 byte offsets of string items (items + 1)
+#   <frame>/<column>.valid          uint8 flag per row, 0 for missing strings
+#   <frame>/<column>.list_offsets   int64 item offsets of string lists (rows + 1)
+#
+# Every file is append only, so frames can be written in chunks and extended later.
+# The manifest is only rewritten when a writer closes, readers never look past its row count.
+
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+
+NUMERIC = 'numeric'
+DATETIME = 'datetime'
+STRING = 'string'
+STRING_LIST = 'string_list'
+
+
+class StringTable:
+    """Immutable list of strings packed in a single utf-8 buffer
+
+    Costs the encoded bytes plus one int64 offset per string,
+    instead of a full python object per string.
+    """
+
+    def __init__(self, data: NDArray, offsets: NDArray):
+        self.data = data
+        self.offsets = offsets
+
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> 'StringTable':
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data=data, offsets=offsets)
+
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, index: int) -> str:
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+
+    def to_list(self) -> List[str]:
+        data = self.data[self.offsets[0]:self.offsets[-1]] if len(self) > 0 else self.data[:0]
+        buffer = data.tobytes()
+        offsets = (self.offsets - self.offsets[0]).tolist()
+
+        if buffer.isascii():
+            lengths = np.diff(self.offsets)
+            # fixed width ascii (e.g spotify ids) is decoded by numpy in one go
+            if len(lengths) > 0 and lengths[0] > 0 and (lengths == lengths[0]).all():
+                fixed = data.view(f"S{lengths[0]}")
+                strings = []
+                for start in range(0, len(fixed), 65536):
+                    strings.extend(fixed[start:start + 65536].astype(str).tolist())
+                return strings
+            text = buffer.decode('ascii')
+            return [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+        return [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+    def take(self, indices: NDArray) -> 'StringTable':
+        """The strings at the given indices, in that order, without decoding them"""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return StringTable(data=self.data[positions], offsets=offsets)
+
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return DATETIME
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return NUMERIC
+
+    first_valid = series.first_valid_index()
+    if first_valid is not None and isinstance(series[first_valid], (list, tuple)):
+        return STRING_LIST
+
+    return STRING
+
+
+def _encode_strings(values: Iterable) -> List[bytes]:
+    return [value.encode('utf-8') if isinstance(value, str) else b'' for value in values]
+
+
+def _lengths_to_offsets(lengths: List[int], start: int) -> NDArray:
+    return start + np.cumsum(np.array(lengths, dtype=np.int64))
+
+
+class FrameWriter:
+    """Writes a DataFrame to a columnar frame, one chunk at a time
+
+    Chunks must share the schema of the first chunk written
+    (or of the existing frame when appending).
+    Memory use is bounded by the chunk size, not by the frame size.
+    """
+
+    def __init__(self, path: str, append: Optional[bool] = False):
+        self._path = path
+        self._columns: List[Dict] = None
+        self._rows = 0
+        self._files = {}
+        # running totals so that offsets keep counting across chunks
+        self._items: Dict[str, int] = {}
+        self._bytes: Dict[str, int] = {}
+
+        os.makedirs(path, exist_ok=True)
+
+        if append and os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            manifest = read_manifest(path)
+            self._columns = manifest['columns']
+            self._rows = manifest['rows']
+            self._resume()
+
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _file(self, name: str):
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self._path, name), 'ab')
+        return self._files[name]
+
+
+    def _resume(self):
+        """Cut every column file back to the last committed manifest
+        (drops leftovers of a writer that did not close) and restore the running totals."""
+        for column in self._columns:
+            name = column['name']
+
+            if column['kind'] in (NUMERIC, DATETIME):
+                self._truncate(f"{name}.values", self._rows * np.dtype(column['dtype']).itemsize)
+                continue
+
+            items = self._rows
+            if column['kind'] == STRING_LIST:
+                self._truncate(f"{name}.list_offsets", (self._rows + 1) * 8)
+                items = int(_read_int64_at(self._path, f"{name}.list_offsets", self._rows))
+            else:
+                self._truncate(f"{name}.valid", self._rows)
+
+            self._truncate(f"{name}.offsets", (items + 1) * 8)
+            data_size = int(_read_int64_at(self._path, f"{name}.offsets", items))
+            self._truncate(f"{name}.data", data_size)
+            self._items[name] = items
+            self._bytes[name] = data_size
+
+
+    def _truncate(self, file_name: str, size: int):
+        with open(os.path.join(self._path, file_name), 'r+b') as f:
+            f.truncate(size)
+
+
+    def _init_schema(self, df: pd.DataFrame):
+        self._columns = []
+        for name in df.columns:
+            kind = _column_kind(df[name])
+            column = {'name': name, 'kind': kind}
+
+            if kind == NUMERIC:
+                column['dtype'] = np.dtype(df[name].dtype).newbyteorder('<').str
+            elif kind == DATETIME:
+                column['dtype'] = '<i8'
+            else:
+                self._items[name] = 0
+                self._bytes[name] = 0
+                # leading zero offset of an empty column
+                self._file(f"{name}.offsets").write(np.zeros(1, dtype='<i8').tobytes())
+                if kind == STRING_LIST:
+                    self._file(f"{name}.list_offsets").write(np.zeros(1, dtype='<i8').tobytes())
+
+            self._columns.append(column)
+
+
+    def _write_strings(self, name: str, values: Iterable):
+        encoded = _encode_strings(values)
+        offsets = _lengths_to_offsets([len(item) for item in encoded], self._bytes[name])
+
+        self._file(f"{name}.data").write(b''.join(encoded))
+        self._file(f"{name}.offsets").write(offsets.astype('<i8').tobytes())
+        self._items[name] += len(encoded)
+        self._bytes[name] = int(offsets[-1]) if len(offsets) > 0 else self._bytes[name]
+
+
+    def write(self, df: pd.DataFrame):
+        if self._columns is None:
+            self._init_schema(df)
+
+        for column in self._columns:
+            name = column['name']
+            kind = column['kind']
+            series = df[name]
+
+            if kind == NUMERIC:
+                values = series.to_numpy().astype(column['dtype'])
+                self._file(f"{name}.values").write(values.tobytes())
+
+            elif kind == DATETIME:
+                values = series.to_numpy().astype('datetime64[ns]').view('<i8')
+                self._file(f"{name}.values").write(values.tobytes())
+
+            elif kind == STRING:
+                values = series.to_list()
+                valid = np.array([isinstance(value, str) for value in values], dtype=np.uint8)
+                self._file(f"{name}.valid").write(valid.tobytes())
+                self._write_strings(name, values)
+
+            else:
+                lists = [value if isinstance(value, (list, tuple)) else [] for value in series.to_list()]
+                list_offsets = _lengths_to_offsets([len(value) for value in lists], self._items[name])
+                self._file(f"{name}.list_offsets").write(list_offsets.astype('<i8').tobytes())
+                self._write_strings(name, [item for value in lists for item in value])
+
+        self._rows += len(df)
+
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+        if self._columns is None:
+            return
+
+        manifest = {
+            'version': FORMAT_VERSION,
+            'rows': self._rows,
+            'columns': self._columns
+        }
+        temp_path = os.path.join(self._path, MANIFEST_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temp_path, os.path.join(self._path, MANIFEST_FILE))
+
+
+def _read_int64_at(path: str, file_name: str, index: int) -> int:
+    return np.fromfile(os.path.join(path, file_name), dtype='<i8', count=1, offset=index * 8)[0]
+
+
+def read_manifest(path: str) -> Dict:
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar frame version {manifest.get('version')} in {path}")
+
+    return manifest
+
+
+def frame_exists(path: Optional[str]) -> bool:
+    return path is not None and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def read_string_table(path: str, name: str, count: int) -> StringTable:
+    offsets = np.fromfile(os.path.join(path, f"{name}.offsets"), dtype='<i8', count=count + 1)
+    data = np.fromfile(os.path.join(path, f"{name}.data"), dtype=np.uint8, count=int(offsets[-1]))
+    return StringTable(data=data, offsets=offsets)
+
+
+def read_column(path: str, column: Dict, rows: int) -> List:
+    name = column['name']
+    kind = column['kind']
+
+    if kind == NUMERIC:
+        return np.fromfile(os.path.join(path, f"{name}.values"), dtype=column['dtype'], count=rows)
+
+    if kind == DATETIME:
+        values = np.fromfile(os.path.join(path, f"{name}.values"), dtype='<i8', count=rows)
+        return values.astype(np.int64).view('datetime64[ns]')
+
+    if kind == STRING:
+        strings = read_string_table(path, name, rows).to_list()
+        valid = np.fromfile(os.path.join(path, f"{name}.valid"), dtype=np.uint8, count=rows)
+        if not valid.all():
+            for index in np.flatnonzero(valid == 0).tolist():
+                strings[index] = np.nan
+        return strings
+
+    list_offsets = np.fromfile(os.path.join(path, f"{name}.list_offsets"), dtype='<i8', count=rows + 1).tolist()
+    items = read_string_table(path, name, list_offsets[-1]).to_list()
+    return [items[start:end] for start, end in zip(list_offsets[:-1], list_offsets[1:])]
+
+
+def read_frame(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a columnar frame (or a subset of its columns) into a DataFrame
+
+    Args:
+        path (str): frame directory
+        columns (Optional[List[str]]): columns to load, all when None
+
+    Returns:
+        pd.DataFrame
+    """
+    manifest = read_manifest(path)
+    rows = manifest['rows']
+    schema = {column['name']: column for column in manifest['columns']}
+    names = columns if columns is not None else list(schema.keys())
+
+    data = {}
+    for name in names:
+        values = read_column(path, schema[name], rows)
+        data[name] = values if isinstance(values, np.ndarray) else pd.Series(values, dtype=object)
+
+    return pd.DataFrame(data, columns=names)
+
+
+def remove_frame(path: str) -> None:
+    """Delete the column files of the frame in path (the manifest is replaced by the next writer)"""
+    if frame_exists(path):
+        for column in read_manifest(path)['columns']:
+            for suffix in ('values', 'data', 'offsets', 'valid', 'list_offsets'):
+                file_path = os.path.join(path, f"{column['name']}.{suffix}")
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+
+def write_frame(df: pd.DataFrame, path: str, chunk_size: Optional[int] = 100_000) -> None:
+    """Write a whole DataFrame as a columnar frame, replacing any frame in path
+    """
+    write_frame_chunks((df.iloc[start:start + chunk_size] for start in range(0, max(len(df), 1), chunk_size)), path)
+
+
+def write_frame_chunks(chunks: Iterable[pd.DataFrame], path: str) -> int:
+    """Write a frame from a stream of chunks, replacing any frame in path.
+    Only one chunk is held at a time.
+
+    Returns:
+        int: number of rows written
+    """
+    remove_frame(path)
+
+    with FrameWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+        return writer.rows
+
+
+def append_frame(df: pd.DataFrame, path: str) -> None:
+    """Append rows to an existing frame (creates it if it does not exist)
+    """
+    with FrameWriter(path, append=True) as writer:
+        writer.write(df)
+
+
+class IdIndex:
+    """Maps string ids to row numbers
+
+    Ids are kept as one sorted fixed width byte array and looked up with binary search,
+    which is a fraction of the memory of a dict with python strings as keys.
+    """
+
+    def __init__(self, ids: List[str]):
+        encoded = np.array([track_id.encode('utf-8') for track_id in ids], dtype=bytes) \
+            if len(ids) > 0 else np.array([], dtype='S1')
+        self._order = np.argsort(encoded, kind='stable')
+        self._sorted = encoded[self._order]
+
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+
+    @property
+    def nbytes(self) -> int:
+        return self._sorted.nbytes + self._order.nbytes
+
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) >= 0
+
+
+    def get(self, key: str) -> int:
+        """Row of the id, -1 when the id is unknown"""
+        encoded = key.encode('utf-8')
+
+        if len(self._sorted) == 0 or len(encoded) > self._sorted.dtype.itemsize:
+            return -1
+
+        position = np.searchsorted(self._sorted, encoded)
+
+        if position < len(self._sorted) and self._sorted[position] == encoded:
+            return int(self._order[position])
+
+        return -1
+
+
+    def get_many(self, keys: List[str]) -> NDArray:
+        """Rows of the ids, -1 for unknown ids"""
+        if len(keys) == 0 or len(self._sorted) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+
+        encoded = np.array([key.encode('utf-8') for key in keys], dtype=bytes)
+        # longer keys can never match, truncation would create false hits
+        fits = np.char.str_len(encoded) <= self._sorted.dtype.itemsize
+        encoded = encoded.astype(self._sorted.dtype)
+        positions = np.minimum(np.searchsorted(self._sorted, encoded), len(self._sorted) - 1)
+        found = (self._sorted[positions] == encoded) & fits
+
+        return np.where(found, self._order[positions], -1)
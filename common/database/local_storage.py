@@ -1,22 +1,36 @@
 import pandas as pd
 import numpy as np
 import os.path
+import threading
 
+from numpy.typing import NDArray
 from datetime import datetime
-from typing import List, Dict
+from itertools import chain
+from scipy.sparse import csr_matrix
+from typing import List, Dict, Optional, Tuple
 from settings import get_settings
 from tqdm import tqdm
 
+from common import utils
 from common.database.default_db import DefaultDb
+from common.database.catalog_snapshot import CatalogSnapshot
+from common.database.vector_store import RepresentationVectorStore
+from common.database.track_store import TrackStore
+from common.database.write_back_log import WriteBackLog
+from common.domain.genre_vocabulary import GenreVocabulary
 from common.domain.models import Artist, Track, RepresentationVector
 
 
 class LocalStorage(DefaultDb):
     
     _artists: Dict[str, Artist] = None
-    _tracks: Dict[str, Track] = None
-    _track_representation_vectors: Dict[str, RepresentationVector] = None
+    _tracks: TrackStore = None
+    _track_representation_vectors: RepresentationVectorStore = None
     _genres_vocab: List[str]
+    _genre_vocabulary: GenreVocabulary = None
+    _artist_genres: csr_matrix = None
+    _write_back_log: WriteBackLog = None
+    _logged_track_representation_vectors: Dict[str, Optional[NDArray]] = None
 
     def __init__(self):
         self._settings = get_settings()
@@ -24,23 +38,38 @@ class LocalStorage(DefaultDb):
         self._artist_path = self._settings.artist_local_stored_path
         self._genres_vocab_path = self._settings.genre_vocab_local_stored_path
         self._track_representation_vectors_path = self._settings.track_representation_vectors_stored_path
+        self._catalog_snapshot = CatalogSnapshot(self._settings.catalog_snapshot_path)
+        self._write_back_log = WriteBackLog(self._settings.write_back_log_path) \
+            if self._settings.write_back_log_path is not None else None
+        logged_tracks, logged_artists, self._logged_track_representation_vectors = self._write_back_log.load() \
+            if self._write_back_log is not None else ({}, {}, {})
         self._artists = self.load_artists()
-        self._tracks = self.load_tracks()
+        # artists fetched at runtime extend the catalog artists
+        for artist_id, artist in logged_artists.items():
+            self._artists.setdefault(artist_id, artist)
+        self._genre_vocabulary = GenreVocabulary()
+        self._artist_genres = self._genre_vocabulary.encode_lists(
+            [artist.genres for artist in self._artists.values()], add_missing=True
+        )
+        # tracks and representation vectors are loaded on first use,
+        # a consumer of the artists only (e.g. the artist name index) never pays for them
+        self._logged_tracks = logged_tracks
+        self._load_lock = threading.Lock()
         self._genres_vocab = self.load_genres_vocab()
-        self._track_representation_vectors = self.load_track_representation_vectors()
     
     
-    def get_all_tracks_csv(self) -> pd.DataFrame:
-        """Read local storage CSV file with all tracks
+    @staticmethod
+    def parse_tracks_csv(path: str) -> pd.DataFrame:
+        """Read a CSV file with tracks
         Then apply necessary processing.
-        
-        In local storage, the data are stored in CSV
-            -> We use pandas to process them
+
+        Args:
+            path (str): tracks CSV path
 
         Returns:
             pd.DataFrame
         """
-        df_db_tracks = pd.read_csv(self._track_path)
+        df_db_tracks = pd.read_csv(path)
         df_db_tracks['release_date'] = pd.to_datetime(df_db_tracks['release_date'], yearfirst=True, format='mixed')
         df_db_tracks['id_artists'] = df_db_tracks['id_artists'].apply(
             lambda x: x[1:-1].strip().replace("'", "").split(',')
@@ -48,6 +77,37 @@ class LocalStorage(DefaultDb):
         return df_db_tracks
 
 
+    @staticmethod
+    def parse_artists_csv(path: str) -> pd.DataFrame:
+        """Read a CSV file with artists
+        Then apply necessary processing.
+
+        Args:
+            path (str): artists CSV path
+
+        Returns:
+            pd.DataFrame
+        """
+        df_db_artists = pd.read_csv(path)
+        df_db_artists['genres'] = df_db_artists['genres'].apply(
+            lambda x: x[1:-1].strip().replace("'", "").split(',')
+        )
+        return df_db_artists
+
+
+    def get_all_tracks_csv(self) -> pd.DataFrame:
+        """Read local storage CSV file with all tracks
+        Then apply necessary processing.
+        
+        In local storage, the data are stored in CSV
+            -> We use pandas to process them
+
+        Returns:
+            pd.DataFrame
+        """
+        return self.parse_tracks_csv(self._track_path)
+
+
     def get_all_artists_csv(self) -> pd.DataFrame:
         """Read local storage CSV file with all artists
         Then apply necessary processing.
@@ -58,49 +118,201 @@ class LocalStorage(DefaultDb):
         Returns:
             pd.DataFrame
         """
-        df_db_artists = pd.read_csv(self._artist_path)
-        df_db_artists['genres'] = df_db_artists['genres'].apply(
-            lambda x: x[1:-1].strip().replace("'", "").split(',')
-        )
-        return df_db_artists
+        return self.parse_artists_csv(self._artist_path)
 
 
-    def load_track_representation_vectors(self):
-        representation_vectors = pd.read_csv(self._track_representation_vectors_path)
-        representation_vectors.set_index('id', inplace=True)
-        representation_vectors = representation_vectors.to_dict(orient='index')
-        representation_vectors = {
-            key: np.array(list(vector.values())) for key, vector in representation_vectors.items()
-        }
-        return representation_vectors
+    def get_all_tracks_df(self) -> pd.DataFrame:
+        """All tracks, from the binary catalog snapshot when one is built,
+        otherwise from the CSV file.
+
+        Returns:
+            pd.DataFrame
+        """
+        if self._catalog_snapshot.exists():
+            return self._catalog_snapshot.read_tracks()
+        return self.get_all_tracks_csv()
+
+
+    def get_all_artists_df(self) -> pd.DataFrame:
+        """All artists, from the binary catalog snapshot when one is built,
+        otherwise from the CSV file.
+
+        Returns:
+            pd.DataFrame
+        """
+        if self._catalog_snapshot.exists():
+            return self._catalog_snapshot.read_artists()
+        return self.get_all_artists_csv()
+
+
+    def get_source_files(self) -> List[str]:
+        """Files the catalog is loaded from (snapshot manifests or CSV files)"""
+        if self._catalog_snapshot.exists():
+            return self._catalog_snapshot.manifest_files()
+        return [self._track_path, self._artist_path]
+
+
+    def get_catalog_fingerprint(self) -> str:
+        """Fingerprint of the files the catalog is loaded from (snapshot or CSV files)
+
+        Returns:
+            str
+        """
+        return utils.files_fingerprint(self.get_source_files())
+
+
+    def load_track_representation_vectors(self) -> RepresentationVectorStore:
+        """Open the representation vector store (memory mapped)
+
+        A CSV file in the legacy format is still accepted and loaded in memory.
+        When no vectors are built yet, an empty store is returned.
+        Vectors stored in another dtype than the configured one are converted in memory.
+
+        Returns:
+            RepresentationVectorStore
+        """
+        dtype = self._settings.track_representation_vectors_dtype
+        if RepresentationVectorStore.exists(self._track_representation_vectors_path):
+            return RepresentationVectorStore.open(self._track_representation_vectors_path).astype(dtype)
+
+        if self._track_representation_vectors_path is not None \
+                and os.path.isfile(self._track_representation_vectors_path):
+            return RepresentationVectorStore.from_csv(self._track_representation_vectors_path).astype(dtype)
+
+        return RepresentationVectorStore(ids=[], matrix=np.empty((0, 0), dtype=dtype))
 
 
     def load_genres_vocab(self):
+        # written together with the representation vectors
+        if self._genres_vocab_path is None or not os.path.isfile(self._genres_vocab_path):
+            return []
+
         df = pd.read_csv(self._genres_vocab_path)
         return df['word'].to_list() 
 
 
-    def load_tracks(self) -> Dict[str, Track]:
+    def load_tracks(self, logged_tracks: Optional[Dict[str, Track]] = None) -> TrackStore:
         """Load all tracks from local storage DB
+
+        Args:
+            logged_tracks (Optional[Dict[str, Track]]): tracks of the write-back log,
+                merged in as they were fetched (catalog tracks take precedence)
+
+        Returns:
+            TrackStore: compact store, behaves as a read only Dict[str, Track]
         """
         if self._artists is None:
             raise Exception("""Artists are not initialized. 
                             First initialize artists before processing tracks."""
                     )
 
-        df_db_tracks = self.get_all_tracks_csv()
-        tracks = df_db_tracks.to_dict(orient='records')
-        
-        # fill calculated fields for tracks
-        for track in tqdm(tracks, desc='Processing tracks'):
-            track['genres'] = self.get_genres_for_artists(track['id_artists'])
-            track['artist_popularity'] = self.get_popularity_for_artists(track['id_artists'])
-            track['name_artists'] = self.get_names_for_artists(track['id_artists'])
-            track['artist_mean_popularity'] = np.mean(track['artist_popularity']) if len(track['artist_popularity']) > 0 else np.nan
-            track['artist_max_popularity'] = np.max(track['artist_popularity']) if len(track['artist_popularity']) > 0 else np.nan
-            track['track_age'] = (datetime.today() - track['release_date']).total_seconds()//(365*24*3600)
+        df_db_tracks = self.enrich_tracks(
+            df_tracks=self.get_all_tracks_df(),
+            artists=self._artists,
+            genre_vocabulary=self._genre_vocabulary,
+            artist_genres=self._artist_genres
+        )
+
+        if logged_tracks:
+            catalog_ids = set(df_db_tracks['id'].to_list())
+            df_logged_tracks = self.tracks_to_frame(
+                [track for track_id, track in logged_tracks.items() if track_id not in catalog_ids]
+            )
+            df_db_tracks = pd.concat([df_db_tracks, df_logged_tracks], ignore_index=True)
         
-        return {track['id']: Track(**track) for track in tracks}
+        return TrackStore.from_frame(df_db_tracks, genre_vocabulary=self._genre_vocabulary)
+
+
+    @staticmethod
+    def tracks_to_frame(tracks: List[Track]) -> pd.DataFrame:
+        """Track domain models as a DataFrame with the Track fields as columns"""
+        df_tracks = pd.DataFrame([track.dict() for track in tracks], columns=list(Track.__fields__.keys()))
+        df_tracks['release_date'] = pd.to_datetime(df_tracks['release_date'])
+        for column in ['genres', 'id_artists', 'name_artists']:
+            df_tracks[column] = [items or [] for items in df_tracks[column]]
+        return df_tracks
+
+
+    @staticmethod
+    def enrich_tracks(
+        df_tracks: pd.DataFrame,
+        artists: Dict[str, Artist],
+        genre_vocabulary: Optional[GenreVocabulary] = None,
+        artist_genres: Optional[csr_matrix] = None
+    ) -> pd.DataFrame:
+        """Fill calculated fields for tracks, as whole-table operations
+
+        Track -> artist links are exploded into one flat table, joined once against the artists
+        and grouped back per track, so the cost is linear in the number of links.
+        Same output as get_genres_for_artists / get_popularity_for_artists / get_names_for_artists per track.
+
+        Args:
+            df_tracks (pd.DataFrame): tracks with parsed id_artists and release_date
+            artists (Dict[str, Artist]): artist_id: Artist
+            genre_vocabulary (Optional[GenreVocabulary]): vocabulary of the artist genres
+            artist_genres (Optional[csr_matrix]): (artists x genres) matrix, rows in artists order
+
+        Returns:
+            pd.DataFrame: tracks with genres, name_artists, artist_mean_popularity,
+                artist_max_popularity and track_age
+        """
+        df_tracks = df_tracks.copy()
+        artist_list = list(artists.values())
+        artist_index = pd.Index(list(artists.keys()))
+        artist_popularity = np.array([artist.popularity for artist in artist_list], dtype=float)
+        artist_names = [artist.name for artist in artist_list]
+        if genre_vocabulary is None or artist_genres is None:
+            genre_vocabulary = GenreVocabulary()
+            artist_genres = genre_vocabulary.encode_lists(
+                [artist.genres for artist in artist_list], add_missing=True
+            )
+
+        # explode: one row per (track, artist) link, in track order
+        id_artists = df_tracks['id_artists'].to_list()
+        links_per_track = np.array([len(track_artists) for track_artists in id_artists], dtype=np.int64)
+        link_track = np.repeat(np.arange(len(id_artists)), links_per_track)
+        link_artist = artist_index.get_indexer(list(chain.from_iterable(id_artists)))
+
+        # join: keep links to known artists only
+        matched = link_artist >= 0
+        link_track = link_track[matched]
+        link_artist = link_artist[matched]
+
+        # group back per track
+        artists_per_track = np.bincount(link_track, minlength=len(id_artists))
+        bounds = np.concatenate([[0], np.cumsum(artists_per_track)]).tolist()
+
+        popularity = artist_popularity[link_artist]
+        popularity_sum = np.bincount(link_track, weights=popularity, minlength=len(id_artists))
+        popularity_max = np.full(len(id_artists), -np.inf)
+        np.maximum.at(popularity_max, link_track, popularity)
+        has_artists = artists_per_track > 0
+
+        link_names = [artist_names[row] for row in link_artist.tolist()]
+
+        # gather the genre ids of every link from the artist -> genre matrix, in link order
+        genres_per_link = np.diff(artist_genres.indptr)[link_artist]
+        link_starts = artist_genres.indptr[link_artist]
+        link_genre_offsets = np.concatenate([[0], np.cumsum(genres_per_link)])
+        genre_codes = artist_genres.indices[
+            np.repeat(link_starts - link_genre_offsets[:-1], genres_per_link) + np.arange(link_genre_offsets[-1])
+        ]
+        genre_names = genre_vocabulary.decode(genre_codes.tolist())
+        genre_bounds = link_genre_offsets[bounds].tolist()
+
+        df_tracks['genres'] = [
+            genre_names[start:end] for start, end in zip(genre_bounds[:-1], genre_bounds[1:])
+        ]
+        df_tracks['name_artists'] = [link_names[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        df_tracks['artist_mean_popularity'] = np.where(
+            has_artists, popularity_sum / np.maximum(artists_per_track, 1), np.nan
+        )
+        df_tracks['artist_max_popularity'] = np.where(has_artists, popularity_max, np.nan)
+        df_tracks['track_age'] = (
+            pd.Timestamp(datetime.today()) - df_tracks['release_date']
+        ).dt.total_seconds()//(365*24*3600)
+
+        return df_tracks
 
 
     def load_artists(self) -> Dict[str, Artist]:
@@ -109,7 +321,7 @@ class LocalStorage(DefaultDb):
         Returns:
             Dict[str, Artist]: Dictionary with artist_id: Artist
         """
-        df_db_artists = self.get_all_artists_csv()
+        df_db_artists = self.get_all_artists_df()
         return {
             record['id']: Artist(**record) for record in tqdm(df_db_artists.to_dict(orient='records'), desc="Processing artists")
         }
@@ -133,7 +345,8 @@ class LocalStorage(DefaultDb):
         for artist_id in id_artists:
             genres += self._artists[artist_id].genres if artist_id in self._artists else []
         
-        return [genre.strip() for genre in genres if genre != ""]
+        genres = [GenreVocabulary.normalize(genre) for genre in genres]
+        return [genre for genre in genres if genre != ""]
 
 
     def get_popularity_for_artists(
@@ -177,6 +390,10 @@ class LocalStorage(DefaultDb):
     
     
     def get_tracks(self):
+        if self._tracks is None:
+            with self._load_lock:
+                if self._tracks is None:
+                    self._tracks = self.load_tracks(self._logged_tracks)
         return self._tracks
     
     
@@ -186,7 +403,93 @@ class LocalStorage(DefaultDb):
 
     def get_genres_vocab(self):
         return self._genres_vocab
+
+
+    def get_genre_vocabulary(self) -> GenreVocabulary:
+        return self._genre_vocabulary
+
+
+    def get_artist_genres(self) -> csr_matrix:
+        """(artists x genres) sparse matrix, rows in get_artists() order"""
+        return self._artist_genres
     
 
     def get_track_representation_vectors(self):
+        if self._track_representation_vectors is None:
+            with self._load_lock:
+                if self._track_representation_vectors is None:
+                    self._track_representation_vectors = self.load_track_representation_vectors()
         return self._track_representation_vectors
+
+
+    def get_logged_track_representation_vectors(self) -> Dict[str, Optional[NDArray]]:
+        """Representation vectors computed at runtime, from the write-back log"""
+        return self._logged_track_representation_vectors
+
+
+    def get_write_back_log(self) -> Optional[WriteBackLog]:
+        return self._write_back_log
+
+
+    def compact_write_back_log(self) -> Tuple[int, int, int]:
+        """Fold the write-back log into the catalog snapshot and the representation vector store.
+        The records are moved aside first (serving processes keep appending to a new log) and
+        removed once folded. Objects already in the catalog are skipped, so an interrupted
+        compaction can simply run again.
+
+        Returns:
+            Tuple[int, int, int]: number of tracks, artists and vectors added
+        """
+        if self._write_back_log is None:
+            return 0, 0, 0
+
+        detached = self._write_back_log.detach()
+        if detached is None:
+            return 0, 0, 0
+
+        tracks, artists, vectors = detached.load()
+
+        if not self._catalog_snapshot.exists():
+            self._catalog_snapshot.write(
+                df_tracks=self.get_all_tracks_csv(),
+                df_artists=self.get_all_artists_csv()
+            )
+
+        catalog_track_ids = set(self._catalog_snapshot.read_tracks(columns=['id'])['id'].to_list())
+        catalog_artist_ids = set(self._catalog_snapshot.read_artists(columns=['id'])['id'].to_list())
+        new_tracks = [track for track_id, track in tracks.items() if track_id not in catalog_track_ids]
+        new_artists = [artist for artist_id, artist in artists.items() if artist_id not in catalog_artist_ids]
+
+        df_tracks = self.tracks_to_frame(new_tracks)
+        # same text format as the CSV column
+        df_tracks['artists'] = [str(names) for names in df_tracks['name_artists']]
+        df_artists = pd.DataFrame([artist.dict() for artist in new_artists], columns=list(Artist.__fields__.keys()))
+        self._catalog_snapshot.append(df_tracks=df_tracks, df_artists=df_artists)
+
+        new_vectors = {
+            track_id: vector for track_id, vector in vectors.items()
+                if vector is not None and track_id not in self.get_track_representation_vectors()
+        }
+        if len(new_vectors) > 0 and RepresentationVectorStore.exists(self._track_representation_vectors_path):
+            # in place, the cost depends on the new vectors only
+            RepresentationVectorStore.append(
+                path=self._track_representation_vectors_path,
+                ids=list(new_vectors.keys()),
+                matrix=np.array(list(new_vectors.values()))
+            )
+        elif len(new_vectors) > 0:
+            # no store yet (or a CSV one): written once with the catalog vectors
+            store = self.get_track_representation_vectors()
+            RepresentationVectorStore.write(
+                path=self._track_representation_vectors_path,
+                ids=store.keys() + list(new_vectors.keys()),
+                matrix=np.concatenate([
+                    np.asarray(store.matrix).reshape(len(store), -1),
+                    np.array(list(new_vectors.values()))
+                ]) if len(store) > 0 else np.array(list(new_vectors.values())),
+                dtype=self._settings.track_representation_vectors_dtype,
+                blocks=store.blocks
+            )
+
+        detached.clear()
+        return len(new_tracks), len(new_artists), len(new_vectors)
@@ -1,51 +1,112 @@
-from pymongo import MongoClient, ReplaceOne
-from typing import List
+import logging
+
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure
+from pymongo.collection import Collection
+from typing import Dict, Iterator, List, Optional, Set
 
 from common.data_transfer.models import Album, Artist, EnhancedTrack
 from common.database.default_db import DefaultDb
 
 
+logger = logging.getLogger(__name__)
+
+
 class MongoDatabase(DefaultDb):
 
-    def __init__(self):
-        self.__client = MongoClient('localhost', 27017)
+    # ids per $in query, keeps the query document well below the 16MB BSON limit
+    IN_BATCH_SIZE = 1000
+
+    # creation time of a document (UTC), older documents do not have it
+    INSERTED_AT = 'inserted_at'
+
+    def __init__(self, client: Optional[MongoClient] = None):
+        self.__client = client if client is not None else MongoClient('localhost', 27017)
         self.db = self.__client['musicos']
         self.collection_tracks = self.db['Tracks']
         self.collection_artists = self.db['Artists']
         self.collection_albums = self.db['Albums']
+        self.create_indexes()
 
 
-    def upsert_multiple_tracks(self, tracks: List[EnhancedTrack]) -> bool:
+    def create_indexes(self) -> None:
+        """Unique index on id for every collection: upserts and existence checks
+        are index lookups instead of collection scans. No-op when the index exists."""
+        for collection in [self.collection_tracks, self.collection_artists, self.collection_albums]:
+            try:
+                collection.create_index('id', unique=True)
+            except OperationFailure as e:
+                # duplicates written before the index existed, the collection works without it
+                logger.warning("Unique index on %s.id not created: %s", collection.name, e)
+
+        for collection in [self.collection_tracks, self.collection_artists]:
+            collection.create_index(self.INSERTED_AT)
+
+
+    def _upsert(self, collection: Collection, documents: List[Dict]) -> None:
+        # inserted_at is only set when the document is created: delta syncs pick up new documents
+        inserted_at = datetime.utcnow()
         operations = [
-            ReplaceOne({"id": track.id}, track.dict(), upsert=True) for track in tracks
+            UpdateOne(
+                {"id": document['id']},
+                {'$set': document, '$setOnInsert': {self.INSERTED_AT: inserted_at}},
+                upsert=True
+            ) for document in documents
         ]
 
         if len(operations) > 0:
-            self.collection_tracks.bulk_write(operations)
+            collection.bulk_write(operations, ordered=False)
+
 
+    def upsert_multiple_tracks(self, tracks: List[EnhancedTrack]) -> bool:
+        self._upsert(self.collection_tracks, [track.dict() for track in tracks])
         return True
 
 
     def upsert_multiple_artists(self, artists: List[Artist]) -> bool:
-        operations = [
-            ReplaceOne({"id": artist.id}, artist.dict(), upsert=True) for artist in artists
-        ]
-
-        if len(operations) > 0:
-            self.collection_artists.bulk_write(operations)
-
+        self._upsert(self.collection_artists, [artist.dict() for artist in artists])
         return True
 
 
     def upsert_multiple_albums(self, albums: List[Album]) -> bool:
-        operations = [
-            ReplaceOne({"id": album.id}, album.dict(), upsert=True) for album in albums
-        ]
+        self._upsert(self.collection_albums, [album.dict() for album in albums])
+        return True
 
-        if len(operations) > 0:
-            self.collection_albums.bulk_write(operations)
 
-        return True
+    @staticmethod
+    def iter_documents(
+        collection: Collection,
+        projection: Optional[Dict] = None,
+        batch_size: Optional[int] = 5000,
+        query: Optional[Dict] = None
+    ) -> Iterator[List[Dict]]:
+        """Stream a collection as chunks of raw documents
+
+        The server side cursor fetches batch_size documents per round trip,
+        only the projected fields are sent and only one chunk is held at a time.
+
+        Args:
+            collection (Collection): collection to read
+            projection (Optional[Dict]): fields to return, all when None
+            batch_size (Optional[int]): documents per round trip and per chunk
+            query (Optional[Dict]): filter, all documents when None
+
+        Yields:
+            List[Dict]: up to batch_size documents
+        """
+        cursor = collection.find(query or {}, projection=projection, batch_size=batch_size)
+        try:
+            chunk = []
+            for document in cursor:
+                chunk.append(document)
+                if len(chunk) == batch_size:
+                    yield chunk
+                    chunk = []
+            if len(chunk) > 0:
+                yield chunk
+        finally:
+            cursor.close()
 
 
     def load_all_tracks(self) -> List[EnhancedTrack]:
@@ -59,12 +120,29 @@ class MongoDatabase(DefaultDb):
 
 
     def is_track_in_db(self, track_id: str) -> bool:
-        cursor = self.collection_tracks.find({'id': track_id})
+        return self.collection_tracks.find_one({'id': track_id}, projection={'_id': 1}) is not None
+
+
+    def get_existing_track_ids(self, track_ids: List[str]) -> Set[str]:
+        """Ids of the given tracks that are already stored, in one $in query per batch
+
+        Args:
+            track_ids (List[str]): ids to check
+
+        Returns:
+            Set[str]: subset of track_ids in the Tracks collection
+        """
+        track_ids = list(dict.fromkeys(track_ids))
+        existing = set()
 
-        if cursor is not None:
-            return len(list(cursor)) > 0
+        for start in range(0, len(track_ids), self.IN_BATCH_SIZE):
+            cursor = self.collection_tracks.find(
+                {'id': {'$in': track_ids[start:start + self.IN_BATCH_SIZE]}},
+                projection={'id': 1, '_id': 0}
+            )
+            existing.update(document['id'] for document in cursor)
 
-        return False
+        return existing
 
 
     def disconnect(self):
@@ -0,0 +1,195 @@
+import os
+import json
+import pandas as pd
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from common.database import columnar
+from common.database.catalog_snapshot import CatalogSnapshot
+from common.database.mongo_db import MongoDatabase
+
+
+AUDIO_FEATURES = [
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'time_signature'
+]
+
+# same columns and dtypes as a snapshot built from tracks.csv / artists.csv
+TRACK_COLUMNS = [
+    {'name': 'id', 'kind': columnar.STRING},
+    {'name': 'name', 'kind': columnar.STRING},
+    {'name': 'popularity', 'kind': columnar.NUMERIC, 'dtype': '<i8'},
+    {'name': 'duration_ms', 'kind': columnar.NUMERIC, 'dtype': '<i8'},
+    {'name': 'explicit', 'kind': columnar.NUMERIC, 'dtype': '<i8'},
+    {'name': 'artists', 'kind': columnar.STRING},
+    {'name': 'id_artists', 'kind': columnar.STRING_LIST},
+    {'name': 'release_date', 'kind': columnar.DATETIME, 'dtype': '<i8'},
+] + [
+    {'name': feature, 'kind': columnar.NUMERIC, 'dtype': '<i8' if feature in ('key', 'mode', 'time_signature') else '<f8'}
+        for feature in AUDIO_FEATURES
+]
+
+ARTIST_COLUMNS = [
+    {'name': 'id', 'kind': columnar.STRING},
+    {'name': 'followers', 'kind': columnar.NUMERIC, 'dtype': '<f8'},
+    {'name': 'genres', 'kind': columnar.STRING_LIST},
+    {'name': 'name', 'kind': columnar.STRING},
+    {'name': 'popularity', 'kind': columnar.NUMERIC, 'dtype': '<i8'},
+]
+
+TRACK_PROJECTION = {
+    '_id': 0, 'id': 1, 'name': 1, 'popularity': 1, 'duration_ms': 1,
+    'artists.id': 1, 'artists.name': 1, 'album.release_date': 1, 'audio_features': 1
+}
+
+ARTIST_PROJECTION = {'_id': 0, 'id': 1, 'name': 1, 'genres': 1, 'popularity': 1}
+
+
+class MongoSnapshotExporter:
+    """Exports the Tracks / Artists collections filled by SpotifyAPIDataLoader
+    into the local catalog snapshot read by LocalStorage
+
+    Documents are streamed from server side cursors with projections, converted
+    one chunk at a time and appended to the snapshot frames, so memory use
+    depends on the chunk size and not on the size of the collections.
+
+    The export covers the documents inserted before a watermark (now - lag), stored
+    with the snapshot: later documents are left to the delta sync (MongoDeltaSync).
+    The lag leaves time to upserts stamped before the watermark to be committed.
+    """
+
+    SYNC_STATE_FILE = 'mongo_sync.json'
+
+    def __init__(
+        self,
+        mongo_db: MongoDatabase,
+        snapshot: CatalogSnapshot,
+        batch_size: Optional[int] = 5000,
+        lag: Optional[float] = 60.0
+    ):
+        self._mongo_db = mongo_db
+        self._snapshot = snapshot
+        self._batch_size = batch_size
+        self._lag = lag
+
+
+    @classmethod
+    def load_watermark(cls, snapshot: CatalogSnapshot) -> Optional[datetime]:
+        """Documents inserted before the watermark are in the snapshot, None when it was not built from Mongo"""
+        path = os.path.join(snapshot.path, cls.SYNC_STATE_FILE)
+        if not os.path.isfile(path):
+            return None
+
+        with open(path) as f:
+            return datetime.fromisoformat(json.load(f)['watermark'])
+
+
+    @classmethod
+    def save_watermark(cls, snapshot: CatalogSnapshot, watermark: datetime, normalizer_fingerprint: Optional[str] = None) -> None:
+        """
+        Args:
+            snapshot (CatalogSnapshot): snapshot the watermark belongs to
+            watermark (datetime): documents inserted before it are in the snapshot
+            normalizer_fingerprint (Optional[str]): catalog fingerprint the stored normalizer was saved with,
+                while a sync changes the snapshot (see load_normalizer_fingerprint)
+        """
+        state = {'watermark': watermark.isoformat()}
+        if normalizer_fingerprint is not None:
+            state['normalizer_fingerprint'] = normalizer_fingerprint
+
+        path = os.path.join(snapshot.path, cls.SYNC_STATE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(path + '.tmp', path)
+
+
+    @classmethod
+    def load_normalizer_fingerprint(cls, snapshot: CatalogSnapshot) -> Optional[str]:
+        """Catalog fingerprint the normalizer was stored with before a sync that did not complete, None if there is none"""
+        path = os.path.join(snapshot.path, cls.SYNC_STATE_FILE)
+        if not os.path.isfile(path):
+            return None
+
+        with open(path) as f:
+            return json.load(f).get('normalizer_fingerprint')
+
+
+    def next_watermark(self) -> datetime:
+        # inserted_at is stored by Mongo with millisecond precision
+        watermark = datetime.utcnow() - timedelta(seconds=self._lag)
+        return watermark.replace(microsecond=watermark.microsecond // 1000 * 1000)
+
+
+    @staticmethod
+    def tracks_to_frame(documents: List[Dict]) -> pd.DataFrame:
+        """Track documents (EnhancedTrack) as rows of the tracks.csv layout"""
+        audio_features = [document.get('audio_features') or {} for document in documents]
+        artists = [document.get('artists') or [] for document in documents]
+
+        df = pd.DataFrame({
+            'id': [document['id'] for document in documents],
+            'name': [document.get('name') for document in documents],
+            'popularity': [document.get('popularity') for document in documents],
+            'duration_ms': [document.get('duration_ms') for document in documents],
+            # same text format as the CSV column
+            'artists': [str([artist.get('name') for artist in track_artists]) for track_artists in artists],
+            'id_artists': [[artist['id'] for artist in track_artists] for track_artists in artists],
+            'release_date': [(document.get('album') or {}).get('release_date') for document in documents],
+            **{
+                feature: [features.get(feature) for features in audio_features] for feature in AUDIO_FEATURES
+            }
+        })
+        return CatalogSnapshot.conform(TRACK_COLUMNS, df)
+
+
+    @staticmethod
+    def artists_to_frame(documents: List[Dict]) -> pd.DataFrame:
+        """Artist documents as rows of the artists.csv layout"""
+        df = pd.DataFrame({
+            'id': [document['id'] for document in documents],
+            'genres': [document.get('genres') or [] for document in documents],
+            'name': [document.get('name') for document in documents],
+            'popularity': [document.get('popularity') for document in documents]
+        })
+        return CatalogSnapshot.conform(ARTIST_COLUMNS, df)
+
+
+    def _frames(self, chunks: Iterable[List[Dict]], converter, columns: List[Dict]) -> Iterator[pd.DataFrame]:
+        empty = True
+        for chunk in chunks:
+            empty = False
+            yield converter(chunk)
+
+        if empty:
+            # an empty frame still needs its schema
+            yield CatalogSnapshot.conform(columns, pd.DataFrame())
+
+
+    def export(self) -> Tuple[int, int]:
+        """Write the snapshot from the Mongo collections, replacing the current one
+
+        Returns:
+            Tuple[int, int]: number of tracks and artists exported
+        """
+        watermark = self.next_watermark()
+        # documents written before inserted_at existed have no timestamp
+        query = {'$or': [
+            {MongoDatabase.INSERTED_AT: {'$lt': watermark}},
+            {MongoDatabase.INSERTED_AT: {'$exists': False}}
+        ]}
+
+        exported = self._snapshot.write_chunks(
+            track_chunks=self._frames(
+                MongoDatabase.iter_documents(self._mongo_db.collection_tracks, TRACK_PROJECTION, self._batch_size, query),
+                self.tracks_to_frame,
+                TRACK_COLUMNS
+            ),
+            artist_chunks=self._frames(
+                MongoDatabase.iter_documents(self._mongo_db.collection_artists, ARTIST_PROJECTION, self._batch_size, query),
+                self.artists_to_frame,
+                ARTIST_COLUMNS
+            )
+        )
+        self.save_watermark(self._snapshot, watermark)
+        return exported
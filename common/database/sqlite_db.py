@@ -0,0 +1,477 @@
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime
+from numpy.typing import NDArray
+from typing import Dict, Iterator, List, Optional, Tuple
+from settings import get_settings
+
+from common import utils
+from common.database.default_db import DefaultDb
+from common.database.vector_store import RepresentationVectorStore
+from common.database.write_back_log import WriteBackLog
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Artist, Track
+
+
+class SqliteCatalog:
+    """Enriched catalog in a single SQLite file
+
+    Tracks are stored with their calculated fields (genres, artist names and popularity),
+    so a lookup is one indexed read. Indexes: track id, artist id and cleaned artist name.
+    The file is opened read only, with one connection per thread.
+    """
+
+    # SQLite default limit of host parameters per statement
+    BATCH_SIZE = 900
+
+    __track_columns__ = [
+        'id', 'name', 'release_date', 'key', 'popularity', 'danceability', 'tempo', 'valence', 'energy',
+        'loudness', 'speechiness', 'acousticness', 'instrumentalness', 'liveness',
+        'artist_mean_popularity', 'artist_max_popularity', 'genres', 'id_artists', 'name_artists'
+    ]
+
+    __list_columns__ = ['genres', 'id_artists', 'name_artists']
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+
+    @classmethod
+    def exists(cls, path: Optional[str]) -> bool:
+        return path is not None and os.path.isfile(path)
+
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)
+        return self._local.connection
+
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        df_tracks: pd.DataFrame,
+        artists: Dict[str, Artist],
+        metadata: Optional[Dict[str, str]] = None,
+        chunk_size: Optional[int] = 50_000
+    ) -> None:
+        """Write the catalog, replacing any file in path
+
+        Args:
+            path (str): SQLite file
+            df_tracks (pd.DataFrame): enriched tracks (as created by LocalStorage.enrich_tracks)
+            artists (Dict[str, Artist]): artist_id: Artist
+            metadata (Optional[Dict[str, str]]): stored as is (e.g the catalog fingerprint)
+            chunk_size (Optional[int]): rows inserted per statement batch
+        """
+        temp_path = path + '.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        connection = sqlite3.connect(temp_path)
+        connection.executescript("""
+            CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE genres (id INTEGER PRIMARY KEY, word TEXT NOT NULL);
+            CREATE TABLE artists (
+                id TEXT NOT NULL, name TEXT, name_clean TEXT, popularity REAL, genres TEXT
+            );
+            CREATE TABLE tracks (
+                id TEXT NOT NULL, name TEXT, release_date INTEGER, key INTEGER, popularity REAL,
+                danceability REAL, tempo REAL, valence REAL, energy REAL, loudness REAL, speechiness REAL,
+                acousticness REAL, instrumentalness REAL, liveness REAL,
+                artist_mean_popularity REAL, artist_max_popularity REAL,
+                genres TEXT, id_artists TEXT, name_artists TEXT
+            );
+        """)
+
+        connection.executemany(
+            "INSERT INTO artists VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    artist.id, artist.name, utils.clear_name_text(artist.name) if artist.name else None,
+                    artist.popularity, json.dumps(artist.genres)
+                ) for artist in artists.values()
+            )
+        )
+
+        genre_vocabulary = GenreVocabulary(
+            genre for genres in df_tracks['genres'].to_list() if isinstance(genres, list) for genre in genres
+        )
+        connection.executemany("INSERT INTO genres VALUES (?, ?)", enumerate(genre_vocabulary.genres))
+
+        release_dates = pd.to_datetime(df_tracks['release_date']).to_numpy().astype('datetime64[ns]')
+        df_tracks = df_tracks.assign(
+            release_date=[None if np.isnat(date) else int(date.view(np.int64)) for date in release_dates],
+            # same coercion as the pydantic str field (and TrackStore)
+            name=[name if isinstance(name, str) or name is None else str(name) for name in df_tracks['name'].to_list()]
+        )
+        placeholders = ", ".join("?" * len(cls.__track_columns__))
+
+        for start in range(0, len(df_tracks), chunk_size):
+            chunk = df_tracks.iloc[start:start + chunk_size]
+            columns = [
+                [json.dumps(items if isinstance(items, list) else []) for items in chunk[column].to_list()]
+                    if column in cls.__list_columns__ else chunk[column].to_list()
+                        for column in cls.__track_columns__
+            ]
+            connection.executemany(
+                f"INSERT INTO tracks VALUES ({placeholders})",
+                ([cls._sql_value(value) for value in row] for row in zip(*columns))
+            )
+
+        connection.executemany("INSERT INTO metadata VALUES (?, ?)", (metadata or {}).items())
+        # indexes are built once, after the bulk insert
+        connection.executescript("""
+            CREATE UNIQUE INDEX tracks_id ON tracks (id);
+            CREATE UNIQUE INDEX artists_id ON artists (id);
+            CREATE INDEX artists_name_clean ON artists (name_clean);
+        """)
+        connection.commit()
+        connection.close()
+        os.replace(temp_path, path)
+
+
+    @staticmethod
+    def _sql_value(value):
+        if isinstance(value, (np.integer, np.floating)):
+            value = value.item()
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        return value
+
+
+    def metadata(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+
+    def _track(self, row: Tuple) -> Track:
+        values = dict(zip(self.__track_columns__, row))
+        for column in self.__list_columns__:
+            values[column] = json.loads(values[column])
+
+        # same calculated age as LocalStorage.enrich_tracks
+        release_date = pd.Timestamp(values['release_date']) if values['release_date'] is not None else pd.NaT
+        values['release_date'] = release_date
+        values['track_age'] = (pd.Timestamp(datetime.today()) - release_date).total_seconds()//(365*24*3600) \
+            if release_date is not pd.NaT else np.nan
+
+        for column, value in values.items():
+            if value is None and column not in ('key', 'name'):
+                values[column] = np.nan
+        return Track(**values)
+
+
+    @staticmethod
+    def _artist(row: Tuple) -> Artist:
+        artist_id, name, popularity, genres = row
+        return Artist(id=artist_id, name=name, popularity=popularity, genres=json.loads(genres))
+
+
+    def _select_in(self, query: str, ids: List[str]) -> List[Tuple]:
+        """Run a `... WHERE id IN (...)` query in batches"""
+        rows = []
+        for start in range(0, len(ids), self.BATCH_SIZE):
+            batch = ids[start:start + self.BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            rows += self._connection().execute(query.format(placeholders=placeholders), batch).fetchall()
+        return rows
+
+
+    def count_tracks(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+
+    def count_artists(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM artists").fetchone()[0]
+
+
+    def has_track(self, track_id: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM tracks WHERE id = ?", (track_id,)).fetchone() is not None
+
+
+    def get_track(self, track_id: str) -> Optional[Track]:
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.__track_columns__)} FROM tracks WHERE id = ?", (track_id,)
+        ).fetchone()
+        return self._track(row) if row is not None else None
+
+
+    def get_tracks(self, track_ids: List[str]) -> Dict[str, Track]:
+        """Tracks by id, in batched IN queries (unknown ids are left out)"""
+        rows = self._select_in(
+            f"SELECT {', '.join(self.__track_columns__)} FROM tracks WHERE id IN ({{placeholders}})", list(track_ids)
+        )
+        return {row[0]: self._track(row) for row in rows}
+
+
+    def get_artist(self, artist_id: str) -> Optional[Artist]:
+        row = self._connection().execute(
+            "SELECT id, name, popularity, genres FROM artists WHERE id = ?", (artist_id,)
+        ).fetchone()
+        return self._artist(row) if row is not None else None
+
+
+    def get_artists(self, artist_ids: List[str]) -> Dict[str, Artist]:
+        """Artists by id, in batched IN queries (unknown ids are left out)"""
+        rows = self._select_in(
+            "SELECT id, name, popularity, genres FROM artists WHERE id IN ({placeholders})", list(artist_ids)
+        )
+        return {row[0]: self._artist(row) for row in rows}
+
+
+    def find_artists_by_name(self, artist_name: str) -> List[Artist]:
+        """Artists whose cleaned name (utils.clear_name_text) matches"""
+        rows = self._connection().execute(
+            "SELECT id, name, popularity, genres FROM artists WHERE name_clean = ?",
+            (utils.clear_name_text(artist_name),)
+        ).fetchall()
+        return [self._artist(row) for row in rows]
+
+
+    def iter_ids(self, table: str) -> Iterator[str]:
+        for row in self._connection().execute(f"SELECT id FROM {table} ORDER BY rowid"):
+            yield row[0]
+
+
+    def iter_artists(self) -> Iterator[Artist]:
+        for row in self._connection().execute("SELECT id, name, popularity, genres FROM artists ORDER BY rowid"):
+            yield self._artist(row)
+
+
+    def genre_vocabulary(self) -> GenreVocabulary:
+        """Vocabulary of the track genres, ids as stored"""
+        return GenreVocabulary(row[0] for row in self._connection().execute("SELECT word FROM genres ORDER BY id"))
+
+
+    def column(self, name: str) -> NDArray:
+        """A numeric track column as float64, NULL as NaN"""
+        if name == 'track_age':
+            # NULL dates become the minimum int64, which is NaT
+            release_dates = np.array([
+                row[0] if row[0] is not None else np.iinfo(np.int64).min
+                    for row in self._connection().execute("SELECT release_date FROM tracks ORDER BY rowid")
+            ], dtype=np.int64).view('datetime64[ns]')
+            return ((pd.Timestamp(datetime.today()) - pd.Series(release_dates)).dt.total_seconds()//(365*24*3600)) \
+                .to_numpy(dtype=np.float64)
+
+        if name not in self.__track_columns__ or name in self.__list_columns__:
+            raise KeyError(name)
+
+        values = [row[0] for row in self._connection().execute(f"SELECT {name} FROM tracks ORDER BY rowid")]
+        return np.array(values, dtype=np.float64)
+
+
+class SqliteTracks(Mapping):
+    """Read only Dict[str, Track] view of the catalog, resolved with indexed lookups
+
+    Tracks that are not in the catalog file (e.g from the write-back log) are kept in memory.
+    """
+
+    def __init__(self, catalog: SqliteCatalog, extra_tracks: Optional[Dict[str, Track]] = None):
+        self._catalog = catalog
+        self._extra_tracks = {
+            track_id: track for track_id, track in (extra_tracks or {}).items() if not catalog.has_track(track_id)
+        }
+
+
+    def __len__(self) -> int:
+        return self._catalog.count_tracks() + len(self._extra_tracks)
+
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._catalog.iter_ids('tracks')
+        yield from self._extra_tracks
+
+
+    def __contains__(self, track_id: object) -> bool:
+        return isinstance(track_id, str) and (track_id in self._extra_tracks or self._catalog.has_track(track_id))
+
+
+    def __getitem__(self, track_id: str) -> Track:
+        if track_id in self._extra_tracks:
+            return self._extra_tracks[track_id]
+
+        track = self._catalog.get_track(track_id)
+        if track is None:
+            raise KeyError(track_id)
+        return track
+
+
+    def get_many(self, track_ids: List[str]) -> Dict[str, Track]:
+        tracks = self._catalog.get_tracks(track_ids)
+        tracks.update({track_id: self._extra_tracks[track_id] for track_id in track_ids if track_id in self._extra_tracks})
+        return tracks
+
+
+    def column(self, name: str) -> NDArray:
+        extra = np.array([getattr(track, name) for track in self._extra_tracks.values()], dtype=np.float64)
+        return np.concatenate([self._catalog.column(name), extra])
+
+
+class SqliteArtists(MutableMapping):
+    """Dict[str, Artist] view of the catalog artists
+
+    Artists set at runtime (e.g fetched from Spotify) are kept in memory.
+    """
+
+    def __init__(self, catalog: SqliteCatalog, extra_artists: Optional[Dict[str, Artist]] = None):
+        self._catalog = catalog
+        self._extra_artists = dict(extra_artists or {})
+
+
+    def __len__(self) -> int:
+        return self._catalog.count_artists() + len(self._extra_artists)
+
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._catalog.iter_ids('artists')
+        yield from self._extra_artists
+
+
+    def __contains__(self, artist_id: object) -> bool:
+        return isinstance(artist_id, str) \
+            and (artist_id in self._extra_artists or self._catalog.get_artist(artist_id) is not None)
+
+
+    def __getitem__(self, artist_id: str) -> Artist:
+        if artist_id in self._extra_artists:
+            return self._extra_artists[artist_id]
+
+        artist = self._catalog.get_artist(artist_id)
+        if artist is None:
+            raise KeyError(artist_id)
+        return artist
+
+
+    def __setitem__(self, artist_id: str, artist: Artist) -> None:
+        self._extra_artists[artist_id] = artist
+
+
+    def __delitem__(self, artist_id: str) -> None:
+        del self._extra_artists[artist_id]
+
+
+    def values(self):
+        # one scan instead of a lookup per id
+        for artist in self._catalog.iter_artists():
+            yield self._extra_artists.get(artist.id, artist)
+        for artist_id, artist in self._extra_artists.items():
+            if self._catalog.get_artist(artist_id) is None:
+                yield artist
+
+
+class SqliteDatabase(DefaultDb):
+    """Catalog served from a SQLite file (see cli build-catalog-sqlite)
+
+    Nothing is loaded up front: tracks and artists are looked up on demand,
+    representation vectors stay memory mapped. Same getters as LocalStorage.
+    """
+
+    FINGERPRINT = 'catalog_fingerprint'
+
+    def __init__(self):
+        self._settings = get_settings()
+        self._catalog = SqliteCatalog(self._settings.catalog_sqlite_path)
+        self._genres_vocab_path = self._settings.genre_vocab_local_stored_path
+        self._track_representation_vectors_path = self._settings.track_representation_vectors_stored_path
+        self._write_back_log = WriteBackLog(self._settings.write_back_log_path) \
+            if self._settings.write_back_log_path is not None else None
+        logged_tracks, logged_artists, self._logged_track_representation_vectors = self._write_back_log.load() \
+            if self._write_back_log is not None else ({}, {}, {})
+
+        self._artists = SqliteArtists(self._catalog, logged_artists)
+        self._tracks = SqliteTracks(self._catalog, logged_tracks)
+        self._genre_vocabulary = self._catalog.genre_vocabulary()
+        self._genres_vocab = self.load_genres_vocab()
+        self._track_representation_vectors = self.load_track_representation_vectors()
+
+
+    @staticmethod
+    def build(path: str, df_tracks: pd.DataFrame, artists: Dict[str, Artist], fingerprint: str) -> None:
+        """Write the catalog file from enriched tracks, keeping the fingerprint of the source catalog"""
+        SqliteCatalog.write(
+            path=path,
+            df_tracks=df_tracks,
+            artists=artists,
+            metadata={SqliteDatabase.FINGERPRINT: fingerprint}
+        )
+
+
+    def load_tracks(self) -> SqliteTracks:
+        return self._tracks
+
+
+    def load_artists(self) -> SqliteArtists:
+        return self._artists
+
+
+    def load_genres_vocab(self) -> List[str]:
+        if self._genres_vocab_path is None or not os.path.isfile(self._genres_vocab_path):
+            return []
+        return pd.read_csv(self._genres_vocab_path)['word'].to_list()
+
+
+    def load_track_representation_vectors(self) -> RepresentationVectorStore:
+        dtype = self._settings.track_representation_vectors_dtype
+        if RepresentationVectorStore.exists(self._track_representation_vectors_path):
+            return RepresentationVectorStore.open(self._track_representation_vectors_path).astype(dtype)
+        return RepresentationVectorStore(ids=[], matrix=np.empty((0, 0), dtype=dtype))
+
+
+    def is_track_in_db(self, track_id: str) -> bool:
+        return self._catalog.has_track(track_id)
+
+
+    def find_artists_by_name(self, artist_name: str) -> List[Artist]:
+        return self._catalog.find_artists_by_name(artist_name)
+
+
+    def get_source_files(self) -> List[str]:
+        return [self._catalog.path]
+
+
+    def get_catalog_fingerprint(self) -> str:
+        # the fingerprint of the catalog the file was built from, so the stored normalizer stays valid
+        return self._catalog.metadata(self.FINGERPRINT) or utils.files_fingerprint([self._catalog.path])
+
+
+    def get_tracks(self) -> SqliteTracks:
+        return self._tracks
+
+
+    def get_artists(self) -> SqliteArtists:
+        return self._artists
+
+
+    def get_genres_vocab(self) -> List[str]:
+        return self._genres_vocab
+
+
+    def get_genre_vocabulary(self) -> GenreVocabulary:
+        return self._genre_vocabulary
+
+
+    def get_track_representation_vectors(self) -> RepresentationVectorStore:
+        return self._track_representation_vectors
+
+
+    def get_logged_track_representation_vectors(self) -> Dict[str, Optional[NDArray]]:
+        return self._logged_track_representation_vectors
+
+
+    def get_write_back_log(self) -> Optional[WriteBackLog]:
+        return self._write_back_log
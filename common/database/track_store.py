@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+
+from collections.abc import Mapping
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from typing import Dict, Iterator, List, Optional
+
+from common.database.columnar import StringTable, IdIndex
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Track
+
+
+class InternedListColumn:
+    """A list of strings per row, stored as integer codes into a vocabulary of unique strings
+
+        row i -> vocabulary[codes[offsets[i]:offsets[i + 1]]]
+    """
+
+    def __init__(self, vocabulary: List[str], codes: NDArray, offsets: NDArray):
+        self.vocabulary = vocabulary
+        self.codes = codes
+        self.offsets = offsets
+
+
+    @classmethod
+    def from_lists(cls, lists: List[List[str]]) -> 'InternedListColumn':
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in lists], out=offsets[1:])
+        flat = [item for items in lists for item in items]
+        codes, uniques = pd.factorize(pd.Series(flat, dtype=object), sort=False)
+        return cls(vocabulary=list(uniques), codes=codes.astype(np.int32), offsets=offsets)
+
+
+    @classmethod
+    def from_genre_lists(cls, lists: List[List[str]], genre_vocabulary: GenreVocabulary) -> 'InternedListColumn':
+        """Genre lists coded with the ids of a shared genre vocabulary (unknown genres are added)"""
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in lists], out=offsets[1:])
+        codes = genre_vocabulary.encode([item for items in lists for item in items], add_missing=True)
+        # empty genres have no id, drop them
+        known = codes >= 0
+        if not known.all():
+            row_of_code = np.repeat(np.arange(len(lists)), np.diff(offsets))
+            np.cumsum(np.bincount(row_of_code[known], minlength=len(lists)), out=offsets[1:])
+            codes = codes[known]
+        return cls(vocabulary=genre_vocabulary.genres, codes=codes, offsets=offsets)
+
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, row: int) -> List[str]:
+        return [self.vocabulary[code] for code in self.codes[self.offsets[row]:self.offsets[row + 1]].tolist()]
+
+
+    def slice(self, start: int, stop: int) -> 'InternedListColumn':
+        """Rows [start, stop), sharing the vocabulary"""
+        offsets = self.offsets[start:stop + 1]
+        return InternedListColumn(
+            vocabulary=self.vocabulary,
+            codes=self.codes[offsets[0]:offsets[-1]],
+            offsets=offsets - offsets[0]
+        )
+
+
+    def take(self, rows: NDArray) -> 'InternedListColumn':
+        """The given rows, in that order, sharing the vocabulary"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return InternedListColumn(vocabulary=self.vocabulary, codes=self.codes[positions], offsets=offsets)
+
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.offsets.nbytes
+
+
+class TrackStore(Mapping):
+    """Catalog tracks as a struct of arrays
+
+    Numeric fields live in typed numpy columns, strings in packed string tables and
+    artist / genre references in interned list columns. A Track domain model is only
+    built when a track is accessed, e.g by DataProvider.get_track.
+
+    Behaves as a read only Dict[str, Track].
+    """
+
+    # dtypes are picked so that every value of the catalog is represented exactly
+    __numeric_columns__ = {
+        'track_age': np.float32,
+        'popularity': np.float32,
+        'danceability': np.float64,
+        'tempo': np.float64,
+        'valence': np.float64,
+        'energy': np.float64,
+        'loudness': np.float64,
+        'speechiness': np.float64,
+        'acousticness': np.float64,
+        'instrumentalness': np.float64,
+        'liveness': np.float64,
+        'artist_mean_popularity': np.float64,
+        'artist_max_popularity': np.float32
+    }
+
+    __list_columns__ = ['genres', 'id_artists', 'name_artists']
+
+    # missing key (outside the Spotify keys, -1 is "no key detected")
+    _NO_KEY = np.iinfo(np.int8).min
+
+    def __init__(
+        self,
+        ids: StringTable,
+        names: StringTable,
+        names_valid: NDArray,
+        release_dates: NDArray,
+        keys: NDArray,
+        numeric: Dict[str, NDArray],
+        lists: Dict[str, InternedListColumn],
+        genre_vocabulary: GenreVocabulary
+    ):
+        self._ids = ids
+        self._index = IdIndex(ids.to_list())
+        self._names = names
+        self._names_valid = names_valid
+        self._release_dates = release_dates
+        self._keys = keys
+        self._numeric = numeric
+        self._lists = lists
+        self._genre_vocabulary = genre_vocabulary
+
+
+    @classmethod
+    def from_frame(
+        cls,
+        df_tracks: pd.DataFrame,
+        genre_vocabulary: Optional[GenreVocabulary] = None
+    ) -> 'TrackStore':
+        """Build the store from a DataFrame with the Track fields as columns
+        (as created by LocalStorage.enrich_tracks)
+
+        Args:
+            df_tracks (pd.DataFrame): tracks
+            genre_vocabulary (Optional[GenreVocabulary]): vocabulary the genres are coded with,
+                a new one is created if not given
+
+        Returns:
+            TrackStore
+        """
+        names = df_tracks['name'].to_list()
+        # same coercion as the pydantic str field
+        names_valid = np.array([name is not None for name in names], dtype=bool)
+        names = [name if isinstance(name, str) else str(name) if name is not None else '' for name in names]
+
+        keys = df_tracks['key'].to_numpy(dtype=np.float64)
+        keys = np.where(np.isnan(keys), cls._NO_KEY, keys).astype(np.int8)
+
+        release_dates = pd.to_datetime(df_tracks['release_date']).to_numpy().astype('datetime64[ns]').view(np.int64)
+
+        if genre_vocabulary is None:
+            genre_vocabulary = GenreVocabulary()
+
+        lists = {
+            column: [items if isinstance(items, list) else [] for items in df_tracks[column].to_list()]
+                for column in cls.__list_columns__
+        }
+
+        return cls(
+            ids=StringTable.from_strings(df_tracks['id'].to_list()),
+            names=StringTable.from_strings(names),
+            names_valid=names_valid,
+            release_dates=release_dates.copy(),
+            keys=keys,
+            numeric={
+                column: df_tracks[column].to_numpy(dtype=np.float64).astype(dtype)
+                    for column, dtype in cls.__numeric_columns__.items()
+            },
+            lists={
+                column: InternedListColumn.from_genre_lists(items, genre_vocabulary)
+                    if column == 'genres' else InternedListColumn.from_lists(items)
+                        for column, items in lists.items()
+            },
+            genre_vocabulary=genre_vocabulary
+        )
+
+
+    @classmethod
+    def from_tracks(cls, tracks: List[Track]) -> 'TrackStore':
+        df_tracks = pd.DataFrame([track.dict() for track in tracks], columns=list(Track.__fields__.keys()))
+        for column in cls.__list_columns__:
+            df_tracks[column] = [items or [] for items in df_tracks[column]]
+        return cls.from_frame(df_tracks)
+
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids.to_list())
+
+
+    def __contains__(self, track_id: object) -> bool:
+        return isinstance(track_id, str) and track_id in self._index
+
+
+    def __getitem__(self, track_id: str) -> Track:
+        row = self._index.get(track_id)
+        if row < 0:
+            raise KeyError(track_id)
+        return self.track_at(row)
+
+
+    def get_many(self, track_ids: List[str]) -> Dict[str, Track]:
+        """Tracks by id, unknown ids are left out"""
+        rows = self._index.get_many(track_ids)
+        return {track_id: self.track_at(row) for track_id, row in zip(track_ids, rows.tolist()) if row >= 0}
+
+
+    def row_of(self, track_id: str) -> int:
+        return self._index.get(track_id)
+
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row]
+
+
+    def track_at(self, row: int) -> Track:
+        """Materialize the Track domain model of a row"""
+        release_date = self._release_dates[row]
+        key = int(self._keys[row])
+
+        return Track(
+            id=self._ids[row],
+            name=self._names[row] if self._names_valid[row] else None,
+            # NaT is stored as the minimum int64, as numpy does
+            release_date=pd.Timestamp(release_date.view('datetime64[ns]')),
+            key=key if key != self._NO_KEY else None,
+            **{column: values[row].item() for column, values in self._numeric.items()},
+            **{column: values[row] for column, values in self._lists.items()}
+        )
+
+
+    def column(self, name: str) -> NDArray:
+        """A numeric column as float64"""
+        if name == 'key':
+            return np.where(self._keys == self._NO_KEY, np.nan, self._keys).astype(np.float64)
+        return self._numeric[name].astype(np.float64, copy=False)
+
+
+    def feature_matrix(self, features: List[str]) -> NDArray:
+        """(tracks x features) float64 matrix of numeric columns"""
+        return np.column_stack([self.column(feature) for feature in features]) \
+            if len(self) > 0 else np.empty((0, len(features)))
+
+
+    def list_column(self, name: str) -> InternedListColumn:
+        return self._lists[name]
+
+
+    def genre_ids(self, row: int) -> NDArray:
+        """Genre ids of a row, in the genre vocabulary"""
+        genres = self._lists['genres']
+        return genres.codes[genres.offsets[row]:genres.offsets[row + 1]]
+
+
+    def genre_matrix(self) -> csr_matrix:
+        """(tracks x genres) sparse matrix, a genre present k times in a track has the value k"""
+        genres = self._lists['genres']
+        return self.genre_vocabulary.csr(genres.codes, genres.offsets)
+
+
+    @property
+    def genre_vocabulary(self) -> GenreVocabulary:
+        return self._genre_vocabulary
+
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the store"""
+        return self._ids.nbytes + self._index.nbytes + self._names.nbytes + self._names_valid.nbytes \
+            + self._release_dates.nbytes + self._keys.nbytes \
+            + sum(values.nbytes for values in self._numeric.values()) \
+            + sum(values.nbytes for values in self._lists.values())
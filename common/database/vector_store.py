@@ -0,0 +1,369 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from numpy.typing import NDArray
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from common.database.columnar import StringTable, IdIndex, read_string_table
+from common.domain.models import VectorBlock
+
+
+class RepresentationVectorStore:
+    """Track representation vectors, stored once on disk as a single matrix
+
+        <store>/meta.json                 rows, dimension and dtype of the matrix, block layout of the vectors
+        <store>/matrix.bin                contiguous row-major matrix, one row per track
+        <store>/ids.data, ids.offsets     track id of every row (string table)
+
+    The matrix is opened with np.memmap, so every process serving the same store
+    shares one copy through the page cache and nothing is copied on load.
+    """
+
+    META_FILE = 'meta.json'
+    MATRIX_FILE = 'matrix.bin'
+    IDS = 'ids'
+
+    def __init__(
+        self,
+        ids: List[str],
+        matrix: NDArray,
+        path: Optional[str] = None,
+        blocks: Optional[List[VectorBlock]] = None
+    ):
+        self._ids = ids
+        self._index = IdIndex(ids if isinstance(ids, list) else ids.to_list())
+        self.matrix = matrix
+        self.path = path
+        # None for stores written without a layout: the vectors are compared as they are
+        self.blocks = blocks
+
+
+    @classmethod
+    def open(cls, path: str) -> 'RepresentationVectorStore':
+        """Memory map a store from disk (read only)"""
+        meta = cls.read_meta(path)
+        rows, dimension = meta['rows'], meta['dimension']
+        matrix = np.memmap(
+            os.path.join(path, cls.MATRIX_FILE),
+            dtype=meta['dtype'],
+            mode='r',
+            shape=(rows, dimension)
+        ) if rows > 0 else np.empty((0, dimension), dtype=meta['dtype'])
+
+        return cls(ids=read_string_table(path, cls.IDS, rows), matrix=matrix, path=path, blocks=cls.read_blocks(path))
+
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'RepresentationVectorStore':
+        """In memory store from the legacy CSV format (id column + one column per dimension)"""
+        df = pd.read_csv(path)
+        df.set_index('id', inplace=True)
+        return cls(
+            ids=df.index.to_list(),
+            matrix=np.ascontiguousarray(np.nan_to_num(df.to_numpy(dtype=np.float64), nan=-1))
+        )
+
+
+    @classmethod
+    def read_meta(cls, path: str) -> Dict:
+        """rows, dimension, dtype and block layout of a stored matrix"""
+        with open(os.path.join(path, cls.META_FILE)) as f:
+            return json.load(f)
+
+
+    @classmethod
+    def read_blocks(cls, path: str) -> Optional[List[VectorBlock]]:
+        """Block layout of the stored vectors, None if the store has none"""
+        blocks = cls.read_meta(path).get('blocks')
+        return [VectorBlock(**block) for block in blocks] if blocks is not None else None
+
+
+    @classmethod
+    def write_meta(cls, path: str, meta: Dict) -> None:
+        """Replace meta.json (written aside and renamed)"""
+        temp_path = os.path.join(path, cls.META_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(temp_path, os.path.join(path, cls.META_FILE))
+
+
+    @classmethod
+    def read_ids(cls, path: str) -> List[str]:
+        """Track id of every row, without opening the store"""
+        return read_string_table(path, cls.IDS, cls.read_meta(path)['rows']).to_list()
+
+
+    @classmethod
+    def exists(cls, path: Optional[str]) -> bool:
+        return path is not None and os.path.exists(os.path.join(path, cls.META_FILE))
+
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        ids: List[str],
+        matrix: NDArray,
+        dtype: Optional[str] = 'float64',
+        blocks: Optional[List[VectorBlock]] = None
+    ) -> None:
+        """Write a store, replacing any store in path
+
+        NaNs are replaced with -1 once here, so readers can use the matrix as is.
+        Files are written aside and renamed into place: processes that have the
+        previous matrix memory mapped keep reading it unchanged.
+
+        Args:
+            path (str): store directory
+            ids (List[str]): track id of each row
+            matrix (NDArray): (rows x dimension) representation vectors
+            dtype (Optional[str]): stored dtype
+            blocks (Optional[List[VectorBlock]]): block layout of the vectors
+        """
+        cls.write_chunks(path, [(ids, matrix)], dtype=dtype, blocks=blocks)
+
+
+    @classmethod
+    def write_chunks(
+        cls,
+        path: str,
+        chunks: Iterable[Tuple[List[str], NDArray]],
+        dtype: Optional[str] = 'float64',
+        blocks: Optional[List[VectorBlock]] = None
+    ) -> int:
+        """Write a store from consecutive chunks of rows, replacing any store in path
+
+        Only one chunk is held at a time. The files are the same as a write of
+        the concatenated chunks.
+
+        Args:
+            path (str): store directory
+            chunks (Iterable[Tuple[List[str], NDArray]]): track ids (or their StringTable) and
+                (rows x dimension) vectors of every chunk
+            dtype (Optional[str]): stored dtype
+            blocks (Optional[List[VectorBlock]]): block layout of the vectors
+
+        Returns:
+            int: number of rows written
+        """
+        os.makedirs(path, exist_ok=True)
+        file_names = [cls.MATRIX_FILE, f"{cls.IDS}.data", f"{cls.IDS}.offsets"]
+        files = {file_name: open(os.path.join(path, file_name + '.tmp'), 'wb') for file_name in file_names}
+
+        rows, dimension, data_size = 0, None, 0
+        try:
+            files[f"{cls.IDS}.offsets"].write(np.zeros(1, dtype='<i8').tobytes())
+            for ids, matrix in chunks:
+                if len(ids) == 0:
+                    continue
+
+                matrix = np.nan_to_num(np.asarray(matrix, dtype=dtype).reshape(len(ids), -1), nan=-1)
+                if dimension is None:
+                    dimension = int(matrix.shape[1])
+                elif matrix.shape[1] != dimension:
+                    raise ValueError(f"Chunk of dimension {matrix.shape[1]} in a store of dimension {dimension}")
+
+                id_table = ids if isinstance(ids, StringTable) else StringTable.from_strings(ids)
+                files[cls.MATRIX_FILE].write(np.ascontiguousarray(matrix).tobytes())
+                files[f"{cls.IDS}.data"].write(id_table.data.tobytes())
+                files[f"{cls.IDS}.offsets"].write((id_table.offsets[1:].astype('<i8') + data_size).tobytes())
+                rows += len(ids)
+                data_size += len(id_table.data)
+        finally:
+            for f in files.values():
+                f.close()
+
+        for file_name in file_names:
+            os.replace(os.path.join(path, file_name + '.tmp'), os.path.join(path, file_name))
+
+        meta = {
+            'rows': rows,
+            'dimension': dimension if dimension is not None else 0,
+            'dtype': np.dtype(dtype).newbyteorder('<').str
+        }
+        if blocks is not None:
+            meta['blocks'] = [block.dict() for block in blocks]
+        cls.write_meta(path, meta)
+        return rows
+
+
+    @classmethod
+    def append(
+        cls,
+        path: str,
+        ids: List[str],
+        matrix: NDArray
+    ) -> None:
+        """Append rows to a store in place, the cost depends on the new rows only
+
+        Files only grow and meta.json is replaced last: readers only map the rows of the
+        meta.json they opened, so they keep reading a consistent store. Leftovers of an
+        interrupted append (past the rows of meta.json) are cut first.
+
+        Args:
+            path (str): store directory, created by write
+            ids (List[str]): track id of each new row
+            matrix (NDArray): (rows x dimension) new representation vectors
+        """
+        if len(ids) == 0:
+            return
+
+        meta = cls.read_meta(path)
+        rows, dimension, dtype = meta['rows'], meta['dimension'], meta['dtype']
+
+        matrix = np.nan_to_num(np.asarray(matrix, dtype=dtype).reshape(len(ids), -1), nan=-1)
+        if rows > 0 and matrix.shape[1] != dimension:
+            raise ValueError(f"Vectors of dimension {matrix.shape[1]} can not be appended to a store of dimension {dimension}")
+
+        offsets_path = os.path.join(path, f"{cls.IDS}.offsets")
+        data_size = int(np.fromfile(offsets_path, dtype='<i8', count=1, offset=rows * 8)[0])
+        id_table = StringTable.from_strings(ids)
+
+        for file_name, size, content in [
+            (cls.MATRIX_FILE, rows * dimension * np.dtype(dtype).itemsize, np.ascontiguousarray(matrix).tobytes()),
+            (f"{cls.IDS}.data", data_size, id_table.data.tobytes()),
+            # offsets continue from the end of the existing ids, without the leading zero
+            (f"{cls.IDS}.offsets", (rows + 1) * 8, (id_table.offsets[1:].astype('<i8') + data_size).tobytes())
+        ]:
+            with open(os.path.join(path, file_name), 'r+b') as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(content)
+
+        meta['rows'] = rows + len(ids)
+        meta['dimension'] = int(matrix.shape[1])
+        cls.write_meta(path, meta)
+
+
+    @classmethod
+    def patch(
+        cls,
+        path: str,
+        rows: NDArray,
+        matrix: NDArray
+    ) -> None:
+        """Overwrite rows of a store
+
+        The matrix is copied aside, patched and renamed into place, then meta.json is
+        replaced with the next generation: processes that have the store memory mapped
+        keep reading the previous vectors, whole, and watchers of meta.json see the change.
+
+        Args:
+            path (str): store directory
+            rows (NDArray): rows to overwrite
+            matrix (NDArray): (rows x dimension) new representation vectors
+        """
+        if len(rows) == 0:
+            return
+
+        meta = cls.read_meta(path)
+        matrix_path = os.path.join(path, cls.MATRIX_FILE)
+        shutil.copyfile(matrix_path, matrix_path + '.tmp')
+
+        stored = np.memmap(
+            matrix_path + '.tmp',
+            dtype=meta['dtype'],
+            mode='r+',
+            shape=(meta['rows'], meta['dimension'])
+        )
+        stored[np.asarray(rows, dtype=np.int64)] = np.nan_to_num(np.asarray(matrix, dtype=meta['dtype']), nan=-1)
+        stored.flush()
+        del stored
+        os.replace(matrix_path + '.tmp', matrix_path)
+
+        meta['generation'] = meta.get('generation', 0) + 1
+        cls.write_meta(path, meta)
+
+
+    @classmethod
+    def remove_rows(
+        cls,
+        path: str,
+        rows: List[int],
+        chunk_size: Optional[int] = 100_000
+    ) -> None:
+        """Rewrite a store without some of its rows, one chunk of the kept rows at a time
+
+        Args:
+            path (str): store directory
+            rows (List[int]): rows to remove
+            chunk_size (Optional[int]): rows per chunk
+        """
+        meta = cls.read_meta(path)
+        matrix = np.memmap(
+            os.path.join(path, cls.MATRIX_FILE),
+            dtype=meta['dtype'],
+            mode='r',
+            shape=(meta['rows'], meta['dimension'])
+        )
+        ids = read_string_table(path, cls.IDS, meta['rows'])
+        keep = np.ones(meta['rows'], dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = False
+        kept_rows = np.flatnonzero(keep)
+
+        cls.write_chunks(
+            path,
+            (
+                (ids.take(kept_rows[start:start + chunk_size]), matrix[kept_rows[start:start + chunk_size]])
+                    for start in range(0, len(kept_rows), chunk_size)
+            ),
+            dtype=meta['dtype'],
+            blocks=cls.read_blocks(path)
+        )
+
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._index
+
+
+    def __getitem__(self, track_id: str) -> NDArray:
+        row = self._index.get(track_id)
+        if row < 0:
+            raise KeyError(track_id)
+        return self.matrix[row]
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+
+    def get(self, track_id: str, default: Optional[NDArray] = None) -> Optional[NDArray]:
+        row = self._index.get(track_id)
+        return self.matrix[row] if row >= 0 else default
+
+
+    def row_of(self, track_id: str) -> int:
+        return self._index.get(track_id)
+
+
+    def rows_of(self, track_ids: List[str]) -> NDArray:
+        """Rows of the tracks, -1 for tracks without vector"""
+        return self._index.get_many(track_ids)
+
+
+    def id_of(self, row: int) -> str:
+        return self._ids[row]
+
+
+    def keys(self) -> List[str]:
+        return self._ids if isinstance(self._ids, list) else self._ids.to_list()
+
+
+    def astype(self, dtype: str) -> 'RepresentationVectorStore':
+        """The store with its matrix in the given dtype, itself when it already is
+        (a converted matrix is held in memory, the stored one is unchanged)"""
+        if self.matrix.dtype == np.dtype(dtype):
+            return self
+        return RepresentationVectorStore(ids=self._ids, matrix=self.matrix.astype(dtype), path=self.path, blocks=self.blocks)
+
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
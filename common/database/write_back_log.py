@@ -0,0 +1,354 @@
+import os
+import json
+import zlib
+import fcntl
+import struct
+import sqlite3
+import threading
+import numpy as np
+
+from numpy.typing import NDArray
+from contextlib import closing
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from common.domain.models import Track, Artist
+
+
+class WriteBackLog:
+    """Append-only log of the objects fetched or computed at runtime
+    (tracks and artists from Spotify, representation vectors of new tracks)
+
+        header      b'MOSWBL02'
+        records     <kind: uint8><payload length: uint32><payload crc32: uint32><payload>
+
+    Track and artist payloads are the JSON of the domain model.
+    Vector payloads are <id length: uint16><id utf-8><float64 values>, without values
+    for tracks that have no representation vector.
+
+    Several processes (API workers, generations of a hot reload, the CLI) may write the
+    same log: every append holds an exclusive lock (flock) on the file. A record cut short
+    by a crash fails its checksum: reading stops there and the next append truncates the
+    log back to the last complete record. Compaction moves the log aside (detach) under the
+    same lock, writers notice the file they hold is no longer the log and reopen it.
+
+    Logs of the previous format (b'MOSWBL01') hold vectors weighted with the block weights of the
+    time, the stored vectors are unweighted now: their vector records are skipped when read and
+    dropped when the log is next appended to, the vectors are computed again.
+
+    Objects already in the log are not appended again (e.g fetched again once evicted
+    from a runtime cache), except a vector replacing a logged track without vector. The logged
+    ids are kept on disk, in a SQLite index next to the log (<log>.ids) shared by the writers
+    and rebuilt from the log when missing: memory does not grow with the objects logged.
+    """
+
+    MAGIC = b'MOSWBL02'
+    # previous format, with weighted vectors
+    _WEIGHTED_VECTORS_MAGIC = b'MOSWBL01'
+    # records moved aside for compaction, until they are folded into the catalog
+    DETACHED_SUFFIX = '.compacting'
+    # index of the logged ids, the ids of compacted records stay (they are in the catalog)
+    IDS_SUFFIX = '.ids'
+
+    TRACK = 1
+    ARTIST = 2
+    VECTOR = 3
+
+    _RECORD_HEADER = struct.Struct('<BII')
+    _ID_LENGTH = struct.Struct('<H')
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        # end of the complete records of the open file, known to this writer
+        self._end = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+
+    def exists(self) -> bool:
+        return os.path.isfile(self._path)
+
+
+    def append_track(self, track: Track) -> bool:
+        """Log a track, unless it is already logged
+
+        Returns:
+            bool: whether a record was appended
+        """
+        return self._append(self.TRACK, track.id, True, lambda: track.json().encode('utf-8'))
+
+
+    def append_artist(self, artist: Artist) -> bool:
+        """Log an artist, unless it is already logged
+
+        Returns:
+            bool: whether a record was appended
+        """
+        return self._append(self.ARTIST, artist.id, True, lambda: artist.json().encode('utf-8'))
+
+
+    def append_vector(self, track_id: str, vector: Optional[NDArray]) -> bool:
+        """Log the vector of a track (None when it has none), unless it is already logged
+
+        Returns:
+            bool: whether a record was appended
+        """
+        def payload() -> bytes:
+            encoded_id = track_id.encode('utf-8')
+            values = np.asarray(vector, dtype='<f8').tobytes() if vector is not None else b''
+            return self._ID_LENGTH.pack(len(encoded_id)) + encoded_id + values
+
+        return self._append(self.VECTOR, track_id, vector is not None, payload)
+
+
+    def _append(self, kind: int, record_id: str, has_value: bool, payload: Callable[[], bytes]) -> bool:
+        with self._lock:
+            self._lock_current_file()
+            try:
+                # a record cut short by a crashed writer is overwritten
+                self._repair()
+                with closing(self._open_ids()) as ids:
+                    logged = ids.execute("SELECT has_value FROM logged WHERE kind = ? AND id = ?", (kind, record_id)).fetchone()
+                    # logged with a value, or nothing more to log
+                    if logged is not None and (logged[0] or not has_value):
+                        return False
+
+                    record = self._record(kind, payload())
+                    # one unbuffered write per record
+                    self._file.write(record)
+                    self._end += len(record)
+                    ids.execute("INSERT OR REPLACE INTO logged VALUES (?, ?, ?)", (kind, record_id, has_value))
+                    ids.commit()
+                    return True
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+    def _lock_current_file(self) -> None:
+        """Open the log if needed and lock it, reopened when it was moved aside or removed"""
+        while True:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+                self._file = open(self._path, 'a+b', buffering=0)
+                self._end = None
+
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            if self._is_current(self._file):
+                if os.pread(self._file.fileno(), len(self.MAGIC), 0) != self._WEIGHTED_VECTORS_MAGIC:
+                    return
+                # replaced by a log of the current format (and its index rebuilt), reopened
+                self._upgrade()
+                self._remove_ids()
+
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+    def _record(self, kind: int, payload: bytes) -> bytes:
+        return self._RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+    def _upgrade(self) -> None:
+        """With the log locked: replace a log of the previous format by one of the current format,
+        without the weighted vectors"""
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self.MAGIC)
+            # vector records of the previous format are skipped
+            for kind, payload, _ in self._scan():
+                f.write(self._record(kind, payload))
+        os.replace(temp_path, self._path)
+
+
+    def _is_current(self, f) -> bool:
+        """Whether an open file is still the log (not detached or cleared by another process)"""
+        try:
+            path_stat = os.stat(self._path)
+        except FileNotFoundError:
+            return False
+        file_stat = os.fstat(f.fileno())
+        return (path_stat.st_ino, path_stat.st_dev) == (file_stat.st_ino, file_stat.st_dev)
+
+
+    def _repair(self) -> None:
+        """With the log locked: find the end of the complete records, from self._end (records of
+        other writers since the last append) or from the start when the file was just opened,
+        and cut a record left incomplete by a crashed writer"""
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(self.MAGIC):
+            os.ftruncate(self._file.fileno(), 0)
+            self._file.write(self.MAGIC)
+            self._end = len(self.MAGIC)
+            return
+
+        if self._end is not None and self._end == size:
+            return
+
+        start = self._end if self._end is not None and self._end < size else None
+        end = start if start is not None else len(self.MAGIC)
+        for _, _, end in self._scan(start):
+            pass
+        if end < size:
+            os.ftruncate(self._file.fileno(), end)
+        self._end = end
+
+
+    def _open_ids(self) -> sqlite3.Connection:
+        """With the log locked: index of the logged ids, built from the log (and the records
+        detached for a compaction) when there is none"""
+        path = self._path + self.IDS_SUFFIX
+        if not os.path.isfile(path):
+            temp_path = path + '.tmp'
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with closing(sqlite3.connect(temp_path)) as connection:
+                connection.execute(
+                    "CREATE TABLE logged (kind INTEGER, id TEXT, has_value INTEGER, PRIMARY KEY (kind, id)) WITHOUT ROWID"
+                )
+                for log_path in [self._path + self.DETACHED_SUFFIX, self._path]:
+                    for kind, payload, _ in self._scan(path=log_path):
+                        record_id, has_value = self._record_id(kind, payload)
+                        connection.execute(
+                            "INSERT INTO logged VALUES (?, ?, ?) "
+                            "ON CONFLICT (kind, id) DO UPDATE SET has_value = max(has_value, excluded.has_value)",
+                            (kind, record_id, has_value)
+                        )
+                connection.commit()
+            os.replace(temp_path, path)
+        return sqlite3.connect(path)
+
+
+    def _remove_ids(self) -> None:
+        """With the log locked: drop the index, rebuilt from the log on the next append"""
+        path = self._path + self.IDS_SUFFIX
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+    def _scan(self, start: Optional[int] = None, path: Optional[str] = None) -> Iterator[Tuple[int, bytes, int]]:
+        """Complete records of the log as (kind, payload, end offset), from an offset
+        (a record boundary) or from the first record. Vector records of the previous format
+        are skipped."""
+        path = path if path is not None else self._path
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'rb') as f:
+            magic = f.read(len(self.MAGIC))
+            if magic not in (self.MAGIC, self._WEIGHTED_VECTORS_MAGIC):
+                raise ValueError(f"{path} is not a write-back log")
+
+            offset = start if start is not None else len(self.MAGIC)
+            f.seek(offset)
+            while True:
+                header = f.read(self._RECORD_HEADER.size)
+                if len(header) < self._RECORD_HEADER.size:
+                    return
+
+                kind, length, checksum = self._RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return
+
+                offset += self._RECORD_HEADER.size + length
+                if kind != self.VECTOR or magic == self.MAGIC:
+                    yield kind, payload, offset
+
+
+    def _record_id(self, kind: int, payload: bytes) -> Tuple[str, bool]:
+        """Id of a record and whether it has a value"""
+        if kind == self.VECTOR:
+            id_length = self._ID_LENGTH.unpack_from(payload)[0]
+            start = self._ID_LENGTH.size
+            return payload[start:start + id_length].decode('utf-8'), len(payload) > start + id_length
+        return json.loads(payload)['id'], True
+
+
+    def load(self) -> Tuple[Dict[str, Track], Dict[str, Artist], Dict[str, Optional[NDArray]]]:
+        """Read the whole log, later records of the same id replace earlier ones
+
+        Records moved aside by a compaction that did not complete come first.
+
+        Returns:
+            Tuple[Dict[str, Track], Dict[str, Artist], Dict[str, Optional[NDArray]]]:
+                tracks, artists and representation vectors by id
+        """
+        tracks, artists, vectors = {}, {}, {}
+
+        for path in [self._path + self.DETACHED_SUFFIX, self._path]:
+            for kind, payload, _ in self._scan(path=path):
+                if kind == self.TRACK:
+                    track = Track(**json.loads(payload))
+                    tracks[track.id] = track
+
+                elif kind == self.ARTIST:
+                    artist = Artist(**json.loads(payload))
+                    artists[artist.id] = artist
+
+                elif kind == self.VECTOR:
+                    track_id, has_value = self._record_id(kind, payload)
+                    start = self._ID_LENGTH.size + len(track_id.encode('utf-8'))
+                    vectors[track_id] = np.frombuffer(payload, dtype='<f8', offset=start).copy() if has_value else None
+
+        return tracks, artists, vectors
+
+
+    def detach(self) -> Optional['WriteBackLog']:
+        """Move the records aside for a compaction, writers continue in a new log
+
+        A log detached by a compaction that did not complete is returned as it is,
+        the records written since stay in the log for the next compaction.
+
+        Returns:
+            Optional[WriteBackLog]: the detached records (clear it once they are folded), None if there are none
+        """
+        detached = WriteBackLog(self._path + self.DETACHED_SUFFIX)
+        if detached.exists():
+            return detached
+
+        while True:
+            try:
+                f = open(self._path, 'rb')
+            except FileNotFoundError:
+                return None
+
+            with f:
+                # no append in progress, writers holding the file reopen the log after the rename
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # detached meanwhile by another compaction
+                if detached.exists():
+                    return detached
+                if self._is_current(f):
+                    os.rename(self._path, detached.path)
+                    return detached
+
+
+    def clear(self) -> None:
+        """Drop every record (once they are folded into the catalog)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            try:
+                f = open(self._path, 'rb')
+            except FileNotFoundError:
+                f = None
+            if f is not None:
+                with f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    if self._is_current(f):
+                        os.remove(self._path)
+                        self._remove_ids()
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
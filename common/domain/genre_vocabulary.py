@@ -0,0 +1,128 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from typing import Dict, Iterable, List, Optional
+
+
+class GenreVocabulary:
+    """Genre vocabulary
+
+    Every genre is normalized once and mapped to an integer id.
+    Genre lists are then carried around as integer arrays and
+    (artist / track) -> genre relations as CSR sparse matrices.
+
+    The vocabulary only grows: ids never change once given, so it can be shared
+    (e.g between the track store and runtime tracks fetched from Spotify).
+    """
+
+    def __init__(self, genres: Optional[Iterable[str]] = None):
+        self._genres: List[str] = []
+        self._lowercase: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        for genre in genres or []:
+            self.add(genre)
+
+
+    @staticmethod
+    def normalize(genre: str) -> str:
+        return genre.strip().strip("'")
+
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'GenreVocabulary':
+        return cls(pd.read_csv(path, keep_default_na=False)['word'].to_list())
+
+
+    def to_csv(self, path: str) -> None:
+        pd.DataFrame(self._genres, columns=['word']).to_csv(path, index=False)
+
+
+    @property
+    def genres(self) -> List[str]:
+        return self._genres
+
+
+    def __len__(self) -> int:
+        return len(self._genres)
+
+
+    def __contains__(self, genre: str) -> bool:
+        return self.normalize(genre) in self._index
+
+
+    def add(self, genre: str) -> int:
+        """Id of the genre, registering it if needed (-1 for empty genres)"""
+        genre = self.normalize(genre)
+
+        if genre == "":
+            return -1
+
+        genre_id = self._index.get(genre)
+        if genre_id is not None:
+            return genre_id
+
+        with self._lock:
+            if genre not in self._index:
+                self._genres.append(genre)
+                self._lowercase.append(genre.lower())
+                # published last, a reader seeing the id always finds the genre
+                self._index[genre] = len(self._genres) - 1
+            return self._index[genre]
+
+
+    def id_of(self, genre: str) -> int:
+        return self._index.get(self.normalize(genre), -1)
+
+
+    def encode(self, genres: Iterable[str], add_missing: Optional[bool] = False) -> NDArray:
+        """Genre ids of a list of genres, -1 for unknown (or empty) genres"""
+        lookup = self.add if add_missing else self.id_of
+        return np.array([lookup(genre) for genre in genres], dtype=np.int32)
+
+
+    def decode(self, genre_ids: Iterable[int]) -> List[str]:
+        return [self._genres[genre_id] for genre_id in genre_ids]
+
+
+    def ids_containing(self, term: str) -> NDArray:
+        """Ids of all genres that contain the term (case insensitive)"""
+        term = term.lower()
+        return np.array([genre_id for genre_id, genre in enumerate(self._lowercase) if term in genre], dtype=np.int32)
+
+
+    def csr(self, codes: NDArray, offsets: NDArray) -> csr_matrix:
+        """(rows x genres) sparse matrix from per-row genre ids
+
+        Row i holds the genres codes[offsets[i]:offsets[i + 1]] in their original order.
+        Duplicates are kept as separate entries (summed by any arithmetic),
+        so matrix.indices is the ordered genre list of every row.
+
+        Args:
+            codes (NDArray): genre ids of all rows, concatenated
+            offsets (NDArray): (rows + 1) offsets into codes
+
+        Returns:
+            csr_matrix
+        """
+        return csr_matrix(
+            (np.ones(len(codes), dtype=np.float64), np.asarray(codes, dtype=np.int32), np.asarray(offsets, dtype=np.int64)),
+            shape=(len(offsets) - 1, len(self))
+        )
+
+
+    def encode_lists(self, genre_lists: Iterable[Iterable[str]], add_missing: Optional[bool] = False) -> csr_matrix:
+        """(rows x genres) sparse matrix of genre lists, unknown and empty genres are dropped"""
+        codes, lengths = [], []
+        for genres in genre_lists:
+            row = [genre_id for genre_id in self.encode(genres or [], add_missing=add_missing).tolist() if genre_id >= 0]
+            codes += row
+            lengths.append(len(row))
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return self.csr(np.array(codes, dtype=np.int32), offsets)
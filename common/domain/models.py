@@ -62,6 +62,15 @@ class Artist(BaseModel):
 class RepresentationVector(np.ndarray): pass
 
 
+class VectorBlock(BaseModel):
+    """Columns [start, stop) of the representation vectors holding one kind of information,
+    with the weight applied to them when vectors are compared"""
+    name: str
+    start: int
+    stop: int
+    weight: float = 1.0
+
+
 class RecommendedTrack(BaseModel):
     track: Track
     score: float
@@ -1,4 +1,6 @@
+import os
 import re
+import hashlib
 from typing import List, Any, Tuple
 
 
@@ -11,6 +13,16 @@ def clear_name_text(
     return temp.strip()
 
 
+def files_fingerprint(paths: List[str]) -> str:
+    """Fingerprint of a set of files, from their path, size and modification time.
+    Changes whenever one of the files is rewritten."""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
 def binary_search(alist: List[Any], item: Any) -> Tuple[int, bool]:
     index_first = 0
     index_last = len(alist) - 1
@@ -0,0 +1,267 @@
+import os
+import json
+import numpy as np
+
+from numpy.typing import NDArray
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.database.vector_store import RepresentationVectorStore
+from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+
+
+class IVFCosineIndex:
+    """Approximate cosine nearest neighbors (inverted file, IVF-flat) over the rows of a
+    BlockWeightedCosineIndex, stored next to the representation vectors
+
+        <store>/ivf/meta.json           lists, rows, build parameters and the store files and blocks it was built for
+        <store>/ivf/centroids.bin       (lists x dimension) float64 unit centroids
+        <store>/ivf/offsets.bin         (lists + 1) int64 start of every list in rows.bin
+        <store>/ivf/rows.bin            (rows) int64 rows of the store, grouped by list
+
+    The lists are a spherical k-means of the vectors weighted with the default block weights.
+    A query is compared to the centroids, the rows of the n_probe nearest lists are the
+    candidates (more lists are probed until there are n_neighbors candidates) and the candidates
+    are ranked by the exact index: the distances are exact, only neighbors outside the probed
+    lists are missed. With other block weights the query is weighted with them but the lists
+    stay the ones of the default weights, recall is lower the more the weights differ.
+    """
+
+    DIRECTORY = 'ivf'
+    META_FILE = 'meta.json'
+    CENTROIDS_FILE = 'centroids.bin'
+    OFFSETS_FILE = 'offsets.bin'
+    ROWS_FILE = 'rows.bin'
+    # store files the lists are valid for, by size and modification time (and the block weights)
+    SOURCE_FILES = ['matrix.bin', 'ids.data']
+
+    def __init__(
+        self,
+        index: BlockWeightedCosineIndex,
+        centroids: NDArray,
+        offsets: NDArray,
+        rows: NDArray,
+        n_probe: Optional[int] = 64
+    ):
+        """
+        Args:
+            index (BlockWeightedCosineIndex): exact index of the vectors, ranks the candidates
+            centroids (NDArray): (lists x dimension) unit centroids of the lists
+            offsets (NDArray): (lists + 1) start of every list in rows
+            rows (NDArray): rows of the index, grouped by list
+            n_probe (Optional[int]): lists probed per query, more is slower and closer to the exact neighbors
+        """
+        self.index = index
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.n_probe = n_probe
+
+
+    @classmethod
+    def build(
+        cls,
+        index: BlockWeightedCosineIndex,
+        n_lists: Optional[int] = None,
+        iterations: Optional[int] = 10,
+        sample_size: Optional[int] = 100_000,
+        n_probe: Optional[int] = 64,
+        seed: Optional[int] = 0
+    ) -> 'IVFCosineIndex':
+        """Cluster the rows of an index into lists
+
+        The centroids are fitted on a random sample of the rows, then every row is assigned
+        to its nearest centroid, one chunk of rows at a time.
+
+        Args:
+            index (BlockWeightedCosineIndex): exact index of the vectors
+            n_lists (Optional[int]): number of lists, 2 sqrt(rows) if not given
+            iterations (Optional[int]): k-means iterations
+            sample_size (Optional[int]): rows the centroids are fitted on
+            n_probe (Optional[int]): lists probed per query
+            seed (Optional[int]): seed of the sample and of the initial centroids
+
+        Returns:
+            IVFCosineIndex: index of the rows
+        """
+        n_rows = len(index)
+        if n_rows == 0:
+            raise ValueError("No vectors to index")
+
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n_rows, min(sample_size, n_rows), replace=False))
+        n_lists = max(1, min(n_lists or int(2 * np.sqrt(n_rows)), len(sample_rows)))
+        sample = index.normalized_rows(sample_rows)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            # empty (or zero) lists restart from a random sample row
+            empty = norms == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.linalg.norm(sums, axis=1)[:, np.newaxis].clip(min=np.finfo(np.float64).tiny)
+
+        assignments = np.concatenate([
+            np.argmax(index.normalized_rows(slice(start, start + index.chunk_size)) @ centroids.T, axis=1)
+                for start in range(0, n_rows, index.chunk_size)
+        ])
+        rows = np.argsort(assignments, kind='stable').astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+        return cls(index=index, centroids=centroids, offsets=offsets, rows=rows, n_probe=n_probe)
+
+
+    def save(self, path: str, parameters: Optional[Dict] = None) -> None:
+        """Write the lists next to the vectors of a store, replacing previous ones
+
+        Args:
+            path (str): store directory the index was built from
+            parameters (Optional[Dict]): build parameters, kept in meta.json
+        """
+        directory = os.path.join(path, self.DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        for file_name, values in [
+            (self.CENTROIDS_FILE, self.centroids.astype('<f8')),
+            (self.OFFSETS_FILE, self.offsets.astype('<i8')),
+            (self.ROWS_FILE, self.rows.astype('<i8'))
+        ]:
+            with open(os.path.join(directory, file_name + '.tmp'), 'wb') as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+            os.replace(os.path.join(directory, file_name + '.tmp'), os.path.join(directory, file_name))
+
+        meta = {
+            'lists': len(self.centroids),
+            'rows': len(self.rows),
+            'dimension': int(self.centroids.shape[1]),
+            'parameters': parameters or {},
+            'source': self._source(path)
+        }
+        temp_path = os.path.join(directory, self.META_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(temp_path, os.path.join(directory, self.META_FILE))
+
+
+    @classmethod
+    def load(
+        cls,
+        path: Optional[str],
+        index: BlockWeightedCosineIndex,
+        n_probe: Optional[int] = 64
+    ) -> Optional['IVFCosineIndex']:
+        """Open the lists saved next to the vectors of a store, without fitting anything
+
+        Args:
+            path (Optional[str]): store directory
+            index (BlockWeightedCosineIndex): exact index of the vectors of the store
+            n_probe (Optional[int]): lists probed per query
+
+        Returns:
+            Optional[IVFCosineIndex]: the index, None if there is none or if the vectors (or their default
+                block weights, the lists are clustered with) changed since it was built
+        """
+        if path is None or not os.path.exists(os.path.join(path, cls.DIRECTORY, cls.META_FILE)):
+            return None
+
+        directory = os.path.join(path, cls.DIRECTORY)
+        with open(os.path.join(directory, cls.META_FILE)) as f:
+            meta = json.load(f)
+        if meta['source'] != cls._source(path) or meta['rows'] != len(index):
+            return None
+
+        return cls(
+            index=index,
+            centroids=np.fromfile(os.path.join(directory, cls.CENTROIDS_FILE), dtype='<f8').reshape(meta['lists'], meta['dimension']),
+            offsets=np.fromfile(os.path.join(directory, cls.OFFSETS_FILE), dtype='<i8'),
+            rows=np.memmap(os.path.join(directory, cls.ROWS_FILE), dtype='<i8', mode='r', shape=(meta['rows'],)),
+            n_probe=n_probe
+        )
+
+
+    @classmethod
+    def _source(cls, path: str) -> Dict[str, Any]:
+        # size and modification time, independent of where the store is
+        source = {}
+        for file_name in cls.SOURCE_FILES:
+            if os.path.exists(os.path.join(path, file_name)):
+                stat = os.stat(os.path.join(path, file_name))
+                source[file_name] = [stat.st_size, stat.st_mtime_ns]
+        # rewritten in meta.json only when the default weights change
+        blocks = RepresentationVectorStore.read_blocks(path) if RepresentationVectorStore.exists(path) else None
+        source['blocks'] = [block.dict() for block in blocks] if blocks is not None else None
+        return source
+
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+    def block_weights(self, weights: Optional[Dict[str, float]] = None) -> NDArray:
+        return self.index.block_weights(weights)
+
+
+    def column_weights(self, weights: Optional[Dict[str, float]] = None) -> NDArray:
+        return self.index.column_weights(weights)
+
+
+    def _centroids(self, column_weights: NDArray) -> NDArray:
+        """Unit centroids with other column weights: the centroids are unweighted (columns of a
+        default weight of 0 stay 0), weighted with the given weights and normalized again"""
+        default_weights = self.index.column_weights()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centroids = self.centroids * np.where(default_weights != 0, column_weights / default_weights, 0)
+        norms = np.linalg.norm(centroids, axis=1)[:, np.newaxis]
+        return np.divide(centroids, norms, out=np.zeros_like(centroids), where=norms > 0)
+
+
+    def candidates(self, queries: NDArray, n_neighbors: int, weights: Optional[Dict[str, float]] = None) -> List[NDArray]:
+        """Rows of the probed lists of every query, ascending
+
+        Args:
+            queries (NDArray): (queries x dimension) unweighted vectors
+            n_neighbors (int): minimum number of candidates, lists are added past n_probe until reached
+            weights (Optional[Dict[str, float]]): block weights overriding the default ones
+
+        Returns:
+            List[NDArray]: candidate rows of every query
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.centroids.shape[1])
+        list_sizes = np.diff(self.offsets)
+        column_weights = self.column_weights(weights)
+        list_order = np.argsort(
+            -(queries * column_weights) @ self._centroids(column_weights).T, axis=1, kind='stable'
+        )
+
+        candidates = []
+        for lists in list_order:
+            # the n_probe nearest lists, and the next ones until there are enough candidates
+            probed = max(self.n_probe, int(np.searchsorted(np.cumsum(list_sizes[lists]), n_neighbors)) + 1)
+            candidates.append(np.sort(np.concatenate(
+                [self.rows[self.offsets[lst]:self.offsets[lst + 1]] for lst in lists[:probed]] + [np.empty(0, dtype=np.int64)]
+            )))
+        return candidates
+
+
+    def kneighbors(
+        self,
+        queries: NDArray,
+        n_neighbors: Optional[int] = 100,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[NDArray, NDArray]:
+        """Approximate nearest rows of every query, same interface and distances as
+        BlockWeightedCosineIndex.kneighbors
+
+        Args:
+            queries (NDArray): (queries x dimension) unweighted vectors
+            n_neighbors (Optional[int]): neighbors per query
+            weights (Optional[Dict[str, float]]): block weights overriding the default ones
+
+        Returns:
+            Tuple[NDArray, NDArray]: (queries x n_neighbors) distances and rows, nearest first
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.centroids.shape[1])
+        n_neighbors = min(n_neighbors, len(self.index))
+        return self.index.kneighbors_among(
+            queries, self.candidates(queries, n_neighbors, weights), n_neighbors=n_neighbors, weights=weights
+        )
@@ -1,16 +1,21 @@
+import logging
 import numpy as np
 
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict, Tuple, Union
 from numpy.typing import NDArray
-from sklearn.neighbors import NearestNeighbors
 from collections import Counter
 
+from settings import get_settings
 from recommender_system.algorithm.profile_creator import ProfileCreator
 from recommender_system.algorithm.curator import MusicCurator
 from recommender_system.algorithm.track_pool_processor import TrackPoolProcessor
 from recommender_system.algorithm.settings_filter import SettingsFilter
+from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+from recommender_system.algorithm.ivf_index import IVFCosineIndex
+from recommender_system.data_engineering.catalog_service import CatalogService
 from recommender_system.data_engineering.data_provider import DataProvider
 from common.data_transfer.models import SessionSettings as SessionSettings
+from common.database.vector_store import RepresentationVectorStore
 from common.domain.models import (
     Track, 
     Artist, 
@@ -20,62 +25,139 @@ from common.domain.models import (
 )
 
 
+logger = logging.getLogger(__name__)
+
+
 class NearestNeighborsRecommender:
 
-    def __init__(self):
-        self._data_provider = DataProvider()
+    def __init__(self, catalog_service: Optional[CatalogService] = None):
+        self._data_provider = DataProvider(catalog_service=catalog_service)
         self._profile_creator = ProfileCreator()
-        self._recommender_model = NearestNeighbors(
-            n_neighbors=100,
-            metric='cosine'
-        )
+        self._n_neighbors = 100
+        self._recommender_model: Union[BlockWeightedCosineIndex, IVFCosineIndex] = None
         self._curator = MusicCurator()
-        self._fit_data_keys: List[str] = None
+        self._track_vectors: RepresentationVectorStore = None
+        # venue block weights, over the default weights stored with the vectors
+        self._block_weights: Optional[Dict[str, float]] = get_settings().representation_block_weights
         self.prepare_recommender()
 
 
     def prepare_recommender(self):
+        # the store matrix is NaN free and memory mapped - index it directly, without copies
         track_vectors = self._data_provider.get_all_representation_vectors()
-        self._fit_data_keys = list(track_vectors.keys())
-        self._fit_model(
-            [np.nan_to_num(track_repr_vector, nan=-1) for track_repr_vector in track_vectors.values()]
-        )
+        self._track_vectors = track_vectors
+        self._fit_model(track_vectors.matrix)
 
 
     def _fit_model(
         self,
-        fit_data: List[NDArray]
+        fit_data: NDArray
     ):
-        self._recommender_model.fit(fit_data)
+        settings = get_settings()
+        if settings.nearest_neighbors_engine not in ('exact', 'ivf'):
+            raise ValueError(f"Unknown nearest neighbors engine {settings.nearest_neighbors_engine}, use 'exact' or 'ivf'")
+
+        self._recommender_model = BlockWeightedCosineIndex(fit_data, blocks=self._track_vectors.blocks)
+        if settings.nearest_neighbors_engine == 'ivf':
+            # built offline (cli build-vector-index) and only opened here
+            ivf_index = IVFCosineIndex.load(self._track_vectors.path, self._recommender_model, n_probe=settings.ivf_n_probe)
+            if ivf_index is None:
+                logger.warning(
+                    "No IVF index for the representation vectors in %s (missing or built for other vectors), "
+                    "exact search is used", self._track_vectors.path
+                )
+            else:
+                self._recommender_model = ivf_index
+
+
+    def block_weights(self, session_settings: Optional[SessionSettings] = None) -> Optional[Dict[str, float]]:
+        """Block weights of a request: the venue weights, overridden by the ones of the session"""
+        session_weights = session_settings.block_weights if session_settings is not None else None
+        if self._block_weights is None and session_weights is None:
+            return None
+        return {**(self._block_weights or {}), **(session_weights or {})}
+
+
+    def column_weights(self, session_settings: Optional[SessionSettings] = None) -> NDArray:
+        """Weight of every column of the representation vectors for a request"""
+        return self._recommender_model.column_weights(self.block_weights(session_settings))
 
 
     def find_k_most_similar_tracks(
         self,
         category: int,
         track_vector: RepresentationVector,
-        exclude_tracks: Optional[List[Track]] = None
+        exclude_tracks: Optional[List[Track]] = None,
+        block_weights: Optional[Dict[str, float]] = None
     ) -> List[RecommendedTrack]:
         """Find K most similar tracks based on representation vector
 
         Args:
-            track_vectors (RepresentationVector): repr vector
+            track_vectors (RepresentationVector): unweighted repr vector
             exclude_tracks (Optional[List[Track]]): tracks to be excluded
+            block_weights (Optional[Dict[str, float]]): block weights of the comparison, the default ones if not given
 
         Returns:
             List[RecommendedTrack]: neighbors found, with score and category
         """
-        
+        return self._find_k_most_similar_tracks(
+            track_vectors=[track_vector],
+            categories=[category],
+            block_weights=block_weights
+        )[0]
+
+
+    def find_k_most_similar_tracks_per_category(
+        self,
+        track_vectors: List[RepresentationVector],
+        block_weights: Optional[Dict[str, float]] = None
+    ) -> List[List[RecommendedTrack]]:
+        """Find K most similar tracks for every vector of a profile (category = position of the vector),
+        with a single query: the catalog is scanned once for all the categories
+
+        Args:
+            track_vectors (List[RepresentationVector]): unweighted repr vectors, e.g the eigen tracks of a profile
+            block_weights (Optional[Dict[str, float]]): block weights of the comparison, the default ones if not given
+
+        Returns:
+            List[List[RecommendedTrack]]: neighbors found for every category, with score and category
+        """
+        return self._find_k_most_similar_tracks(
+            track_vectors=track_vectors,
+            categories=list(range(len(track_vectors))),
+            block_weights=block_weights
+        )
+
+
+    def _find_k_most_similar_tracks(
+        self,
+        track_vectors: List[RepresentationVector],
+        categories: List[int],
+        block_weights: Optional[Dict[str, float]] = None
+    ) -> List[List[RecommendedTrack]]:
+
+        if len(track_vectors) == 0:
+            return []
+
         distances, neighbors = self._recommender_model.kneighbors(
-            track_vector.reshape(1, -1), 
-            return_distance=True
+            np.vstack(track_vectors),
+            n_neighbors=self._n_neighbors,
+            weights=block_weights
         )
 
+        # the neighbors of all the categories are resolved in one batch, once per track
+        neighbor_ids = [[self._track_vectors.id_of(ngbr) for ngbr in row] for row in neighbors.tolist()]
+        unique_ids = list(dict.fromkeys(track_id for row in neighbor_ids for track_id in row))
+        tracks = dict(zip(unique_ids, self._data_provider.get_tracks(unique_ids)))
+
         return [
-            RecommendedTrack(
-                track=self._data_provider.get_track(self._fit_data_keys[ngbr]),
-                score=distance,
-                category=category
-            )   for distance, ngbr in zip(distances[0], neighbors[0])
+            [
+                RecommendedTrack(
+                    track=tracks[track_id],
+                    score=distance,
+                    category=category
+                )   for distance, track_id in zip(row_distances, row_ids)
+            ]   for category, row_distances, row_ids in zip(categories, distances, neighbor_ids)
         ]
 
 
@@ -89,7 +171,8 @@ class NearestNeighborsRecommender:
             vector = self._data_provider.get_track_representation_vector(track)
             
             if vector is not None:
-                track_pool_vectors[track.id] = vector
+                # profiles are created in the dtype of the catalog vectors
+                track_pool_vectors[track.id] = np.asarray(vector, dtype=self._track_vectors.matrix.dtype)
                 
         return track_pool_vectors
 
@@ -110,7 +193,8 @@ class NearestNeighborsRecommender:
         
         # initialize a Settings Filter class based on the session settings
         session_settings_filter = SettingsFilter(
-            session_settings=session_settings
+            session_settings=session_settings,
+            genre_vocabulary=self._data_provider.get_genre_vocabulary()
         )
         
         track_pool_vectors = self.get_track_pool_vectors(
@@ -120,21 +204,24 @@ class NearestNeighborsRecommender:
         if len(track_pool_vectors) <= 0:
             return []
         
+        block_weights = self.block_weights(session_settings)
+        
         # create the profile for the track pool created by the users
         eigen_tracks, weights = self._profile_creator.create_profile_for_track_pool(
             track_vectors=track_pool_vectors,
-            track_pool=track_pool
+            track_pool=track_pool,
+            column_weights=self._recommender_model.column_weights(block_weights)
         )
         
+        # get recommendations, for all the eigen tracks at once
+        similar_tracks_per_category = self.find_k_most_similar_tracks_per_category(
+            track_vectors=eigen_tracks,
+            block_weights=block_weights
+        )
+
         tracks_to_recommend = []
         weight_per_category = {}
-        for category, eigen_track in enumerate(eigen_tracks):
-            
-            # get recommendations
-            similar_tracks: List[RecommendedTrack] = self.find_k_most_similar_tracks(
-                category=category,
-                track_vector=eigen_track
-            )
+        for category, similar_tracks in enumerate(similar_tracks_per_category):
 
             # filter recommendations
             similar_tracks_abiding_to_filters = session_settings_filter.filter(
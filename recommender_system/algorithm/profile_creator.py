@@ -34,6 +34,13 @@ class ProfileCreator:
         )
 
 
+    @staticmethod
+    def _weighted(vectors: List[RepresentationVector], column_weights: Optional[NDArray]) -> NDArray:
+        # clusters are found on the weighted vectors, as they are compared by the recommender
+        vectors = np.array(vectors)
+        return vectors * column_weights if column_weights is not None else vectors
+
+
     def _determine_eps(self, data, min_samples: int = 4) -> float:
         # determine eps
         nbrs = NearestNeighbors(n_neighbors=min_samples).fit(data)
@@ -47,20 +54,22 @@ class ProfileCreator:
     def create_profile_for_track_pool(
         self,
         track_vectors: Dict[str, RepresentationVector],
-        track_pool: Dict[str, TrackPoolItem]
+        track_pool: Dict[str, TrackPoolItem],
+        column_weights: Optional[NDArray] = None
     ) -> Tuple[List[RepresentationVector], List[float]]:
         """Representation vector creation
 
         Args:
             tracks (List[Track]): a set of tracks which will be later described by the representation vectors
+            column_weights (Optional[NDArray]): weight of every column of the (unweighted) vectors, for the clustering
 
         Returns:
-            Tuple[List[Track], List[float]]: a set of representation vectors for all distinct groups in track pool, along with their weights [0-1]
+            Tuple[List[Track], List[float]]: a set of unweighted representation vectors for all distinct groups in track pool, along with their weights [0-1]
         """
         track_vectors_ids = list(track_vectors.keys())
 
         track_reduced_vectors = self._dimensionality_reducer.fit_transform(
-            np.array(list(track_vectors.values()))
+            self._weighted(list(track_vectors.values()), column_weights)
         )
 
         eps = self._determine_eps(
@@ -102,13 +111,14 @@ class ProfileCreator:
             profile_weights.append(
                 np.sum(weights_per_cluster[cluster]) / sum_of_freq
             )
-            # Weighted average of track features based on frequencies
+            # Weighted average of track features based on frequencies, in the dtype of the vectors
+            points = np.array(points_per_cluster[cluster])
             representation_vectors.append(
                 np.average(
-                    np.array(points_per_cluster[cluster]), 
+                    points, 
                     weights=np.array(weights_per_cluster[cluster]),
                     axis=0
-                )
+                ).astype(points.dtype, copy=False)
             )
         
         return representation_vectors, profile_weights
@@ -116,13 +126,14 @@ class ProfileCreator:
     
     def get_tsne_points_with_cluster(
         self, 
-        tracks: List[RepresentationVector]
+        tracks: List[RepresentationVector],
+        column_weights: Optional[NDArray] = None
     ) -> List[Tuple[NDArray, int]]:
         
         representation_vectors = [vector for vector in tracks if vector is not None]
 
         track_reduced_vectors: NDArray = self._dimensionality_reducer.fit_transform(
-            np.array(representation_vectors)
+            self._weighted(representation_vectors, column_weights)
         )
 
         eps = self._determine_eps(
@@ -1,5 +1,9 @@
-from typing import List, Tuple
+import numpy as np
 
+from numpy.typing import NDArray
+from typing import List, Tuple, Optional
+
+from common.domain.genre_vocabulary import GenreVocabulary
 from common.domain.models import Track, RecommendedTrack
 from common.data_transfer.models import SessionSettings, Mode
 
@@ -26,13 +30,25 @@ class SettingsFilter:
 
     def __init__(
         self, 
-        session_settings: SessionSettings
+        session_settings: SessionSettings,
+        genre_vocabulary: Optional[GenreVocabulary] = None
     ):
         self.include_genres = session_settings.include_genres \
                                 if session_settings is not None and session_settings.include_genres is not None else []
         self.exclude_genres = session_settings.exclude_genres \
                                 if session_settings is not None and session_settings.exclude_genres is not None else []
 
+        # genre filters are resolved once into boolean masks over the genre ids
+        self._genre_vocabulary = genre_vocabulary
+        self._include_genre_masks: List[NDArray] = []
+        self._exclude_genre_mask: NDArray = None
+
+        if genre_vocabulary is not None:
+            self._include_genre_masks = [self.__genre_mask(genre) for genre in self.include_genres]
+            self._exclude_genre_mask = np.zeros(len(genre_vocabulary), dtype=bool)
+            for genre in self.exclude_genres:
+                self._exclude_genre_mask |= self.__genre_mask(genre)
+
         mode = session_settings.danceability if session_settings is not None else None
         
         if mode == Mode.High:
@@ -80,19 +96,21 @@ class SettingsFilter:
             self.instrumentalness = [0.0, 1.0]
 
 
-    def __abides(self, track: Track) -> bool:
-        if not (self.danceability[0] <= track.danceability <= self.danceability[1]):
-            return False
+    def __genre_mask(self, genre: str) -> NDArray:
+        mask = np.zeros(len(self._genre_vocabulary), dtype=bool)
+        mask[self._genre_vocabulary.ids_containing(genre)] = True
+        return mask
+
+
+    def __abides_genres(self, track: Track) -> bool:
+        if self._genre_vocabulary is not None:
+            genre_ids = self._genre_vocabulary.encode(track.genres)
+
+            # genres unknown when the filter was created are matched as text below
+            if (genre_ids >= 0).all() and (genre_ids < len(self._exclude_genre_mask)).all():
+                return all(mask[genre_ids].any() for mask in self._include_genre_masks) \
+                    and not self._exclude_genre_mask[genre_ids].any()
 
-        if not (self.energy[0] <= track.energy <= self.energy[1]):
-            return False
-        
-        if not (self.valence[0] <= track.valence <= self.valence[1]):
-            return False
-        
-        if not (self.instrumentalness[0] <= track.instrumentalness <= self.instrumentalness[1]):
-            return False
-        
         track_genres = ", ".join(track.genres).lower()
 
         for genre in self.include_genres:
@@ -104,8 +122,24 @@ class SettingsFilter:
             
             if track_genres.find(genre.lower()) != -1:
                 return False
+
+        return True
+
+
+    def __abides(self, track: Track) -> bool:
+        if not (self.danceability[0] <= track.danceability <= self.danceability[1]):
+            return False
+
+        if not (self.energy[0] <= track.energy <= self.energy[1]):
+            return False
+        
+        if not (self.valence[0] <= track.valence <= self.valence[1]):
+            return False
+        
+        if not (self.instrumentalness[0] <= track.instrumentalness <= self.instrumentalness[1]):
+            return False
         
-        return True 
+        return self.__abides_genres(track)
 
 
     def filter(
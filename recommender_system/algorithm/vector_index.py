@@ -0,0 +1,255 @@
+import numpy as np
+
+from numpy.typing import NDArray
+from typing import Dict, List, Optional, Tuple, Union
+
+from common.domain.models import VectorBlock
+
+
+class BlockWeightedCosineIndex:
+    """Exact cosine nearest neighbors over unweighted representation vectors,
+    with the block weights applied at query time
+
+    With W the per column weights of the blocks, the cosine distance of the weighted vectors is
+
+        1 - <W q, W x> / (|W q| |W x|) = 1 - <W² q, x> / (|W q| |W x|)
+
+    so the query is scaled instead of the catalog matrix, and |W x|² = sum_b w_b² |x_b|²
+    comes from the squared norm of every block of every row, computed once (rows x blocks).
+    The norms of the stored (default) weights are cached, any other weights only cost
+    a (rows x blocks) product per query and no memory that outlives it.
+
+    The rows can not be stored normalized, their norm depends on the weights: the cached
+    inverse norms scale the scores instead. Queries are scored one chunk of rows at a time
+    (a matrix product for all the queries), the top k of every chunk is kept with argpartition
+    and only the distances of the final neighbors are computed.
+    """
+
+    def __init__(
+        self,
+        matrix: NDArray,
+        blocks: Optional[List[VectorBlock]] = None,
+        chunk_size: Optional[int] = 32_768
+    ):
+        """
+        Args:
+            matrix (NDArray): (rows x dimension) unweighted vectors, used as is (e.g memory mapped)
+            blocks (Optional[List[VectorBlock]]): block layout of the vectors, with their default weights.
+                Without a layout the vectors are one block of weight 1
+            chunk_size (Optional[int]): rows per chunk when the block norms are computed and when
+                queries are scored
+        """
+        self.matrix = matrix
+        self.chunk_size = chunk_size
+        self.blocks = blocks if blocks is not None else [VectorBlock(name='vector', start=0, stop=matrix.shape[1])]
+
+        self._block_squared_norms = np.empty((len(matrix), len(self.blocks)))
+        for start in range(0, len(matrix), chunk_size):
+            rows = np.asarray(matrix[start:start + chunk_size], dtype=np.float64)
+            for column, block in enumerate(self.blocks):
+                values = rows[:, block.start:block.stop]
+                self._block_squared_norms[start:start + chunk_size, column] = np.einsum('ij,ij->i', values, values)
+
+        self._default_weights = np.array([block.weight for block in self.blocks], dtype=np.float64)
+        self._default_norms = self._weighted_norms(self._default_weights)
+        self._default_inverse_norms = self._inverse(self._default_norms)
+
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+
+    def block_weights(self, weights: Optional[Dict[str, float]] = None) -> NDArray:
+        """Weight of every block: the default ones, overridden by the given ones
+
+        Args:
+            weights (Optional[Dict[str, float]]): weight by block name
+
+        Returns:
+            NDArray: (blocks, ) weights
+        """
+        names = [block.name for block in self.blocks]
+        unknown = set(weights or {}) - set(names)
+        if unknown:
+            raise ValueError(f"Unknown vector blocks {sorted(unknown)}, the vectors have the blocks {names}")
+
+        block_weights = np.array([
+            (weights or {}).get(block.name, block.weight) for block in self.blocks
+        ], dtype=np.float64)
+        # the norms are square roots of weighted sums
+        if not np.all(block_weights >= 0):
+            raise ValueError(f"Block weights must be non-negative, got {dict(zip(names, block_weights.tolist()))}")
+        return block_weights
+
+
+    def column_weights(self, weights: Optional[Dict[str, float]] = None) -> NDArray:
+        """Weight of every column of the vectors (see block_weights)
+
+        Returns:
+            NDArray: (dimension, ) weights
+        """
+        block_weights = self.block_weights(weights)
+        column_weights = np.ones(self.matrix.shape[1])
+        for block, weight in zip(self.blocks, block_weights.tolist()):
+            column_weights[block.start:block.stop] = weight
+        return column_weights
+
+
+    def _weighted_norms(self, block_weights: NDArray, rows: Union[slice, NDArray] = slice(None)) -> NDArray:
+        return np.sqrt(self._block_squared_norms[rows] @ np.square(block_weights))
+
+
+    @staticmethod
+    def _inverse(norms: NDArray) -> NDArray:
+        # zero vectors get a similarity of 0 to everything
+        with np.errstate(divide='ignore'):
+            return np.where(norms > 0, 1 / norms, 0)
+
+
+    def normalized_rows(self, rows: Union[slice, NDArray]) -> NDArray:
+        """Rows weighted with the default weights and L2 normalized, zero vectors stay zero
+
+        Args:
+            rows (Union[slice, NDArray]): rows, a range or their numbers
+
+        Returns:
+            NDArray: (rows x dimension) vectors, in float64
+        """
+        vectors = np.asarray(self.matrix[rows], dtype=np.float64) * self.column_weights()
+        return vectors * self._default_inverse_norms[rows, np.newaxis]
+
+
+    def _norms(
+        self,
+        weights: Optional[Dict[str, float]],
+        rows: Union[slice, NDArray] = slice(None)
+    ) -> Tuple[NDArray, NDArray]:
+        """Weighted norms of some rows and their inverse, cached for the default weights"""
+        if weights is None:
+            return self._default_norms[rows], self._default_inverse_norms[rows]
+        norms = self._weighted_norms(self.block_weights(weights), rows)
+        return norms, self._inverse(norms)
+
+
+    def _query(self, queries: NDArray, weights: Optional[Dict[str, float]]) -> Tuple[NDArray, NDArray]:
+        """W² scaled queries, in the dtype of the matrix, and their weighted norms"""
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.matrix.shape[1])
+        column_weights = self.column_weights(weights)
+
+        weighted_queries = queries * column_weights
+        query_norms = np.linalg.norm(weighted_queries, axis=1)
+        return (weighted_queries * column_weights).astype(self.matrix.dtype), query_norms
+
+
+    @staticmethod
+    def _nearest(
+        products: NDArray,
+        candidates: NDArray,
+        query_norms: NDArray,
+        norms: NDArray,
+        inverse_norms: NDArray,
+        n_neighbors: int
+    ) -> Tuple[NDArray, NDArray]:
+        """The n_neighbors nearest candidates of every query, from their products <W² q, x>
+        and the weighted norms of the candidates (with their inverse)
+
+        Only the distances of the selected neighbors are computed.
+        """
+        selected = BlockWeightedCosineIndex._top_k(products * inverse_norms, n_neighbors)
+        neighbors = np.take_along_axis(candidates, selected, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similarities = np.take_along_axis(products, selected, axis=1) / (
+                query_norms[:, np.newaxis] * np.take_along_axis(norms, selected, axis=1)
+            )
+        neighbor_distances = np.clip(1 - np.nan_to_num(similarities, nan=0, posinf=0, neginf=0), 0, 2)
+        order = np.argsort(neighbor_distances, axis=1, kind='stable')
+        return np.take_along_axis(neighbor_distances, order, axis=1), np.take_along_axis(neighbors, order, axis=1)
+
+
+    def kneighbors(
+        self,
+        queries: NDArray,
+        n_neighbors: Optional[int] = 100,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[NDArray, NDArray]:
+        """Nearest rows of every query, by cosine distance of the weighted vectors
+
+        Same distances as NearestNeighbors(metric='cosine') fitted on the weighted matrix:
+        zero vectors are at distance 1 of everything and distances are clipped to [0, 2].
+
+        Args:
+            queries (NDArray): (queries x dimension) unweighted vectors
+            n_neighbors (Optional[int]): neighbors per query
+            weights (Optional[Dict[str, float]]): block weights overriding the default ones
+
+        Returns:
+            Tuple[NDArray, NDArray]: (queries x n_neighbors) distances and rows, nearest first
+        """
+        scaled_queries, query_norms = self._query(queries, weights)
+        norms, inverse_norms = self._norms(weights)
+        n_neighbors = min(n_neighbors, len(self.matrix))
+        if n_neighbors == 0:
+            return np.empty((len(scaled_queries), 0)), np.empty((len(scaled_queries), 0), dtype=np.int64)
+
+        # the matrix is read one chunk of rows at a time, once for all the queries. The top k of every
+        # chunk is selected on <W² q, x> / |W x| (same order as the similarity of each query) and only
+        # the products of these candidates are kept
+        candidates, candidate_products = [], []
+        for start in range(0, len(self.matrix), self.chunk_size):
+            # (queries x rows), so the top k of every query is selected on a contiguous row
+            products = np.asarray(scaled_queries @ self.matrix[start:start + self.chunk_size].T, dtype=np.float64)
+            rows = self._top_k(products * inverse_norms[start:start + self.chunk_size], n_neighbors)
+            candidates.append(rows + start)
+            candidate_products.append(np.take_along_axis(products, rows, axis=1))
+
+        candidates = np.hstack(candidates)
+        return self._nearest(
+            np.hstack(candidate_products), candidates, query_norms, norms[candidates], inverse_norms[candidates], n_neighbors
+        )
+
+
+    def kneighbors_among(
+        self,
+        queries: NDArray,
+        candidates: List[NDArray],
+        n_neighbors: Optional[int] = 100,
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[NDArray, NDArray]:
+        """Nearest candidate rows of every query, with the distances of kneighbors
+        (e.g to rank the candidates of an approximate index)
+
+        Args:
+            queries (NDArray): (queries x dimension) unweighted vectors
+            candidates (List[NDArray]): candidate rows of every query, ascending
+            n_neighbors (Optional[int]): neighbors per query, at most the candidates of every query
+            weights (Optional[Dict[str, float]]): block weights overriding the default ones
+
+        Returns:
+            Tuple[NDArray, NDArray]: (queries x n_neighbors) distances and rows, nearest first
+        """
+        scaled_queries, query_norms = self._query(queries, weights)
+        n_neighbors = min([n_neighbors] + [len(rows) for rows in candidates])
+
+        distances, neighbors = [], []
+        for scaled_query, query_norm, rows in zip(scaled_queries, query_norms, candidates):
+            rows = np.asarray(rows, dtype=np.int64)
+            products = np.asarray(scaled_query[np.newaxis, :] @ self.matrix[rows].T, dtype=np.float64)
+            # only the norms of the candidates are computed for other weights
+            norms, inverse_norms = self._norms(weights, rows)
+            query_distances, query_neighbors = self._nearest(
+                products, rows[np.newaxis, :], query_norm[np.newaxis], norms[np.newaxis, :], inverse_norms[np.newaxis, :], n_neighbors
+            )
+            distances.append(query_distances)
+            neighbors.append(query_neighbors)
+
+        if len(distances) == 0:
+            return np.empty((0, n_neighbors)), np.empty((0, n_neighbors), dtype=np.int64)
+        return np.vstack(distances), np.vstack(neighbors)
+
+
+    @staticmethod
+    def _top_k(scores: NDArray, k: int) -> NDArray:
+        """Columns of the k highest scores of every row (all the columns if there are at most k), unordered"""
+        if scores.shape[1] <= k:
+            return np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+        return np.argpartition(scores, -k, axis=1)[:, -k:]
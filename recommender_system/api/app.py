@@ -4,8 +4,10 @@ from fastapi.responses import RedirectResponse, JSONResponse
 
 
 from recommender_system.musicos import MusicOs
+from recommender_system.data_engineering.catalog_service import CatalogService
 from common.data_transfer.models import SessionSettings, SessionAddition
 from common import utils
+from settings import get_settings
 
 
 app = FastAPI()
@@ -16,12 +18,21 @@ musicos = MusicOs()
 async def startup_event():
     musicos.reset_session()
 
+    reload_watch_interval = get_settings().reload_watch_interval
+    if reload_watch_interval is not None:
+        musicos.watch_sources(reload_watch_interval)
+
 
 @app.get("/alive", include_in_schema=False)
 async def alive():
     return JSONResponse(status_code=200, content={"status": "success"})
 
 
+@app.get("/statistics/runtime_cache", include_in_schema=False)
+async def runtime_cache_statistics():
+    return CatalogService.get().runtime_cache_statistics()
+
+
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url='/docs')
@@ -41,6 +52,10 @@ async def recommendations_for_playlist(
     if is_track:
         return JSONResponse(status_code=400, content="Invalid <playlist_id>")
 
+    settings_error = musicos.check_session_settings(settings)
+    if settings_error is not None:
+        return JSONResponse(status_code=422, content=settings_error)
+
     return musicos.recommend_k_tracks_for_playlist(
         playlist_id=playlist_id,
         output_playlist_id="3RNUyOGbClap09tyDtLb8R",
@@ -78,6 +93,10 @@ async def session_add(session_addition: SessionAddition):
 async def recommendations_for_session(settings: Optional[SessionSettings] = None):
     """Get recommendations for the current session
     """
+    settings_error = musicos.check_session_settings(settings)
+    if settings_error is not None:
+        return JSONResponse(status_code=422, content=settings_error)
+
     return musicos.generate_session_recommendations(
         output_playlist_id="3RNUyOGbClap09tyDtLb8R",
         settings=settings,
@@ -129,4 +148,22 @@ async def session_remove_user(user_id: str):
 
 @app.get("/session/reset")
 async def reset_session():
-    musicos.reset_session()
\ No newline at end of file
+    musicos.reset_session()
+
+
+@app.post("/admin/reload")
+async def admin_reload():
+    """Reload catalog, representation vectors and kNN index from disk
+
+    The current generation keeps serving until the new one is built, the session is kept.
+    """
+    if not musicos.reload():
+        return JSONResponse(status_code=409, content=musicos.get_reload_status())
+    return JSONResponse(status_code=202, content=musicos.get_reload_status())
+
+
+@app.get("/admin/reload/status")
+async def admin_reload_status():
+    """Generation currently serving and state of the last reload
+    """
+    return musicos.get_reload_status()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import numpy as np
+
+from gensim.models import KeyedVectors
+from numpy.typing import NDArray
+from sklearn.neighbors import NearestNeighbors
+from typing import List, Optional, Tuple
+
+from common.database.vector_store import RepresentationVectorStore
+
+
+class ArtistEmbeddingTable:
+    """Artist embeddings as one memory mapped matrix of L2 normalized rows
+    (stored as a RepresentationVectorStore: artist ids + matrix)
+
+        rows [0, model rows)            artists of the Node2Vec model, in model order
+        rows [model rows, rows)         genre based fallback of catalog artists missing from the model
+
+    A lookup is a single row index, for model and fallback artists alike, and every
+    process serving the same table shares one copy of it through the page cache.
+    """
+
+    # number of fallback rows, in meta.json of the table
+    FALLBACK_ROWS = 'fallback_rows'
+
+    @classmethod
+    def load(cls, path: Optional[str], keyed_vectors_path: str) -> RepresentationVectorStore:
+        """Open the exported table, or normalize the model in memory when no table is exported (no fallback)
+
+        Args:
+            path (Optional[str]): exported table
+            keyed_vectors_path (str): gensim KeyedVectors of the Node2Vec model
+
+        Returns:
+            RepresentationVectorStore: normalized embedding of every artist
+        """
+        if RepresentationVectorStore.exists(path):
+            return RepresentationVectorStore.open(path)
+
+        keyed_vectors = KeyedVectors.load(keyed_vectors_path)
+        return RepresentationVectorStore(
+            ids=list(keyed_vectors.index_to_key),
+            matrix=cls.normalize(keyed_vectors.vectors)
+        )
+
+
+    @staticmethod
+    def normalize(vectors: NDArray) -> NDArray:
+        # as KeyedVectors.get_vector(norm=True)
+        return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+    @classmethod
+    def export(
+        cls,
+        path: str,
+        keyed_vectors: KeyedVectors,
+        artist_ids: List[str],
+        genre_embeddings: NDArray,
+        n_neighbors: Optional[int] = 4
+    ) -> Tuple[int, int]:
+        """Write the table of a model, with a fallback row for every catalog artist missing from it
+
+        The fallback of an artist is the average model embedding of the n_neighbors artists of the
+        model with the closest (cosine) genre embedding. Artists without any embedded genre get no row.
+
+        Args:
+            path (str): table directory
+            keyed_vectors (KeyedVectors): Node2Vec model
+            artist_ids (List[str]): catalog artists
+            genre_embeddings (NDArray): (artists x genre features) average embedding of the genres of
+                every catalog artist, NaN for artists without embedded genre
+            n_neighbors (Optional[int]): model artists averaged per fallback
+
+        Returns:
+            Tuple[int, int]: number of model and fallback rows
+        """
+        model_rows = np.array([keyed_vectors.key_to_index.get(artist_id, -1) for artist_id in artist_ids], dtype=np.int64)
+        has_genres = ~np.isnan(genre_embeddings).any(axis=1)
+        candidates = np.flatnonzero((model_rows >= 0) & has_genres)
+        missing = np.flatnonzero((model_rows < 0) & has_genres)
+
+        fallback = np.empty((0, keyed_vectors.vector_size), dtype=keyed_vectors.vectors.dtype)
+        if len(candidates) > 0 and len(missing) > 0:
+            model = NearestNeighbors(n_neighbors=min(n_neighbors, len(candidates)), metric='cosine')
+            model.fit(genre_embeddings[candidates])
+            neighbors = model.kneighbors(genre_embeddings[missing], return_distance=False)
+            fallback = keyed_vectors.vectors[model_rows[candidates][neighbors]].mean(axis=1)
+        else:
+            missing = missing[:0]
+
+        RepresentationVectorStore.write(
+            path=path,
+            ids=list(keyed_vectors.index_to_key) + [artist_ids[index] for index in missing.tolist()],
+            matrix=cls.normalize(np.concatenate([keyed_vectors.vectors, fallback])),
+            dtype=keyed_vectors.vectors.dtype.str
+        )
+        meta = RepresentationVectorStore.read_meta(path)
+        meta[cls.FALLBACK_ROWS] = len(missing)
+        RepresentationVectorStore.write_meta(path, meta)
+        return len(keyed_vectors.index_to_key), len(missing)
@@ -0,0 +1,220 @@
+import threading
+
+from enum import Flag, auto
+from typing import Dict, List, Optional, Union
+
+from settings import get_settings
+from common.database.local_storage import LocalStorage
+from common.database.sqlite_db import SqliteDatabase
+from common.domain.models import Artist, ArtistSearchableObject
+from recommender_system.data_engineering.data_processing import DataProcessor
+from recommender_system.data_engineering.runtime_cache import RuntimeCache
+from spotify_connectors.spotify_web_api import SpotifyWebAPI
+from common import utils
+
+
+class CatalogCapability(Flag):
+    """Parts of the catalog a consumer needs, built on first use"""
+    ARTISTS = auto()
+    ARTIST_NAME_INDEX = auto()
+    TRACKS = auto()
+    REPRESENTATION_VECTORS = auto()
+    DATA_PROCESSING = auto()
+    SPOTIFY = auto()
+
+    MAPPER = ARTISTS | ARTIST_NAME_INDEX
+    RECOMMENDER = ARTISTS | TRACKS | REPRESENTATION_VECTORS | DATA_PROCESSING | SPOTIFY
+
+
+class CatalogService:
+    """Catalog shared by every consumer of the process (API, recommender, spiders)
+
+    Storage, artist name index, data processor (embeddings and normalizer) and Spotify client
+    are built once, on first use, so a consumer that only maps artist names never loads
+    the tracks, the embeddings or needs Spotify credentials.
+    Runtime tracks and vectors are shared as well, in size bounded LRU caches.
+
+    CatalogService.get() returns the instance of the process,
+    a hot reload builds a new one and installs it with CatalogService.set_instance.
+
+    The spiders take their DataProvider (a view of this service) on first use, once per spider:
+    loading the spider classes builds nothing and the artist name index is built once for
+    every spider (and API) of the process.
+    """
+
+    _instance: 'CatalogService' = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._db: Union[LocalStorage, SqliteDatabase] = None
+        self._artist_name_index: Dict[str, List[ArtistSearchableObject]] = None
+        self._data_processor: DataProcessor = None
+        self._spotify_web_api: SpotifyWebAPI = None
+        settings = get_settings()
+        self._runtime_tracks = RuntimeCache(max_size=settings.runtime_cache_size)
+        self._runtime_track_representation_vectors = RuntimeCache(
+            max_size=settings.runtime_cache_size,
+            negative_ttl=settings.runtime_negative_cache_ttl
+        )
+        self._runtime_track_representation_vectors_seeded = False
+
+
+    @classmethod
+    def get(cls) -> 'CatalogService':
+        """Catalog service of the process, created on first call"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+
+    @classmethod
+    def set_instance(cls, catalog_service: Optional['CatalogService']) -> None:
+        """Replace the catalog service of the process (hot reload), None drops it"""
+        with cls._instance_lock:
+            cls._instance = catalog_service
+
+
+    def require(self, capabilities: CatalogCapability) -> 'CatalogService':
+        """Build the given parts now instead of on first use (e.g. at startup)
+
+        Args:
+            capabilities (CatalogCapability): parts needed by the consumer
+
+        Returns:
+            CatalogService: self
+        """
+        if CatalogCapability.ARTISTS in capabilities:
+            self.db().get_artists()
+        if CatalogCapability.ARTIST_NAME_INDEX in capabilities:
+            self.artist_name_index()
+        if CatalogCapability.TRACKS in capabilities:
+            self.db().get_tracks()
+        if CatalogCapability.REPRESENTATION_VECTORS in capabilities:
+            self.db().get_track_representation_vectors()
+        if CatalogCapability.DATA_PROCESSING in capabilities:
+            self.data_processor()
+        if CatalogCapability.SPOTIFY in capabilities:
+            self.spotify_web_api()
+        return self
+
+
+    def db(self) -> Union[LocalStorage, SqliteDatabase]:
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    # a SQLite catalog is resolved on demand, local storage is loaded in memory
+                    self._db = SqliteDatabase() if get_settings().catalog_sqlite_path is not None else LocalStorage()
+        return self._db
+
+
+    def artist_name_index(self) -> Optional[Dict[str, List[ArtistSearchableObject]]]:
+        """Artists by first letter of their cleaned name, bins sorted by name
+
+        Returns:
+            Optional[Dict[str, List[ArtistSearchableObject]]]: None for a SQLite catalog, which has its own name index
+        """
+        if hasattr(self.db(), 'find_artists_by_name'):
+            return None
+
+        if self._artist_name_index is None:
+            with self._lock:
+                if self._artist_name_index is None:
+                    self._artist_name_index = self._create_artist_name_index(self.db().get_artists())
+        return self._artist_name_index
+
+
+    @staticmethod
+    def _create_artist_name_index(artists: Dict[str, Artist]) -> Dict[str, List[ArtistSearchableObject]]:
+        artist_hash_map: Dict[str, List[ArtistSearchableObject]] = {}
+
+        for artist in artists.values():
+            artist_name_clean = utils.clear_name_text(artist.name)
+
+            if artist_name_clean[0] not in artist_hash_map:
+                artist_hash_map[artist_name_clean[0]] = []
+
+            artist_hash_map[artist_name_clean[0]].append(
+                ArtistSearchableObject(
+                    name = utils.clear_name_text(artist_name_clean),
+                    id = artist.id
+                )
+            )
+
+        # sort hash bins
+        for key in artist_hash_map.keys():
+            artist_hash_map[key] = sorted(artist_hash_map[key], key = lambda x: x.name, reverse=False)
+
+        return artist_hash_map
+
+
+    def find_artist_by_name(self, artist_name: str) -> Optional[Artist]:
+        """First catalog artist whose cleaned name matches
+
+        Args:
+            artist_name (str): artist name as found in the source
+
+        Returns:
+            Optional[Artist]: None when no artist matches
+        """
+        artist_name_clean = utils.clear_name_text(artist_name)
+        artist_name_index = self.artist_name_index()
+
+        if artist_name_index is None:
+            artists = self.db().find_artists_by_name(artist_name_clean)
+            return artists[0] if len(artists) > 0 else None
+
+        for artist in artist_name_index.get(artist_name_clean[0], []):
+            if artist_name_clean == artist.name:
+                return self.db().get_artists()[artist.id]
+        return None
+
+
+    def data_processor(self) -> DataProcessor:
+        """Data processor with the embeddings loaded and the normalizer ready
+
+        The normalizer stored with the representation vectors is reused, unless the catalog changed.
+        """
+        if self._data_processor is None:
+            with self._lock:
+                if self._data_processor is None:
+                    data_processor = DataProcessor()
+                    if not data_processor.load_normalizer(fingerprint=self.db().get_catalog_fingerprint()):
+                        data_processor.fit_normalizer(self.db().get_tracks())
+                    self._data_processor = data_processor
+        return self._data_processor
+
+
+    def spotify_web_api(self) -> SpotifyWebAPI:
+        if self._spotify_web_api is None:
+            with self._lock:
+                if self._spotify_web_api is None:
+                    self._spotify_web_api = SpotifyWebAPI()
+        return self._spotify_web_api
+
+
+    def runtime_tracks(self) -> RuntimeCache:
+        """Tracks fetched from Spotify at runtime, not in the catalog"""
+        return self._runtime_tracks
+
+
+    def runtime_track_representation_vectors(self) -> RuntimeCache:
+        """Representation vectors computed at runtime, seeded from the write-back log"""
+        if not self._runtime_track_representation_vectors_seeded:
+            with self._lock:
+                if not self._runtime_track_representation_vectors_seeded:
+                    # in log order: the latest vectors are kept when the log holds more than the cache
+                    for track_id, vector in self.db().get_logged_track_representation_vectors().items():
+                        self._runtime_track_representation_vectors.put(track_id, vector)
+                    self._runtime_track_representation_vectors_seeded = True
+        return self._runtime_track_representation_vectors
+
+
+    def runtime_cache_statistics(self) -> Dict[str, Dict[str, int]]:
+        """Size, hits, misses, evictions and expirations of the runtime track and vector caches"""
+        return {
+            'tracks': self._runtime_tracks.statistics(),
+            'track_representation_vectors': self._runtime_track_representation_vectors.statistics()
+        }
@@ -1,16 +1,30 @@
+import os
+import json
+import shutil
+import hashlib
 import numpy as np
 import pandas as pd
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import MinMaxScaler
 from gensim.models import KeyedVectors
 from nltk.tokenize import word_tokenize
-from typing import List, Dict, Optional
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from numpy.typing import NDArray
-from tqdm import tqdm
+from scipy.sparse import csr_matrix
 
 from settings import get_settings
-from common.domain.models import Track, RepresentationVector
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Artist, Track, RepresentationVector, VectorBlock
+from common.database import columnar
+from common.database.columnar import IdIndex
+from common.database.vector_store import RepresentationVectorStore
+from common.database.track_store import TrackStore, InternedListColumn
+from common.database.sqlite_db import SqliteTracks
+from recommender_system.data_engineering.artist_embeddings import ArtistEmbeddingTable
+from recommender_system.data_engineering.feature_normalizer import FeatureNormalizer
 
 
 class DataProcessor:
@@ -20,36 +34,117 @@ class DataProcessor:
     2. Normalizes data
     3. Creates embeddings for genres & artists
     """
-    scalers: Dict[str, MinMaxScaler] = None
+    normalizer: FeatureNormalizer = None
+
+    # fitted normalizer parameters, stored in the representation vector store
+    NORMALIZER_FILE = 'normalizer.json'
+    # input fingerprint of every catalog track (columnar frame), for incremental rebuilds
+    INPUT_FINGERPRINTS = 'input_fingerprints'
     
     def __init__(self):
         self._settings = get_settings()
-        self._genre_embeddings = np.load(self._settings.genre_embeddings, allow_pickle=True)
-        self._artist_embeddings = KeyedVectors.load(self._settings.artist_embeddings)
-        self._artist_embeddings.fill_norms()
+        # genre -> row of a dense (V x genre features) matrix, loaded once
+        genre_embeddings = np.load(self._settings.genre_embeddings, allow_pickle=True).item()
+        self._genre_index = {genre: row for row, genre in enumerate(genre_embeddings.keys())}
+        self._genre_embedding_matrix = np.array(list(genre_embeddings.values()), dtype=np.float64) \
+            .reshape(len(genre_embeddings), self._settings.genre_embeddings_size)
+        # normalized artist embeddings (memory mapped when exported), one row per artist
+        self._artist_embeddings = ArtistEmbeddingTable.load(
+            self._settings.artist_embedding_table, self._settings.artist_embeddings
+        )
         self._tfidf = TfidfVectorizer(tokenizer=word_tokenize)
         self.w2v_genre_features = self._settings.genre_embeddings_size
         self.w2v_artist_features = self._settings.artist_embeddings_size
+        # default weights of the vector blocks, applied when vectors are compared (see vector_blocks)
         self._track_audio_features_weight = 2
         self._track_popularity_weight = 1
         self._track_date_weight = 5
         self._genre_weight = 1
         self._artist_weight = 1
-        self.scalers = {}
+        self.normalizer = FeatureNormalizer(Track.__scaled_features__)
+        # vectors are computed in float64 and stored (and served) in this dtype
+        self.vector_dtype = np.dtype(self._settings.track_representation_vectors_dtype)
+        if self.vector_dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported representation vector dtype: {self.vector_dtype}")
     
     
-    def fit_normalizer(self, tracks: List[Track]) -> None:
+    def fit_normalizer(self, tracks: Union[TrackStore, SqliteTracks, List[Track]]) -> None:
         """Fit data to normalizers
 
         Args:
-            tracks (List[Track]): set of track to fit normalizer
+            tracks (Union[TrackStore, SqliteTracks, List[Track]]): set of track to fit normalizer
         """
-        for feature in tqdm(Track.__scaled_features__, desc="Fitting normalizer"):
-            self.scalers[feature] = MinMaxScaler()
-            feature_array = np.array([getattr(track, feature) for track in tracks]).reshape(-1,1)
-            self.scalers[feature].fit(feature_array)
+        self.normalizer.fit(self.scaled_features_matrix(tracks))
+
+
+    @staticmethod
+    def scaled_features_matrix(tracks: Union[TrackStore, SqliteTracks, List[Track]]) -> NDArray:
+        """(N x F) matrix of Track.__scaled_features__, one row per track
+
+        Args:
+            tracks (Union[TrackStore, SqliteTracks, List[Track]]): set of tracks
+
+        Returns:
+            NDArray: float64 matrix, missing values as NaN
+        """
+        if hasattr(tracks, 'column'):
+            # columns are read directly (TrackStore / SqliteTracks), without building Track objects
+            return np.column_stack(
+                [np.asarray(tracks.column(feature), dtype=np.float64) for feature in Track.__scaled_features__]
+            )
+        return np.array(
+            [[getattr(track, feature) for feature in Track.__scaled_features__] for track in tracks], dtype=np.float64
+        ).reshape(-1, len(Track.__scaled_features__))
     
     
+    def normalizer_path(self) -> Optional[str]:
+        vectors_path = self._settings.track_representation_vectors_stored_path
+        return os.path.join(vectors_path, self.NORMALIZER_FILE) if vectors_path is not None else None
+
+
+    def save_normalizer(self, fingerprint: str, path: Optional[str] = None) -> None:
+        """Store the fitted min / max of every feature, with the fingerprint of the catalog it was fitted on
+
+        Args:
+            fingerprint (str): catalog fingerprint
+            path (Optional[str]): output file, next to the representation vectors by default
+        """
+        parameters = {
+            'fingerprint': fingerprint,
+            'features': Track.__scaled_features__,
+            'data_min': self.normalizer.data_min.tolist(),
+            'data_max': self.normalizer.data_max.tolist()
+        }
+        path = path or self.normalizer_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(parameters, f, indent=4)
+        os.replace(path + '.tmp', path)
+
+
+    def load_normalizer(self, fingerprint: str, path: Optional[str] = None) -> bool:
+        """Restore the normalizer stored by save_normalizer
+
+        Args:
+            fingerprint (str): fingerprint of the current catalog
+            path (Optional[str]): stored parameters, next to the representation vectors by default
+
+        Returns:
+            bool: False when nothing is stored or it was fitted on another catalog (the normalizer must be fitted)
+        """
+        path = path or self.normalizer_path()
+        if path is None or not os.path.isfile(path):
+            return False
+
+        with open(path) as f:
+            parameters = json.load(f)
+
+        if parameters['fingerprint'] != fingerprint or parameters['features'] != Track.__scaled_features__:
+            return False
+
+        self.normalizer.set_range(parameters['data_min'], parameters['data_max'])
+        return True
+
+
     def normalize_features(self, track: Track) -> NDArray:
         """Apply normalization for each feature
 
@@ -59,10 +154,19 @@ class DataProcessor:
         Returns:
             NDArray: normalized
         """
-        normalized_features = []
-        for feature in Track.__scaled_features__:
-            normalized_features.append(self.scalers[feature].transform(np.array([getattr(track, feature)]).reshape(1, -1))[0])
-        return np.array(normalized_features).reshape(-1,)
+        return self.normalizer.transform_row([getattr(track, feature) for feature in Track.__scaled_features__])
+
+
+    def normalize_features_matrix(self, features: NDArray) -> NDArray:
+        """Apply normalization to a (N x F) matrix of scaled features, in one call
+
+        Args:
+            features (NDArray): rows of Track.__scaled_features__ (see scaled_features_matrix)
+
+        Returns:
+            NDArray: normalized
+        """
+        return self.normalizer.transform(features)
     
     
     def _create_track_representation_vector(
@@ -71,14 +175,16 @@ class DataProcessor:
     ) -> Optional[RepresentationVector]:
         """Internal creator of track representation vectors
 
+        Same values as a row of create_track_representation_matrix, without the batch overhead
+        (on the fly vectors of runtime tracks).
+
         Args:
             track (Track): track domain model
-            tf_idf_features (_type_): tf idf feature names
 
         Returns:
-            RepresentationVector: output representation vector
+            RepresentationVector: output representation vector, None if the track can not be processed
         """
-        genre_tokens = [self.process_genre(genre) for genre in track.genres]
+        genre_tokens = [self.process_genre(genre) for genre in track.genres or []]
         
         # if track is of unknown genre - it can not be processed
         if len(genre_tokens) == 0:
@@ -91,8 +197,9 @@ class DataProcessor:
         
         artist_embedding = np.array([np.nan] * self.w2v_artist_features)
         
-        if track.id_artists[0].strip() in self._artist_embeddings:
-            artist_embedding = self._artist_embeddings.get_vector(track.id_artists[0].strip(), norm=True)
+        artist_row = self._artist_embeddings.row_of(track.id_artists[0].strip()) if track.id_artists else -1
+        if artist_row >= 0:
+            artist_embedding = self._artist_embeddings.matrix[artist_row]
 
         normalized_features = self.normalize_features(track)
         popularity = normalized_features[track.get_index_of_feature('artist_mean_popularity')]
@@ -105,14 +212,14 @@ class DataProcessor:
             ]
         )
 
-        # combine information in a single vector
+        # combine information in a single vector, unweighted
         representation_vector = np.hstack(
             [
-                audio_features_vector * self._track_audio_features_weight,
-                popularity * self._track_popularity_weight,
-                track_age * self._track_date_weight,
-                genre_embedding * self._genre_weight,
-                artist_embedding * self._artist_weight
+                audio_features_vector,
+                popularity,
+                track_age,
+                genre_embedding,
+                artist_embedding
             ]
         )
 
@@ -121,49 +228,460 @@ class DataProcessor:
             return None
 
         return representation_vector
+
+
+    def artist_embedding_rows(self, artist_ids: List[str]) -> NDArray:
+        """Rows of the artists in the artist embeddings, -1 for artists without embedding"""
+        return self._artist_embeddings.rows_of([artist_id.strip() for artist_id in artist_ids]).astype(np.int64)
+
+
+    def _track_inputs(
+        self,
+        tracks: Union[TrackStore, SqliteTracks, List[Track]]
+    ) -> Tuple[List[str], NDArray, InternedListColumn, NDArray]:
+        """Inputs of the representation vectors of a set of tracks
+
+        Args:
+            tracks (Union[TrackStore, SqliteTracks, List[Track]]): set of tracks
+
+        Returns:
+            Tuple[List[str], NDArray, InternedListColumn, NDArray]: track ids, scaled features matrix,
+                normalized genres and artist embedding row of the first artist of every track
+        """
+        if isinstance(tracks, TrackStore):
+            # read from the columns, no Track object is built
+            id_artists = tracks.list_column('id_artists')
+            has_artist = np.diff(id_artists.offsets) > 0
+            first_artists = id_artists.codes[id_artists.offsets[:-1][has_artist]]
+
+            artist_rows = np.full(len(tracks), -1, dtype=np.int64)
+            # one lookup per distinct artist
+            artist_rows[has_artist] = self.artist_embedding_rows(id_artists.vocabulary)[first_artists]
+
+            return (
+                list(tracks),
+                self.scaled_features_matrix(tracks),
+                tracks.list_column('genres'),
+                artist_rows
+            )
+
+        tracks = list(tracks.values()) if isinstance(tracks, Mapping) else list(tracks)
+        return (
+            [track.id for track in tracks],
+            self.scaled_features_matrix(tracks),
+            InternedListColumn.from_genre_lists([track.genres or [] for track in tracks], GenreVocabulary()),
+            self.artist_embedding_rows([
+                track.id_artists[0] if len(track.id_artists or []) > 0 else '' for track in tracks
+            ])
+        )
+
+
+    def create_genre_embedding_matrix(self, genres: InternedListColumn) -> NDArray:
+        """Sentence embeddings of the genres of N tracks, as a sparse (tracks x genres) matrix
+        times the dense genre embedding matrix, divided by the number of embedded genres per track
+
+        Same values as create_sentence_embedding: genres without embedding are skipped,
+        repeated genres count as many times as they appear.
+
+        Args:
+            genres (InternedListColumn): normalized genres of every track
+
+        Returns:
+            NDArray: (N x genre features) embeddings, NaN for tracks without embedded genre
+        """
+        embedding_rows, offsets = self._genre_embedding_rows(genres)
+        track_genres = csr_matrix(
+            (np.ones(offsets[-1]), embedding_rows, offsets),
+            shape=(len(genres), len(self._genre_index))
+        )
+        with np.errstate(invalid='ignore'):
+            return (track_genres @ self._genre_embedding_matrix) / np.diff(offsets)[:, np.newaxis]
+
+
+    def _genre_embedding_rows(self, genres: InternedListColumn) -> Tuple[NDArray, NDArray]:
+        """Genre embedding rows of every track (concatenated) and their (N + 1) offsets,
+        genres without embedding are dropped"""
+        # one lookup per distinct genre
+        embedding_rows = np.array(
+            [self._genre_index.get(genre, -1) for genre in genres.vocabulary], dtype=np.int64
+        )[genres.codes]
+        embedded = embedding_rows >= 0
+
+        track_of_code = np.repeat(np.arange(len(genres)), np.diff(genres.offsets))
+        counts = np.bincount(track_of_code[embedded], minlength=len(genres))
+        offsets = np.zeros(len(genres) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return embedding_rows[embedded], offsets
+
+
+    def create_track_representation_matrix(
+        self,
+        features: NDArray,
+        genres: InternedListColumn,
+        artist_rows: NDArray
+    ) -> NDArray:
+        """Representation vectors of N tracks, each block of the vector filled for all tracks at once
+
+        Args:
+            features (NDArray): (N x F) scaled features (see scaled_features_matrix)
+            genres (InternedListColumn): normalized genres of every track
+            artist_rows (NDArray): artist embedding row of the first artist of every track, -1 if none
+
+        Returns:
+            NDArray: (N x D) representation vectors, rows of tracks that can not be processed contain NaN
+        """
+        popularity_index = Track.__scaled_features__.index('artist_mean_popularity')
+        track_age_index = Track.__scaled_features__.index('track_age')
+
+        normalized_features = self.normalize_features_matrix(features)
+        audio_features = np.delete(normalized_features, [popularity_index, track_age_index], axis=1)
+
+        genre_embeddings = self.create_genre_embedding_matrix(genres)
+
+        # normalized rows, NaN for tracks without artist embedding
+        artist_embeddings = np.full((len(artist_rows), self.w2v_artist_features), np.nan)
+        known = artist_rows >= 0
+        artist_embeddings[known] = self._artist_embeddings.matrix[artist_rows[known]]
+
+        # combine information in a single matrix, block by block, unweighted
+        blocks = [
+            audio_features,
+            normalized_features[:, [popularity_index]],
+            normalized_features[:, [track_age_index]],
+            genre_embeddings,
+            artist_embeddings
+        ]
+        representation_matrix = np.empty((len(features), sum(block.shape[1] for block in blocks)))
+        column = 0
+        for block in blocks:
+            representation_matrix[:, column:column + block.shape[1]] = block
+            column += block.shape[1]
+
+        return representation_matrix
+
+
+    def vector_blocks(self) -> List[VectorBlock]:
+        """Block layout of the representation vectors, with the default weight of every block
+
+        Vectors are stored unweighted, the weights are applied when vectors are compared
+        (see BlockWeightedCosineIndex): they can be tuned without rebuilding the vectors.
+        """
+        sizes = {
+            'audio_features': len(Track.__scaled_features__) - 2,
+            'popularity': 1,
+            'track_age': 1,
+            'genres': self.w2v_genre_features,
+            'artist': self.w2v_artist_features
+        }
+        weights = {
+            'audio_features': self._track_audio_features_weight,
+            'popularity': self._track_popularity_weight,
+            'track_age': self._track_date_weight,
+            'genres': self._genre_weight,
+            'artist': self._artist_weight
+        }
+        blocks, start = [], 0
+        for name, size in sizes.items():
+            blocks.append(VectorBlock(name=name, start=start, stop=start + size, weight=weights[name]))
+            start += size
+        return blocks
     
     
     def construct_track_representation_vectors(
         self,
-        tracks: List[Track]
-    ) -> Dict[str, RepresentationVector]:
+        tracks: Union[TrackStore, SqliteTracks, List[Track]],
+        workers: Optional[int] = 1,
+        chunk_size: Optional[int] = 100_000
+    ) -> RepresentationVectorStore:
         """Generates representation vectors for all tracks.
         
-        Combines track info, genre embeddings and artist embeddings.
+        Combines track info, genre embeddings and artist embeddings, one chunk of tracks
+        at a time, and streams the chunks to the representation vector store.
+        With workers > 1 the chunks are computed in a process pool and written in catalog
+        order: the store is byte identical to the one of a serial build.
 
         Args:
-            tracks (List[Track]): set of tracks to create the representation vectors for
+            tracks (Union[TrackStore, SqliteTracks, List[Track]]): set of tracks to create the representation vectors for
+            workers (Optional[int]): number of processes computing the chunks
+            chunk_size (Optional[int]): tracks per chunk
 
         Returns:
-            List[RepresentationVector]: List of representation vectors for each track
+            RepresentationVectorStore: the written store, with the vector of every track that could be processed
         """
-        vocab = list(set(
-            [
-                self.process_genre(genre) \
-                    for track in tqdm(tracks, desc="Creating vocab for genres") \
-                    for genre in track.genres
-            ]
-        ))
-        
-        df = pd.DataFrame(vocab, columns=['word'])
-        df.to_csv(self._settings.genre_vocab_local_stored_path, index=False)
+        track_ids, features, genres, artist_rows = self._track_inputs(tracks)
 
-        representation_vectors = {}
-        
-        for track in tqdm(tracks, desc="Creating Track Vectors"):
-            representation_vector = self._create_track_representation_vector(
-                track = track
+        # genres in order of first appearance
+        vocab = GenreVocabulary(genres.vocabulary[code] for code in pd.unique(genres.codes).tolist())
+        vocab.to_csv(self._settings.genre_vocab_local_stored_path)
+
+        valid = np.zeros(len(track_ids), dtype=bool)
+
+        def valid_rows():
+            # tracks that can not be processed (NaN values) are left out
+            for start, representation_matrix in self._create_representation_matrices(
+                features, genres, artist_rows, workers, chunk_size
+            ):
+                chunk_valid = ~np.isnan(representation_matrix).any(axis=1)
+                valid[start:start + chunk_size] = chunk_valid
+                chunk_ids = track_ids[start:start + chunk_size]
+                yield [track_id for track_id, is_valid in zip(chunk_ids, chunk_valid.tolist()) if is_valid], \
+                    representation_matrix[chunk_valid]
+
+        path = self._settings.track_representation_vectors_stored_path
+        RepresentationVectorStore.write_chunks(
+            path=path, chunks=valid_rows(), dtype=self.vector_dtype.str, blocks=self.vector_blocks()
+        )
+
+        store_rows = np.where(valid, np.cumsum(valid) - 1, -1)
+        self.save_input_fingerprints(track_ids, self.input_fingerprints(features, genres, artist_rows), store_rows)
+        return RepresentationVectorStore.open(path)
+
+
+    def update_track_representation_vectors(
+        self,
+        tracks: Union[TrackStore, SqliteTracks, List[Track]],
+        workers: Optional[int] = 1,
+        chunk_size: Optional[int] = 100_000
+    ) -> Tuple[int, int, int]:
+        """Incremental rebuild: only the vectors whose input fingerprint changed are computed
+
+        Changed vectors are patched in a copy of the stored matrix, vectors of new tracks are appended
+        and vectors of tracks that left the catalog (or can no longer be processed) are removed.
+        Every vector ends up as the one a full build would give.
+        Falls back to a full build when no fingerprints are stored, or when the vectors are
+        stored in another dtype or block layout. Only the default block weights of the store
+        are replaced when they changed.
+
+        Args:
+            tracks (Union[TrackStore, SqliteTracks, List[Track]]): the whole catalog
+            workers (Optional[int]): number of processes computing the changed vectors
+            chunk_size (Optional[int]): tracks per chunk
+
+        Returns:
+            Tuple[int, int, int]: number of vectors updated, added and removed
+        """
+        path = self._settings.track_representation_vectors_stored_path
+        previous = self.load_input_fingerprints()
+        meta = RepresentationVectorStore.read_meta(path) if RepresentationVectorStore.exists(path) else None
+        blocks = self.vector_blocks()
+        layout = [(block.name, block.start, block.stop) for block in blocks]
+        if previous is None or meta is None or np.dtype(meta['dtype']) != self.vector_dtype \
+                or [(block['name'], block['start'], block['stop']) for block in meta.get('blocks', [])] != layout:
+            return 0, len(self.construct_track_representation_vectors(tracks, workers, chunk_size)), 0
+
+        if meta['blocks'] != [block.dict() for block in blocks]:
+            meta['blocks'] = [block.dict() for block in blocks]
+            RepresentationVectorStore.write_meta(path, meta)
+
+        track_ids, features, genres, artist_rows = self._track_inputs(tracks)
+        fingerprints = self.input_fingerprints(features, genres, artist_rows)
+
+        vocab = GenreVocabulary(genres.vocabulary[code] for code in pd.unique(genres.codes).tolist())
+        vocab.to_csv(self._settings.genre_vocab_local_stored_path)
+
+        previous_rows, store_rows, removed_rows = self._match_previous_build(track_ids, previous)
+        changed = np.flatnonzero(
+            (previous_rows < 0) | (previous.fingerprint.to_numpy()[np.maximum(previous_rows, 0)] != fingerprints)
+        )
+
+        patch_rows, patch_vectors, added, added_vectors = [], [], [], []
+        for start, representation_matrix in self._create_representation_matrices(
+            features[changed], genres.take(changed), artist_rows[changed], workers, chunk_size
+        ):
+            valid = ~np.isnan(representation_matrix).any(axis=1)
+            chunk = changed[start:start + chunk_size]
+            chunk_rows = store_rows[chunk]
+
+            patch = valid & (chunk_rows >= 0)
+            patch_rows.append(chunk_rows[patch])
+            patch_vectors.append(representation_matrix[patch])
+            # can no longer be processed
+            removed_rows.extend(chunk_rows[~valid & (chunk_rows >= 0)].tolist())
+            store_rows[chunk[~valid]] = -1
+            added.append(chunk[valid & (chunk_rows < 0)])
+            added_vectors.append(representation_matrix[valid & (chunk_rows < 0)])
+
+        updated = sum(len(rows) for rows in patch_rows)
+        if updated > 0:
+            RepresentationVectorStore.patch(path, np.concatenate(patch_rows), np.concatenate(patch_vectors))
+
+        if len(removed_rows) > 0:
+            RepresentationVectorStore.remove_rows(path, removed_rows)
+            # the kept rows move up by the number of removed rows before them
+            removed = np.zeros(RepresentationVectorStore.read_meta(path)['rows'] + len(removed_rows) + 1, dtype=np.int64)
+            removed[np.asarray(removed_rows) + 1] = 1
+            kept = store_rows >= 0
+            store_rows[kept] -= np.cumsum(removed)[store_rows[kept]]
+
+        added = np.concatenate(added) if len(added) > 0 else np.empty(0, dtype=np.int64)
+        if len(added) > 0:
+            store_rows[added] = RepresentationVectorStore.read_meta(path)['rows'] + np.arange(len(added))
+            RepresentationVectorStore.append(path, [track_ids[index] for index in added.tolist()], np.concatenate(added_vectors))
+
+        # stored last: after an interruption the changed vectors are computed again
+        if len(changed) > 0 or len(removed_rows) > 0 or len(previous) != len(track_ids):
+            self.save_input_fingerprints(track_ids, fingerprints, store_rows)
+        return updated, len(added), len(removed_rows)
+
+
+    def _match_previous_build(self, track_ids: List[str], previous: pd.DataFrame) -> Tuple[NDArray, NDArray, List[int]]:
+        """Catalog tracks in the last build
+
+        The store rows recorded with the fingerprints are used when the store still holds
+        exactly those vectors, otherwise (e.g vectors appended by a delta sync) tracks are
+        matched with the store by id.
+
+        Returns:
+            Tuple[NDArray, NDArray, List[int]]: row of every track in the stored fingerprints and
+                in the vector store (-1 when absent), store rows of the tracks that left the catalog
+        """
+        previous_ids = previous['id'].to_list()
+        previous_store_rows = previous['row'].to_numpy(dtype=np.int64)
+
+        if len(previous_ids) <= len(track_ids) and track_ids[:len(previous_ids)] == previous_ids:
+            # the catalog only grew, no id lookup
+            previous_rows = np.full(len(track_ids), -1, dtype=np.int64)
+            previous_rows[:len(previous_ids)] = np.arange(len(previous_ids))
+        else:
+            previous_rows = IdIndex(previous_ids).get_many(track_ids)
+
+        stored_ids = RepresentationVectorStore.read_ids(self._settings.track_representation_vectors_stored_path)
+        in_store = previous_store_rows >= 0
+        consistent = np.count_nonzero(in_store) == len(stored_ids)
+        if consistent:
+            ids_by_row = np.empty(len(stored_ids), dtype=object)
+            ids_by_row[previous_store_rows[in_store]] = np.array(previous_ids, dtype=object)[in_store]
+            consistent = ids_by_row.tolist() == stored_ids
+
+        if not consistent:
+            return (
+                previous_rows,
+                IdIndex(stored_ids).get_many(track_ids),
+                np.flatnonzero(IdIndex(track_ids).get_many(stored_ids) < 0).tolist()
             )
-            
-            if representation_vector is not None:
-                representation_vectors[track.id] = representation_vector
-            
-        df = pd.DataFrame(list(representation_vectors.values()), columns=[f"w{i+1}" for i in range(len(representation_vector))])
-        df['id'] = list(representation_vectors.keys())
-        df.set_index('id', inplace=True)
-        df.to_csv(self._settings.track_representation_vectors_stored_path)
-    
-        return representation_vectors
+
+        known = previous_rows >= 0
+        store_rows = np.full(len(track_ids), -1, dtype=np.int64)
+        store_rows[known] = previous_store_rows[previous_rows[known]]
+        matched = np.zeros(len(previous_ids), dtype=bool)
+        matched[previous_rows[known]] = True
+        return previous_rows, store_rows, previous_store_rows[in_store & ~matched].tolist()
+
+
+    def _create_representation_matrices(
+        self,
+        features: NDArray,
+        genres: InternedListColumn,
+        artist_rows: NDArray,
+        workers: int,
+        chunk_size: int
+    ) -> Iterator[Tuple[int, NDArray]]:
+        """Representation matrices of consecutive chunks of tracks, yielded in order with their first row
+
+        With workers > 1 the chunks are computed in a process pool, at most two chunks
+        per worker are in flight so finished chunks do not pile up.
+        """
+        starts = range(0, len(features), chunk_size)
+        chunks = [
+            (features[start:start + chunk_size], genres.slice(start, start + chunk_size), artist_rows[start:start + chunk_size])
+                for start in starts
+        ]
+        if workers <= 1 or len(chunks) <= 1:
+            for start, chunk in zip(starts, chunks):
+                yield start, self.create_track_representation_matrix(*chunk)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_chunk_worker,
+            initargs=(self.normalizer.data_min, self.normalizer.data_max)
+        ) as executor:
+            pending = deque()
+            for start, chunk in zip(starts, chunks):
+                pending.append((start, executor.submit(_create_chunk_matrix, *chunk)))
+                if len(pending) >= 2 * workers:
+                    start, future = pending.popleft()
+                    yield start, future.result()
+            while pending:
+                start, future = pending.popleft()
+                yield start, future.result()
+
+
+    def model_fingerprint(self) -> int:
+        """Fingerprint of everything shared by all vectors: embeddings and normalizer
+        (block weights are not part of the stored vectors)"""
+        digest = hashlib.sha1()
+        digest.update(json.dumps({
+            'features': Track.__scaled_features__,
+            'data_min': self.normalizer.data_min.tolist(),
+            'data_max': self.normalizer.data_max.tolist()
+        }).encode())
+        digest.update('\n'.join(self._genre_index.keys()).encode())
+        digest.update(self._genre_embedding_matrix.tobytes())
+        digest.update('\n'.join(self._artist_embeddings.keys()).encode())
+        digest.update(np.ascontiguousarray(self._artist_embeddings.matrix).tobytes())
+        return int.from_bytes(digest.digest()[:8], 'little')
+
+
+    @staticmethod
+    def _mix(values: NDArray) -> NDArray:
+        # splitmix64 finalizer, uint64 arithmetic wraps around
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+    def input_fingerprints(self, features: NDArray, genres: InternedListColumn, artist_rows: NDArray) -> NDArray:
+        """64 bit fingerprint of the inputs of every vector (see _track_inputs)
+
+        Covers the raw scaled features, the embedded genres in order, the first artist
+        and the model fingerprint: equal fingerprints give equal vectors.
+
+        Returns:
+            NDArray: uint64 fingerprint per track
+        """
+        fingerprints = np.full(len(features), self.model_fingerprint(), dtype=np.uint64)
+        for column in np.ascontiguousarray(features, dtype=np.float64).view(np.uint64).T:
+            fingerprints = self._mix(fingerprints ^ column)
+        fingerprints = self._mix(fingerprints ^ artist_rows.astype(np.uint64))
+
+        genre_rows, offsets = self._genre_embedding_rows(genres)
+        counts = np.diff(offsets)
+        fingerprints = self._mix(fingerprints ^ counts.astype(np.uint64))
+        for position in range(int(counts.max()) if len(counts) > 0 else 0):
+            tracks = np.flatnonzero(counts > position)
+            fingerprints[tracks] = self._mix(fingerprints[tracks] ^ genre_rows[offsets[tracks] + position].astype(np.uint64))
+
+        return fingerprints
+
+
+    def input_fingerprints_path(self) -> Optional[str]:
+        vectors_path = self._settings.track_representation_vectors_stored_path
+        return os.path.join(vectors_path, self.INPUT_FINGERPRINTS) if vectors_path is not None else None
+
+
+    def save_input_fingerprints(self, track_ids: List[str], fingerprints: NDArray, store_rows: NDArray) -> None:
+        """Store the input fingerprints of the catalog tracks and their rows in the vector store (-1 for none),
+        next to the representation vectors"""
+        path = self.input_fingerprints_path()
+        # written aside and swapped, a missing frame only means a full build
+        columnar.write_frame(
+            pd.DataFrame({'id': track_ids, 'fingerprint': fingerprints, 'row': store_rows.astype(np.int64)}),
+            path + '.tmp'
+        )
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(path + '.tmp', path)
+
+
+    def load_input_fingerprints(self) -> Optional[pd.DataFrame]:
+        """Track ids (id), input fingerprints (fingerprint) and store rows (row) of the last build,
+        None when nothing is stored"""
+        path = self.input_fingerprints_path()
+        if not columnar.frame_exists(path):
+            return None
+
+        return columnar.read_frame(path)
     
     
     def create_track_representation_vector(
@@ -176,15 +694,39 @@ class DataProcessor:
             track (Track): track domain model
 
         Returns:
-            RepresentationVector: repr output
+            RepresentationVector: repr output, in the dtype of the stored vectors
         """
-        return self._create_track_representation_vector(
+        vector = self._create_track_representation_vector(
             track = track
         )
+        return vector.astype(self.vector_dtype, copy=False) if vector is not None else None
+    
+    
+    def export_artist_embeddings(self, artists: Dict[str, Artist], n_neighbors: Optional[int] = 4) -> Tuple[int, int]:
+        """Export the artist embeddings model to the artist embedding table, with a genre based
+        fallback row for the catalog artists missing from the model (see ArtistEmbeddingTable.export)
+
+        Args:
+            artists (Dict[str, Artist]): catalog artists
+            n_neighbors (Optional[int]): model artists averaged per fallback
+
+        Returns:
+            Tuple[int, int]: number of model and fallback rows
+        """
+        genres = InternedListColumn.from_lists([
+            [self.process_genre(genre) for genre in artist.genres or []] for artist in artists.values()
+        ])
+        return ArtistEmbeddingTable.export(
+            path=self._settings.artist_embedding_table,
+            keyed_vectors=KeyedVectors.load(self._settings.artist_embeddings),
+            artist_ids=list(artists.keys()),
+            genre_embeddings=self.create_genre_embedding_matrix(genres),
+            n_neighbors=n_neighbors
+        )
     
     
     def process_genre(self, genre: str) -> str:
-        return genre.strip().strip("'")
+        return GenreVocabulary.normalize(genre)
 
 
     def create_sentence_embedding(
@@ -205,11 +747,25 @@ class DataProcessor:
         tokens_accumulated = 0
         for word in sentence_tokenized:
             
-            if word not in self._genre_embeddings.item():
+            row = self._genre_index.get(word)
+            if row is None:
                 continue
             
-            word_vector = self._genre_embeddings.item().get(word)
-            sentence_vector += word_vector
+            sentence_vector += self._genre_embedding_matrix[row]
             tokens_accumulated += 1
 
         return sentence_vector / tokens_accumulated if tokens_accumulated > 0 else np.array([np.nan]*features_number)
+
+
+# data processor of a worker of the parallel build, created once per process
+_chunk_processor: DataProcessor = None
+
+
+def _init_chunk_worker(data_min: NDArray, data_max: NDArray) -> None:
+    global _chunk_processor
+    _chunk_processor = DataProcessor()
+    _chunk_processor.normalizer.set_range(data_min, data_max)
+
+
+def _create_chunk_matrix(features: NDArray, genres: InternedListColumn, artist_rows: NDArray) -> NDArray:
+    return _chunk_processor.create_track_representation_matrix(features, genres, artist_rows)
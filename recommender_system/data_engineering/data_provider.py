@@ -1,59 +1,97 @@
+import os
 import numpy as np
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+from settings import get_settings
 
 from common.database.local_storage import LocalStorage
-from common.domain.models import Track, Artist, RepresentationVector, ArtistSearchableObject
+from common.database.sqlite_db import SqliteDatabase
+from common.database.vector_store import RepresentationVectorStore
+from common.database.track_store import TrackStore
+from common.database.write_back_log import WriteBackLog
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Track, Artist, RepresentationVector
 from common.converters.interfaces import TrackConversionInterface, ArtistConversionInterface
+from recommender_system.algorithm.ivf_index import IVFCosineIndex
+from recommender_system.data_engineering.catalog_service import CatalogService, CatalogCapability
 from recommender_system.data_engineering.data_processing import DataProcessor
+from recommender_system.data_engineering.runtime_cache import RuntimeCache
 from spotify_connectors.spotify_web_api import SpotifyWebAPI
 from common import utils
 
 
 class DataProvider:
+    """View of the process wide catalog service for one consumer
+
+    Components are shared with every other DataProvider of the process,
+    the capabilities requested here are only built once.
+    """
 
-    _track_representation_vectors: Dict[str, RepresentationVector] = None
-    _tracks: Dict[str, Track] = None
-    _artists: Dict[str, Artist] = None
-    
     def __init__(
         self, 
         create_hash_map_for_artists: Optional[bool] = False,
-        use_as_mapper_only: Optional[bool] = False
+        use_as_mapper_only: Optional[bool] = False,
+        catalog_service: Optional[CatalogService] = None
     ):
-        self._db = LocalStorage()
-        self._spotify_web_api = SpotifyWebAPI()
-        self._data_processor = DataProcessor()
-        self._tracks = self._db.get_tracks()
-        self._artists = self._db.get_artists()
-        self._genres_vocab = self._db.get_genres_vocab()
-        self._track_representation_vectors = self._db.get_track_representation_vectors()
-        
-        if not use_as_mapper_only:
-            
-            self._data_processor.fit_normalizer(self._tracks.values())
-        
-        
+        self._catalog_service = catalog_service if catalog_service is not None else CatalogService.get()
+
+        capabilities = CatalogCapability.ARTISTS
         if create_hash_map_for_artists:
-            self._artist_hash_map: Dict[str, List[ArtistSearchableObject]] = {}
-            
-            for artist in self._artists.values():
-                artist_name_clean = utils.clear_name_text(artist.name)
-                
-                if artist_name_clean[0] not in self._artist_hash_map:
-                    self._artist_hash_map[artist_name_clean[0]] = []
-                
-                self._artist_hash_map[artist_name_clean[0]].append(
-                    ArtistSearchableObject(
-                        name = utils.clear_name_text(artist_name_clean),
-                        id = artist.id
-                    )
-                )
-                
-            # sort hash bins
-            for key in self._artist_hash_map.keys():
-                self._artist_hash_map[key] = sorted(self._artist_hash_map[key], key = lambda x: x.name, reverse=False)
-    
+            capabilities |= CatalogCapability.ARTIST_NAME_INDEX
+        if not use_as_mapper_only:
+            capabilities |= CatalogCapability.RECOMMENDER
+        self._catalog_service.require(capabilities)
+
+
+    @property
+    def _db(self) -> Union[LocalStorage, SqliteDatabase]:
+        return self._catalog_service.db()
+
+
+    @property
+    def _tracks(self) -> TrackStore:
+        return self._db.get_tracks()
+
+
+    @property
+    def _artists(self) -> Dict[str, Artist]:
+        return self._db.get_artists()
+
+
+    @property
+    def _genre_vocabulary(self) -> GenreVocabulary:
+        return self._db.get_genre_vocabulary()
+
+
+    @property
+    def _track_representation_vectors(self) -> RepresentationVectorStore:
+        return self._db.get_track_representation_vectors()
+
+
+    @property
+    def _write_back_log(self) -> Optional[WriteBackLog]:
+        return self._db.get_write_back_log()
+
+
+    @property
+    def _runtime_tracks(self) -> RuntimeCache:
+        return self._catalog_service.runtime_tracks()
+
+
+    @property
+    def _runtime_track_representation_vectors(self) -> RuntimeCache:
+        return self._catalog_service.runtime_track_representation_vectors()
+
+
+    @property
+    def _data_processor(self) -> DataProcessor:
+        return self._catalog_service.data_processor()
+
+
+    @property
+    def _spotify_web_api(self) -> SpotifyWebAPI:
+        return self._catalog_service.spotify_web_api()
+
 
     def get_all_available_tracks(self):
         return self._tracks
@@ -64,26 +102,66 @@ class DataProvider:
 
 
     def get_track(self, track_id: str) -> Track:
-        if track_id not in self._tracks:
+        # catalog tracks are materialized from the track store on access
+        if track_id in self._tracks:
+            return self._tracks[track_id]
+
+        track = self._runtime_tracks.get(track_id)
+        if track is RuntimeCache.MISSING:
 
             enhanced_track = self._spotify_web_api.get_enhanced_track(track_id)
+            # with their genres, artists fetched here are logged with the track for the compaction
+            enhanced_track.artists = [self.get_artist(artist.id) for artist in enhanced_track.artists]
 
-            self._tracks[track_id] = TrackConversionInterface.convert_dto_to_domain(
+            track = TrackConversionInterface.convert_dto_to_domain(
                 enhanced_track
             )
+            self._runtime_tracks[track_id] = track
+
+            if self._write_back_log is not None:
+                self._write_back_log.append_track(track)
         
-        return self._tracks[track_id]
+        return track
     
     
+    def get_tracks(self, track_ids: List[str]) -> List[Track]:
+        """Tracks by id, catalog tracks are resolved in one batch"""
+        catalog_tracks = self._tracks.get_many(track_ids)
+        return [
+            catalog_tracks[track_id] if track_id in catalog_tracks else self.get_track(track_id) for track_id in track_ids
+        ]
+
+
     def get_artist(self, artist_id: str) -> Artist:
         if artist_id not in self._artists:
             self._artists[artist_id] = ArtistConversionInterface.convert_dto_to_domain(
                 self._spotify_web_api.get_artists([artist_id])[0]
             )
+
+            if self._write_back_log is not None:
+                self._write_back_log.append_artist(self._artists[artist_id])
         return self._artists[artist_id]
 
 
-    def get_all_representation_vectors(self):
+    def get_genre_vocabulary(self) -> GenreVocabulary:
+        return self._genre_vocabulary
+
+
+    def get_sources_fingerprint(self) -> str:
+        """Fingerprint of the catalog and representation vector files on disk,
+        changes when any of them is rebuilt"""
+        source_files = self._db.get_source_files()
+        vectors_path = get_settings().track_representation_vectors_stored_path
+        if RepresentationVectorStore.exists(vectors_path):
+            # with the IVF index saved next to the vectors (cli build-vector-index)
+            source_files = source_files + [
+                os.path.join(vectors_path, RepresentationVectorStore.META_FILE),
+                os.path.join(vectors_path, IVFCosineIndex.DIRECTORY, IVFCosineIndex.META_FILE)
+            ]
+        return utils.files_fingerprint([path for path in source_files if path is not None and os.path.exists(path)])
+
+
+    def get_all_representation_vectors(self) -> RepresentationVectorStore:
         return self._track_representation_vectors
     
     
@@ -107,8 +185,11 @@ class DataProvider:
         
         # append tracks in local db
         for track in tracks:
-            if track.id not in self._tracks:
-                self._tracks[track.id] = track
+            if track.id not in self._tracks and track.id not in self._runtime_tracks:
+                self._runtime_tracks[track.id] = track
+
+                if self._write_back_log is not None:
+                    self._write_back_log.append_track(track)
 
         return tracks
     
@@ -118,23 +199,24 @@ class DataProvider:
         track: Track
     ) -> Optional[RepresentationVector]:
 
-        if track.id in self._track_representation_vectors:
-            return self._track_representation_vectors[track.id]
-        
-        self._track_representation_vectors[track.id] = self._data_processor.create_track_representation_vector(track)
+        # catalog vectors are rows of the shared memory mapped matrix
+        catalog_vector = self._track_representation_vectors.get(track.id)
+        if catalog_vector is not None:
+            return catalog_vector
+
+        vector = self._runtime_track_representation_vectors.get(track.id)
+        if vector is RuntimeCache.MISSING:
+            vector = self._data_processor.create_track_representation_vector(track)
+            self._runtime_track_representation_vectors[track.id] = vector
+
+            if self._write_back_log is not None:
+                self._write_back_log.append_vector(track.id, vector)
         
-        return self._track_representation_vectors[track.id]
+        return vector
     
     
     def artist_mapper(
         self,
         artist_name: str
-    ) -> Artist:
-        
-        artist_name_clean = utils.clear_name_text(artist_name)
-        
-        artists_bin = self._artist_hash_map.get(artist_name_clean[0], [])
-        
-        for artists in artists_bin:
-            if artist_name_clean == artists.name:
-                return self._artists[artists.id]
+    ) -> Optional[Artist]:
+        return self._catalog_service.find_artist_by_name(artist_name)
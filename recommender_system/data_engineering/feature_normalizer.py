@@ -0,0 +1,57 @@
+import numpy as np
+
+from numpy.typing import NDArray
+from typing import List, Sequence
+
+
+class FeatureNormalizer:
+    """Min-max normalization of a set of features, as one (N x F) matrix operation
+
+    Same parameters and results as one sklearn MinMaxScaler per feature
+    (NaNs are ignored when fitting and kept when transforming, constant features
+    get a scale of 1), without the per call validation of sklearn.
+    """
+
+    def __init__(self, features: List[str]):
+        self.features = list(features)
+        self.data_min: NDArray = None
+        self.data_max: NDArray = None
+        self.scale: NDArray = None
+        self.min: NDArray = None
+
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale is not None
+
+
+    def fit(self, matrix: NDArray) -> 'FeatureNormalizer':
+        """Fit on a (N x F) matrix, one column per feature"""
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(self.features))
+        return self.set_range(np.nanmin(matrix, axis=0), np.nanmax(matrix, axis=0))
+
+
+    def set_range(self, data_min: Sequence[float], data_max: Sequence[float]) -> 'FeatureNormalizer':
+        """Set the fitted minimum and maximum of every feature (e.g. stored parameters)"""
+        self.data_min = np.asarray(data_min, dtype=np.float64)
+        self.data_max = np.asarray(data_max, dtype=np.float64)
+
+        data_range = self.data_max - self.data_min
+        # as sklearn: (near) constant features are not scaled
+        data_range[data_range < 10 * np.finfo(np.float64).eps] = 1.0
+        self.scale = 1.0 / data_range
+        self.min = -self.data_min * self.scale
+        return self
+
+
+    def transform(self, matrix: NDArray) -> NDArray:
+        """Normalize a (N x F) matrix, returns a new matrix"""
+        matrix = np.array(matrix, dtype=np.float64).reshape(-1, len(self.features))
+        matrix *= self.scale
+        matrix += self.min
+        return matrix
+
+
+    def transform_row(self, values: Sequence[float]) -> NDArray:
+        """Normalize the features of a single row (on the fly vectors)"""
+        return np.asarray(values, dtype=np.float64) * self.scale + self.min
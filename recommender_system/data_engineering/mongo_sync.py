@@ -0,0 +1,165 @@
+import os
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List, Optional, Tuple
+
+from settings import get_settings
+from common import utils
+from common.data_transfer.models import EnhancedTrack
+from common.converters.interfaces import TrackConversionInterface
+from common.database.catalog_snapshot import CatalogSnapshot
+from common.database.columnar import IdIndex
+from common.database.mongo_db import MongoDatabase
+from common.database.mongo_export import MongoSnapshotExporter, ARTIST_PROJECTION
+from common.database.vector_store import RepresentationVectorStore
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Artist
+from recommender_system.data_engineering.data_processing import DataProcessor
+
+
+class MongoDeltaSync:
+    """Brings the serving catalog up to date with the documents inserted in Mongo
+    since the last export or sync (the watermark stored with the snapshot)
+
+    New tracks are converted with TrackConversionInterface (genres and popularity from
+    the catalog artists), their representation vectors computed with the stored normalizer,
+    and both are appended: to the catalog snapshot, to the representation vector store
+    (the kNN index is fitted on it, a running API picks it up on reload) and to the genre vocab.
+
+    Only the delta is converted and written. Ids already in the catalog are skipped,
+    so an interrupted sync can simply run again.
+    """
+
+    def __init__(
+        self,
+        mongo_db: MongoDatabase,
+        snapshot: CatalogSnapshot,
+        data_processor: Optional[DataProcessor] = None,
+        batch_size: Optional[int] = 5000,
+        lag: Optional[float] = 60.0
+    ):
+        self._settings = get_settings()
+        self._mongo_db = mongo_db
+        self._snapshot = snapshot
+        self._data_processor = data_processor if data_processor is not None else DataProcessor()
+        self._exporter = MongoSnapshotExporter(mongo_db, snapshot, batch_size=batch_size, lag=lag)
+        self._batch_size = batch_size
+        self._vectors_path = self._settings.track_representation_vectors_stored_path
+
+
+    def _catalog_fingerprint(self) -> str:
+        # same fingerprint as LocalStorage.get_catalog_fingerprint on a snapshot
+        return utils.files_fingerprint(self._snapshot.manifest_files())
+
+
+    def _delta(self, collection, watermark, next_watermark, projection=None) -> List[Dict]:
+        query = {MongoDatabase.INSERTED_AT: {'$gte': watermark, '$lt': next_watermark}}
+        return [
+            document for chunk in MongoDatabase.iter_documents(collection, projection, self._batch_size, query)
+                for document in chunk
+        ]
+
+
+    def _catalog_artists(self, df_artists: pd.DataFrame, index: IdIndex, artist_ids: List[str]) -> Dict[str, Artist]:
+        """Catalog artists by id, only the requested rows are built"""
+        rows = index.get_many(artist_ids)
+        return {
+            artist_id: Artist(
+                id=artist_id,
+                name=df_artists['name'].iat[row],
+                popularity=df_artists['popularity'].iat[row],
+                genres=[GenreVocabulary.normalize(genre) for genre in df_artists['genres'].iat[row]]
+            ) for artist_id, row in zip(artist_ids, rows.tolist()) if row >= 0
+        }
+
+
+    def sync(self) -> Tuple[int, int, int]:
+        """Append the tracks, artists and representation vectors inserted since the watermark
+
+        Returns:
+            Tuple[int, int, int]: number of tracks, artists and vectors added
+        """
+        watermark = MongoSnapshotExporter.load_watermark(self._snapshot)
+        if watermark is None:
+            raise ValueError(f"{self._snapshot.path} has no Mongo watermark, export the catalog first")
+
+        # vectors of the delta must be normalized as the catalog vectors
+        normalizer_fingerprint = self._catalog_fingerprint()
+        if not self._data_processor.load_normalizer(fingerprint=normalizer_fingerprint):
+            # a sync interrupted after appending to the snapshot: the normalizer is still stored for the catalog before
+            normalizer_fingerprint = MongoSnapshotExporter.load_normalizer_fingerprint(self._snapshot)
+            if normalizer_fingerprint is None or not self._data_processor.load_normalizer(fingerprint=normalizer_fingerprint):
+                raise ValueError("No normalizer stored for the current catalog, build the representation vectors first")
+
+        next_watermark = self._exporter.next_watermark()
+        if next_watermark <= watermark:
+            return 0, 0, 0
+
+        artist_documents = self._delta(self._mongo_db.collection_artists, watermark, next_watermark, ARTIST_PROJECTION)
+        track_documents = self._delta(self._mongo_db.collection_tracks, watermark, next_watermark, {'_id': 0})
+
+        # catalog ids, and the artist columns needed for the genres of the referenced artists
+        df_artists = self._snapshot.read_artists(columns=['id', 'name', 'popularity', 'genres'])
+        artist_index = IdIndex(df_artists['id'].to_list())
+        track_index = IdIndex(self._snapshot.read_tracks(columns=['id'])['id'].to_list())
+        store = RepresentationVectorStore.open(self._vectors_path)
+
+        new_artist_documents = [document for document in artist_documents if document['id'] not in artist_index]
+        new_track_documents = [document for document in track_documents if document['id'] not in track_index]
+
+        # track artists of Mongo have no genres / popularity: catalog artists first, then the new ones
+        artist_ids = list(dict.fromkeys(
+            artist['id'] for document in new_track_documents for artist in document.get('artists') or []
+        ))
+        artists = self._catalog_artists(df_artists, artist_index, artist_ids)
+        for document in new_artist_documents:
+            artists.setdefault(document['id'], Artist(
+                id=document['id'],
+                name=document.get('name'),
+                popularity=document.get('popularity') or 0,
+                genres=[GenreVocabulary.normalize(genre) for genre in document.get('genres') or []]
+            ))
+
+        vector_ids, vectors, genres = [], [], []
+        for document in new_track_documents:
+            enhanced_track = EnhancedTrack(**document)
+            # domain artists, as DataProvider.get_playlist_tracks does
+            enhanced_track.artists = [
+                artists.get(artist.id) or Artist(id=artist.id, name=artist.name, popularity=0, genres=[])
+                    for artist in enhanced_track.artists
+            ]
+            track = TrackConversionInterface.convert_dto_to_domain(enhanced_track)
+            genres.extend(track.genres)
+
+            if track.id in store:
+                continue
+            vector = self._data_processor.create_track_representation_vector(track)
+            if vector is not None:
+                vector_ids.append(track.id)
+                vectors.append(vector)
+
+        # the normalizer is found again if the sync is interrupted once the snapshot changed
+        MongoSnapshotExporter.save_watermark(self._snapshot, watermark, normalizer_fingerprint=normalizer_fingerprint)
+
+        # vectors first: a track in the snapshot is never synced again
+        if len(vectors) > 0:
+            RepresentationVectorStore.append(path=self._vectors_path, ids=vector_ids, matrix=np.array(vectors))
+        self._snapshot.append(
+            df_tracks=MongoSnapshotExporter.tracks_to_frame(new_track_documents),
+            df_artists=MongoSnapshotExporter.artists_to_frame(new_artist_documents)
+        )
+
+        genre_vocab_path = self._settings.genre_vocab_local_stored_path
+        if genre_vocab_path is not None and len(genres) > 0:
+            vocabulary = GenreVocabulary.from_csv(genre_vocab_path) if os.path.isfile(genre_vocab_path) else GenreVocabulary()
+            if any(genre not in vocabulary for genre in genres):
+                for genre in genres:
+                    vocabulary.add(genre)
+                vocabulary.to_csv(genre_vocab_path)
+
+        # the normalizer stays the one the catalog vectors were built with
+        self._data_processor.save_normalizer(fingerprint=self._catalog_fingerprint())
+        MongoSnapshotExporter.save_watermark(self._snapshot, next_watermark)
+
+        return len(new_track_documents), len(new_artist_documents), len(vector_ids)
@@ -0,0 +1,91 @@
+import time
+import threading
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class RuntimeCache:
+    """Size bounded cache of objects fetched or computed at runtime (tracks from Spotify,
+    on the fly representation vectors), least recently used entries are evicted first
+
+    None values are negative entries (e.g. tracks that can not be vectorized): they are
+    cached as well, but expire after negative_ttl seconds so they are computed again.
+    Hits, misses, evictions and expirations are counted for monitoring (see statistics).
+    """
+
+    # returned by get for keys that are not cached (None is a cached negative entry)
+    MISSING = object()
+
+    def __init__(
+        self,
+        max_size: int,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            max_size (int): maximum number of entries
+            negative_ttl (Optional[float]): seconds a negative entry is kept, forever if None
+            clock (Callable[[], float]): time source, in seconds
+        """
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expiry time of negative entries or None)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Cached value of a key (None for a negative entry), default if not cached or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self._clock():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                entry = None
+
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._counters['hits' if entry[0] is not None else 'negative_hits'] += 1
+            return entry[0]
+
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache a value, None as a negative entry, evicting the least recently used entries if full"""
+        if self.max_size <= 0 or (value is None and self.negative_ttl is not None and self.negative_ttl <= 0):
+            return
+
+        expiry = self._clock() + self.negative_ttl if value is None and self.negative_ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.put(key, value)
+
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a key is cached and not expired, without counting nor refreshing it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > self._clock())
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def statistics(self) -> Dict[str, int]:
+        """Counters since the cache was created, with the current and maximum size"""
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, **self._counters}
@@ -1,17 +1,161 @@
-from typing import Optional, List
+import logging
+import threading
+
+from typing import Callable, Optional, List, Dict
 
 from spotify_connectors.spotify_web_api_user import SpotifyWebAPIUser
 from recommender_system.algorithm.nn_recommender import NearestNeighborsRecommender
+from recommender_system.data_engineering.catalog_service import CatalogService
 from recommender_system.session.listening_session import MusicListeningSession
 from common.data_transfer.models import SessionSettings
 
 
+logger = logging.getLogger(__name__)
+
+
 class MusicOs:
+    """Music OS
+
+    The recommender (catalog, representation vectors and kNN index) can be reloaded
+    while serving: a new generation is built in the background and swapped in with a
+    single assignment. Every method takes one reference to the recommender when it starts,
+    so requests in flight finish on the generation they started with.
+    The listening session is kept across reloads.
+    """
+
+    def __init__(
+        self,
+        catalog_service: Optional[CatalogService] = None,
+        catalog_service_factory: Optional[Callable[[], CatalogService]] = CatalogService,
+        recommender_factory: Optional[Callable[..., NearestNeighborsRecommender]] = NearestNeighborsRecommender,
+        spotify_web_api: Optional[SpotifyWebAPIUser] = None
+    ):
+        """
+        Args:
+            catalog_service (Optional[CatalogService]): catalog of the first generation, the one of the process if not given
+            catalog_service_factory (Optional[Callable[[], CatalogService]]): builds the catalog of a new generation
+            recommender_factory (Optional[Callable[..., NearestNeighborsRecommender]]): builds the recommender
+                of a generation from its catalog service (catalog_service keyword)
+            spotify_web_api (Optional[SpotifyWebAPIUser]): Spotify client of the user playlists
+        """
+        self._catalog_service_factory = catalog_service_factory
+        self._recommender_factory = recommender_factory
+        self.recommender = recommender_factory(catalog_service=catalog_service)
+        self._spotify_web_api = spotify_web_api if spotify_web_api is not None else SpotifyWebAPIUser()
+        self._session = MusicListeningSession(
+            genre_vocabulary=self.recommender._data_provider.get_genre_vocabulary()
+        )
+        self._generation = 1
+        self._sources_fingerprint = self.recommender._data_provider.get_sources_fingerprint()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: threading.Thread = None
+        self._reload_error: Optional[str] = None
+        self._watch_thread: threading.Thread = None
+        self._stop_watching = threading.Event()
+
+
+    def reload(self, wait: Optional[bool] = False) -> bool:
+        """Rebuild the recommender from the files on disk and swap it in
+
+        Args:
+            wait (Optional[bool]): block until the new generation serves
+
+        Returns:
+            bool: False if a reload is already running
+        """
+        with self._reload_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+
+            self._reload_thread = threading.Thread(target=self._reload, name='musicos-reload', daemon=True)
+            self._reload_thread.start()
+
+        if wait:
+            self._reload_thread.join()
+        return True
+
+
+    def _reload(self):
+        # taken before building, so files rebuilt meanwhile trigger the next reload
+        sources_fingerprint = self.recommender._data_provider.get_sources_fingerprint()
 
-    def __init__(self):
-        self.recommender = NearestNeighborsRecommender()
-        self._spotify_web_api = SpotifyWebAPIUser()
-        self._session = MusicListeningSession()
+        try:
+            # a new catalog service, the current one keeps serving until the swap
+            catalog_service = self._catalog_service_factory()
+            recommender = self._recommender_factory(catalog_service=catalog_service)
+        except Exception as e:
+            logger.exception("Reload failed, generation %s keeps serving", self._generation)
+            self._reload_error = repr(e)
+            # not attempted again until the files change again (or an explicit reload)
+            self._sources_fingerprint = sources_fingerprint
+            return
+
+        self._session.set_genre_vocabulary(recommender._data_provider.get_genre_vocabulary())
+        self.recommender = recommender
+        CatalogService.set_instance(catalog_service)
+        self._generation += 1
+        self._sources_fingerprint = sources_fingerprint
+        self._reload_error = None
+        logger.info("Generation %s is serving", self._generation)
+
+
+    def get_reload_status(self) -> Dict:
+        return {
+            'generation': self._generation,
+            'reloading': self._reload_thread is not None and self._reload_thread.is_alive(),
+            'error': self._reload_error
+        }
+
+
+    def sources_changed(self) -> bool:
+        """Whether the catalog or representation vector files changed since the last reload
+        (successful or not)"""
+        return self.recommender._data_provider.get_sources_fingerprint() != self._sources_fingerprint
+
+
+    def watch_sources(self, interval: float):
+        """Reload whenever the catalog or representation vector files change on disk,
+        files that failed to build are not reloaded again until they change again
+
+        Args:
+            interval (float): seconds between checks
+        """
+        if self._watch_thread is not None:
+            return
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    if self.sources_changed():
+                        # checked again once the new generation serves (or failed)
+                        self.reload(wait=True)
+                except OSError:
+                    # files are being replaced, check again next time
+                    continue
+
+        self._stop_watching.clear()
+        self._watch_thread = threading.Thread(target=watch, name='musicos-watch', daemon=True)
+        self._watch_thread.start()
+
+
+    def stop_watching(self):
+        """Stop watching the files, once a reload started by the watcher is done"""
+        if self._watch_thread is None:
+            return
+
+        self._stop_watching.set()
+        self._watch_thread.join()
+        self._watch_thread = None
+
+
+    def check_session_settings(self, settings: Optional[SessionSettings]) -> Optional[str]:
+        """Why session settings can't be used with the representation vectors serving (e.g block
+        weights of blocks the vectors don't have), None if they can"""
+        try:
+            self.recommender.column_weights(settings)
+        except ValueError as e:
+            return str(e)
+        return None
 
 
     def reset_session(self):
@@ -29,21 +173,25 @@ class MusicOs:
     
     
     def get_track_pool_clusters(self):
+        recommender = self.recommender
         track_pool = self._session.get_track_pool()
         
-        vectors = self.recommender.get_track_pool_vectors(
+        vectors = recommender.get_track_pool_vectors(
             [item.track for item in track_pool.values()]
         )
         
         if len(vectors) <= 0:
             return []
         
-        tsne_with_cluster = self.recommender._profile_creator.get_tsne_points_with_cluster(list(vectors.values()))
+        tsne_with_cluster = recommender._profile_creator.get_tsne_points_with_cluster(
+            list(vectors.values()),
+            column_weights=recommender.column_weights()
+        )
         
         track_ids = list(vectors.keys())
         track_pool_clusters = []
         for tsne_point, track_id in zip(tsne_with_cluster, track_ids):
-            track = self.recommender._data_provider.get_track(track_id)
+            track = recommender._data_provider.get_track(track_id)
             track_pool_clusters.append({
                 'track_id': track_id,
                 'track_name': f"{track.name_artists[0]} - {track.name}",
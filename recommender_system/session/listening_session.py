@@ -1,8 +1,9 @@
 import numpy as np
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 from collections import Counter
 
+from common.domain.genre_vocabulary import GenreVocabulary
 from common.domain.models import Track, TrackPoolItem, RecommendedTrack
 from recommender_system.algorithm.track_pool_processor import TrackPoolProcessor
 
@@ -11,12 +12,18 @@ class MusicListeningSession:
 
     _tracks_per_user: Dict[str, List[Track]]
     _latest_recommendations: List[RecommendedTrack]
+    _genre_vocabulary: GenreVocabulary = None
     
-    def __init__(self):
+    def __init__(self, genre_vocabulary: Optional[GenreVocabulary] = None):
         self._tracks_per_user = {}
         self._latest_recommendations = []
+        self._genre_vocabulary = genre_vocabulary
 
     
+    def set_genre_vocabulary(self, genre_vocabulary: Optional[GenreVocabulary]):
+        self._genre_vocabulary = genre_vocabulary
+
+
     def clear_session(self):
         self._tracks_per_user = {}
         self._latest_recommendations = []
@@ -51,13 +58,29 @@ class MusicListeningSession:
     
 
     def calculate_genre_frequency(self):
-        top_genres = {}
-        for item in self.get_track_pool().values():
-            for genre in item.track.genres:
-                if genre not in top_genres:
-                    top_genres[genre] = 0
-                top_genres[genre] += 1
-        return dict(Counter(top_genres).most_common(10))
+        if self._genre_vocabulary is None:
+            top_genres = {}
+            for item in self.get_track_pool().values():
+                for genre in item.track.genres:
+                    if genre not in top_genres:
+                        top_genres[genre] = 0
+                    top_genres[genre] += 1
+            return dict(Counter(top_genres).most_common(10))
+
+        genre_ids = [
+            self._genre_vocabulary.encode(item.track.genres, add_missing=True) for item in self.get_track_pool().values()
+        ]
+        genre_ids = np.concatenate(genre_ids) if len(genre_ids) > 0 else np.empty(0, dtype=np.int32)
+        genre_ids = genre_ids[genre_ids >= 0]
+
+        # most frequent first, ties in order of first appearance (as Counter.most_common)
+        unique_ids, first_seen, counts = np.unique(genre_ids, return_index=True, return_counts=True)
+        top = np.lexsort((first_seen, -counts))[:10]
+        return {
+            genre: int(count) for genre, count in zip(
+                self._genre_vocabulary.decode(unique_ids[top].tolist()), counts[top].tolist()
+            )
+        }
     
     
     def get_session_statistics(self):
@@ -1,5 +1,7 @@
 import scrapy
 
+from functools import cached_property
+
 from scrapers.music_data_scrapers.items import MusicDataScrapersItem
 from recommender_system.data_engineering.data_provider import DataProvider
 
@@ -29,10 +31,12 @@ class Concerts(scrapy.Spider):
         }
     }
     
-    data_provider = DataProvider(
-        create_hash_map_for_artists=True,
-        use_as_mapper_only=True
-    )
+    @cached_property
+    def data_provider(self) -> DataProvider:
+        return DataProvider(
+            create_hash_map_for_artists=True,
+            use_as_mapper_only=True
+        )
 
 
     def start_requests(self):
@@ -1,18 +1,21 @@
 from pydantic import BaseSettings
 from functools import lru_cache
+from typing import Dict
 
 
 class Settings(BaseSettings):
 
     scope: str = 'user-library-read'
-    CLIENT_ID: str
-    CLIENT_SECRET: str
+    CLIENT_ID: str = None
+    CLIENT_SECRET: str = None
     spotify_redirect_uri: str = "http://localhost:8025"
     limit_max: int = 50
     backoff_factor: int = 90
     
-    artist_embeddings: str
-    genre_embeddings: str
+    artist_embeddings: str = None
+    # normalized artist embeddings with genre based fallbacks (cli export-artist-embeddings)
+    artist_embedding_table: str = None
+    genre_embeddings: str = None
     genre_embeddings_size: int = 16
     artist_embeddings_size: int = 16
     
@@ -20,6 +23,21 @@ class Settings(BaseSettings):
     artist_local_stored_path: str = None
     genre_vocab_local_stored_path: str = None
     track_representation_vectors_stored_path: str = None
+    # 'float32' halves the vector store and the kNN scoring cost
+    track_representation_vectors_dtype: str = 'float64'
+    # weight by vector block name (see DataProcessor.vector_blocks), over the weights stored with the vectors
+    representation_block_weights: Dict[str, float] = None
+    # 'exact', or 'ivf' to search the IVF index saved with the vectors (cli build-vector-index),
+    # more probed lists is slower and closer to the exact neighbors (see benchmarks/ivf_recall.py)
+    nearest_neighbors_engine: str = 'exact'
+    ivf_n_probe: int = 64
+    catalog_snapshot_path: str = None
+    write_back_log_path: str = None
+    catalog_sqlite_path: str = None
+    reload_watch_interval: float = None
+    # runtime tracks and vectors (not in the catalog) kept in memory, and seconds a vector of None is kept
+    runtime_cache_size: int = 10_000
+    runtime_negative_cache_ttl: float = 600
 
     class Config:
         env_file = ".env"
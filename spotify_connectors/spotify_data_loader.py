@@ -55,10 +55,13 @@ class SpotifyAPIDataLoader:
         artists: Dict[str, Artist] = {}
         albums: Dict[str, Album] = {}
         enhanced_tracks: List[EnhancedTrack] = []
+
+        # one round trip for the whole playlist
+        existing_track_ids = self.db.get_existing_track_ids([track.id for track in tracks])
         
         for track in tracks:
 
-            if self.db.is_track_in_db(track.id):
+            if track.id in existing_track_ids:
                 continue
 
             if track.album.id not in albums:
@@ -70,6 +73,8 @@ class SpotifyAPIDataLoader:
             enhanced_tracks.append(
                 EnhancedTrack(audio_features=audio_features[track.id].dict(), **track.dict())
             )
+            # a track listed twice is upserted once (unordered upserts of one id could race)
+            existing_track_ids.add(track.id)
 
         # store information in mongo
         self.db.upsert_multiple_tracks(enhanced_tracks)
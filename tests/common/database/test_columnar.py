@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from common.database import columnar
+
+
+def _frame():
+    return pd.DataFrame({
+        'id': ['a1', 'b2', 'c3'],
+        'name': ['Glue', np.nan, 'Ατλαντίς'],
+        'popularity': [10, 20, 30],
+        'tempo': [120.5, 99.0, np.nan],
+        'release_date': pd.to_datetime(['2017-09-01', '1999', None], format='mixed'),
+        'id_artists': [['x', ' y'], [], ['z']]
+    })
+
+
+def test_write_read_roundtrip(tmp_path):
+    df = _frame()
+    columnar.write_frame(df, str(tmp_path / 'frame'))
+    result = columnar.read_frame(str(tmp_path / 'frame'))
+
+    assert result['id'].to_list() == ['a1', 'b2', 'c3']
+    assert result['name'][0] == 'Glue' and pd.isna(result['name'][1]) and result['name'][2] == 'Ατλαντίς'
+    assert result['popularity'].dtype == np.int64
+    np.testing.assert_array_equal(result['tempo'].to_numpy(), df['tempo'].to_numpy())
+    assert result['release_date'][0] == pd.Timestamp('2017-09-01')
+    assert pd.isna(result['release_date'][2])
+    assert result['id_artists'].to_list() == [['x', ' y'], [], ['z']]
+
+
+def test_append_and_partial_columns(tmp_path):
+    path = str(tmp_path / 'frame')
+    df = _frame()
+    columnar.write_frame(df.iloc[:2], path)
+    columnar.append_frame(df.iloc[2:], path)
+
+    result = columnar.read_frame(path, columns=['id', 'id_artists'])
+
+    assert list(result.columns) == ['id', 'id_artists']
+    assert result['id'].to_list() == ['a1', 'b2', 'c3']
+    assert result['id_artists'].to_list() == [['x', ' y'], [], ['z']]
+
+
+def test_append_discards_uncommitted_rows(tmp_path):
+    path = str(tmp_path / 'frame')
+    df = _frame()
+    columnar.write_frame(df.iloc[:1], path)
+
+    # a writer that never closed leaves data past the manifest
+    writer = columnar.FrameWriter(path, append=True)
+    writer.write(df.iloc[1:2])
+    for f in writer._files.values():
+        f.close()
+
+    columnar.append_frame(df.iloc[2:], path)
+    result = columnar.read_frame(path)
+
+    assert result['id'].to_list() == ['a1', 'c3']
+    assert result['id_artists'].to_list() == [['x', ' y'], ['z']]
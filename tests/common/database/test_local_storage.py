@@ -0,0 +1,107 @@
+import os
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+from common.database.local_storage import LocalStorage
+from common.domain.models import Artist
+
+
+ARTISTS = {
+    'a1': Artist(id='a1', name='Bicep', popularity=60, genres=['house', ' electronica', '']),
+    'a2': Artist(id='a2', name='Four Tet', popularity=55, genres=['electronica', ' house']),
+    'a3': Artist(id='a3', name='Unknown genre', popularity=3, genres=['']),
+}
+
+
+def _tracks():
+    return pd.DataFrame({
+        'id': ['t1', 't2', 't3', 't4'],
+        'name': ['Glue', 'Baby', 'Lonely', 'Nowhere'],
+        'release_date': pd.to_datetime(['2017-09-01', '2019-01-01', '1999-05-05', '2010-01-01']),
+        'id_artists': [['a1', 'a2'], ['a1', ' a2'], ['missing'], ['a3', 'a1', 'a1']]
+    })
+
+
+def _reference(df_tracks: pd.DataFrame):
+    # per row enrichment as it used to run in load_tracks
+    records = df_tracks.to_dict(orient='records')
+    for track in records:
+        genres = []
+        popularity = []
+        names = []
+        for artist_id in track['id_artists']:
+            if artist_id in ARTISTS:
+                genres += ARTISTS[artist_id].genres
+                popularity += [ARTISTS[artist_id].popularity]
+                names += [ARTISTS[artist_id].name]
+        track['genres'] = [genre.strip() for genre in genres if genre != ""]
+        track['name_artists'] = names
+        track['artist_mean_popularity'] = np.mean(popularity) if len(popularity) > 0 else np.nan
+        track['artist_max_popularity'] = np.max(popularity) if len(popularity) > 0 else np.nan
+        track['track_age'] = (datetime.today() - track['release_date']).total_seconds()//(365*24*3600)
+    return records
+
+
+def test_enrich_tracks_matches_per_row_enrichment():
+    df_tracks = _tracks()
+    enriched = LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=ARTISTS).to_dict(orient='records')
+
+    for result, expected in zip(enriched, _reference(df_tracks)):
+        assert result['genres'] == expected['genres']
+        assert result['name_artists'] == expected['name_artists']
+        np.testing.assert_equal(result['artist_mean_popularity'], expected['artist_mean_popularity'])
+        np.testing.assert_equal(result['artist_max_popularity'], expected['artist_max_popularity'])
+        assert result['track_age'] == expected['track_age']
+
+
+def test_enrich_tracks_does_not_modify_input():
+    df_tracks = _tracks()
+    LocalStorage.enrich_tracks(df_tracks=df_tracks, artists=ARTISTS)
+    assert 'genres' not in df_tracks.columns
+
+
+def test_write_back_log_compaction_appends_the_vectors(tmp_path, monkeypatch):
+    from settings import get_settings
+    from common.database.vector_store import RepresentationVectorStore
+    from common.database.write_back_log import WriteBackLog
+
+    pd.DataFrame({
+        'id': ['t1'], 'name': ['Glue'], 'popularity': [61], 'duration_ms': [269000], 'explicit': [0],
+        'artists': ["['Bicep']"], 'id_artists': ["['a1']"], 'release_date': ['2017-09-01'], 'danceability': [0.6],
+        'energy': [0.7], 'key': [5], 'loudness': [-8.4], 'mode': [1], 'speechiness': [0.03], 'acousticness': [0.02],
+        'instrumentalness': [0.9], 'liveness': [0.1], 'valence': [0.1], 'tempo': [130.0], 'time_signature': [4]
+    }).to_csv(tmp_path / 'tracks.csv', index=False)
+    pd.DataFrame({
+        'id': ['a1'], 'followers': [1000.0], 'genres': ["['house']"], 'name': ['Bicep'], 'popularity': [60]
+    }).to_csv(tmp_path / 'artists.csv', index=False)
+    RepresentationVectorStore.write(str(tmp_path / 'vectors'), ids=['t1'], matrix=np.ones((1, 3)))
+
+    for name, value in {
+        'track_local_stored_path': str(tmp_path / 'tracks.csv'),
+        'artist_local_stored_path': str(tmp_path / 'artists.csv'),
+        'track_representation_vectors_stored_path': str(tmp_path / 'vectors'),
+        'catalog_snapshot_path': str(tmp_path / 'snapshot'),
+        'write_back_log_path': str(tmp_path / 'write_back.log')
+    }.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+
+    log = WriteBackLog(str(tmp_path / 'write_back.log'))
+    log.append_artist(Artist(id='a2', name='Four Tet', popularity=55, genres=['electronica']))
+    log.append_vector('t2', np.array([0.5, 0.5, 0.5]))
+    log.close()
+    matrix_inode = os.stat(tmp_path / 'vectors' / 'matrix.bin').st_ino
+
+    try:
+        assert LocalStorage().compact_write_back_log() == (0, 1, 1)
+    finally:
+        get_settings.cache_clear()
+
+    store = RepresentationVectorStore.open(str(tmp_path / 'vectors'))
+    assert store.keys() == ['t1', 't2']
+    np.testing.assert_array_equal(store['t2'], [0.5, 0.5, 0.5])
+    # appended in place, not written again
+    assert os.stat(tmp_path / 'vectors' / 'matrix.bin').st_ino == matrix_inode
+    assert not os.path.exists(tmp_path / 'write_back.log')
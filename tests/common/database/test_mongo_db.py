@@ -0,0 +1,17 @@
+import pytest
+
+from common.database.mongo_db import MongoDatabase
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def test_existing_track_ids_in_batches():
+    db = MongoDatabase(client=mongomock.MongoClient())
+    db.collection_tracks.insert_many([{'id': f"t{i}", 'name': str(i)} for i in range(25)])
+    db.IN_BATCH_SIZE = 4
+
+    ids = [f"t{i}" for i in range(20, 30)] + ['t3', 't3']
+
+    assert db.get_existing_track_ids(ids) == {'t20', 't21', 't22', 't23', 't24', 't3'}
+    assert db.is_track_in_db('t0') and not db.is_track_in_db('t99')
+    assert db.collection_tracks.index_information()['id_1']['unique']
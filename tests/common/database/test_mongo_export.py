@@ -0,0 +1,62 @@
+import os
+import pandas as pd
+import pytest
+
+from datetime import datetime
+
+from common.database import columnar
+from common.database.catalog_snapshot import CatalogSnapshot
+from common.database.local_storage import LocalStorage
+from common.database.mongo_db import MongoDatabase
+from common.database.mongo_export import MongoSnapshotExporter
+
+mongomock = pytest.importorskip('mongomock')
+
+
+FEATURES = dict(
+    danceability=0.5, energy=0.4, key=5, loudness=-7.5, mode=1, speechiness=0.05, acousticness=0.1,
+    instrumentalness=0.0, liveness=0.2, valence=0.6, tempo=121.0, duration_ms=200000, time_signature=4
+)
+
+
+def _track(i: int):
+    return {
+        'id': f"t{i}", 'name': f"Track {i}", 'popularity': float(i), 'duration_ms': 200000 + i, 'href': '',
+        'artists': [{'id': f"a{i % 3}", 'name': f"Artist {i % 3}"}, {'id': 'a9', 'name': 'Artist 9'}],
+        'album': {'id': f"al{i}", 'release_date': datetime(2000 + i, 1, 2)},
+        'audio_features': FEATURES
+    }
+
+
+def test_export_matches_csv_snapshot(tmp_path):
+    db = MongoDatabase(client=mongomock.MongoClient())
+    db.collection_tracks.insert_many([_track(i) for i in range(7)])
+    db.collection_artists.insert_many([
+        {'id': 'a0', 'name': 'Artist 0', 'genres': ['house', 'techno'], 'popularity': 40.0},
+        {'id': 'a1', 'name': 'Artist 1', 'genres': None, 'popularity': None}
+    ])
+
+    snapshot = CatalogSnapshot(str(tmp_path / 'snapshot'))
+    assert MongoSnapshotExporter(db, snapshot, batch_size=3).export() == (7, 2)
+
+    df_tracks = snapshot.read_tracks()
+    assert df_tracks['id'].to_list() == [f"t{i}" for i in range(7)]
+    assert df_tracks['id_artists'][4] == ['a1', 'a9']
+    assert df_tracks['artists'][4] == "['Artist 1', 'Artist 9']"
+    assert df_tracks['release_date'][2] == pd.Timestamp('2002-01-02')
+    assert df_tracks['key'].to_list() == [5] * 7
+
+    df_artists = snapshot.read_artists()
+    assert df_artists['genres'].to_list() == [['house', 'techno'], []]
+    assert df_artists['popularity'].to_list() == [40, 0]
+
+    # same schema as a snapshot built from the CSV files
+    csv_path = tmp_path / 'tracks.csv'
+    pd.DataFrame([{
+        'id': 't0', 'name': 'Track 0', 'popularity': 0, 'duration_ms': 200000, 'explicit': 0,
+        'artists': "['Artist 0']", 'id_artists': "['a0']", 'release_date': '2000-01-02',
+        **{feature: value for feature, value in FEATURES.items() if feature != 'duration_ms'}
+    }]).to_csv(csv_path, index=False)
+    columnar.write_frame(LocalStorage.parse_tracks_csv(str(csv_path)), str(tmp_path / 'csv'))
+    assert columnar.read_manifest(str(tmp_path / 'csv'))['columns'] == \
+        columnar.read_manifest(os.path.join(snapshot.path, CatalogSnapshot.TRACKS))['columns']
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from common.database.sqlite_db import SqliteCatalog, SqliteTracks
+from common.database.track_store import TrackStore
+from common.domain.models import Artist
+
+
+ARTISTS = {
+    'a1': Artist(id='a1', name='Bicep', popularity=60, genres=['house', 'electronica']),
+    'a2': Artist(id='a2', name='Four Tet', popularity=55, genres=['electronica']),
+}
+
+
+def _enriched_tracks():
+    return pd.DataFrame({
+        'id': ['t1', 't2', 't3'],
+        'name': ['Glue', None, 'Baby'],
+        'release_date': pd.to_datetime(['2017-09-01', None, '2019-01-01']),
+        'track_age': [np.nan] * 3,
+        'key': [5, np.nan, 0],
+        'popularity': [61, 0, 50],
+        'danceability': [0.618, 0.5, 0.7],
+        'tempo': [129.981, 90.0, 120.0],
+        'valence': [0.107, 0.2, 0.3],
+        'energy': [0.774, 0.1, 0.8],
+        'loudness': [-8.471, -20.0, -5.0],
+        'speechiness': [0.0383, 0.1, 0.05],
+        'acousticness': [0.0193, 0.9, 0.01],
+        'instrumentalness': [0.894, 0.0, 0.5],
+        'liveness': [0.11, 0.3, 0.2],
+        'artist_mean_popularity': [57.5, np.nan, 55.0],
+        'artist_max_popularity': [60.0, np.nan, 55.0],
+        'genres': [['house', 'electronica', 'electronica'], [], ['electronica']],
+        'id_artists': [['a1', 'a2'], ['missing'], ['a2']],
+        'name_artists': [['Bicep', 'Four Tet'], [], ['Four Tet']]
+    })
+
+
+def test_lookups_match_track_store(tmp_path):
+    path = str(tmp_path / 'catalog.sqlite')
+    df_tracks = _enriched_tracks()
+    df_tracks['track_age'] = (pd.Timestamp.today() - df_tracks['release_date']).dt.total_seconds()//(365*24*3600)
+    SqliteCatalog.write(path, df_tracks, ARTISTS, metadata={'catalog_fingerprint': 'abc'})
+
+    catalog = SqliteCatalog(path)
+    catalog.BATCH_SIZE = 2
+    store = TrackStore.from_frame(df_tracks)
+    tracks = SqliteTracks(catalog)
+
+    assert list(tracks) == ['t1', 't2', 't3'] and 'missing' not in tracks
+    for track_id, track in catalog.get_tracks(['t3', 'missing', 't1', 't2']).items():
+        assert track.json() == store[track_id].json()
+    assert tracks['t2'].json() == store['t2'].json()
+    np.testing.assert_array_equal(tracks.column('track_age'), store.column('track_age'))
+    np.testing.assert_array_equal(tracks.column('key'), store.column('key'))
+    assert catalog.genre_vocabulary().genres == ['house', 'electronica']
+    assert catalog.metadata('catalog_fingerprint') == 'abc'
+
+
+def test_artist_lookups(tmp_path):
+    path = str(tmp_path / 'catalog.sqlite')
+    SqliteCatalog.write(path, _enriched_tracks(), ARTISTS)
+    catalog = SqliteCatalog(path)
+
+    assert catalog.get_artist('a2') == ARTISTS['a2']
+    assert catalog.get_artist('missing') is None
+    assert list(catalog.get_artists(['a1', 'a2', 'missing']).keys()) == ['a1', 'a2']
+    assert [artist.id for artist in catalog.find_artists_by_name(' four TET')] == ['a2']
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from common.database.track_store import TrackStore
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Track
+
+
+def _enriched_tracks():
+    return pd.DataFrame({
+        'id': ['t1', 't2'],
+        'name': ['Glue', np.nan],
+        'release_date': pd.to_datetime(['2017-09-01', None]),
+        'track_age': [6.0, np.nan],
+        # -1: no key detected
+        'key': [5, -1],
+        'popularity': [61, 0],
+        'danceability': [0.618, 0.5],
+        'tempo': [129.981, 90.0],
+        'valence': [0.107, 0.2],
+        'energy': [0.774, 0.1],
+        'loudness': [-8.471, -20.0],
+        'speechiness': [0.0383, 0.1],
+        'acousticness': [0.0193, 0.9],
+        'instrumentalness': [0.894, 0.0],
+        'liveness': [0.11, 0.3],
+        'artist_mean_popularity': [57.5, np.nan],
+        'artist_max_popularity': [60.0, np.nan],
+        'genres': [['house', 'electronica', 'house'], []],
+        'id_artists': [['a1', 'a2'], ['missing']],
+        'name_artists': [['Bicep', 'Four Tet'], []]
+    })
+
+
+def test_materialized_tracks_match_domain_models():
+    df = _enriched_tracks()
+    store = TrackStore.from_frame(df)
+
+    for record in df.to_dict(orient='records'):
+        expected = Track(**record).dict()
+        result = store[record['id']].dict()
+        for field, value in expected.items():
+            if isinstance(value, float) and np.isnan(value):
+                assert np.isnan(result[field]), field
+            elif field == 'release_date' and pd.isna(value):
+                assert pd.isna(result[field])
+            else:
+                assert result[field] == value, field
+
+
+def test_mapping_interface():
+    store = TrackStore.from_frame(_enriched_tracks())
+
+    assert len(store) == 2
+    assert list(store) == ['t1', 't2']
+    assert 't2' in store and 'unknown' not in store
+    assert store.get('unknown') is None
+    assert [track.id for track in store.values()] == ['t1', 't2']
+    np.testing.assert_array_equal(store.column('popularity'), [61.0, 0.0])
+    np.testing.assert_array_equal(store.column('key'), [5.0, -1.0])
+    assert store.feature_matrix(['tempo', 'key']).shape == (2, 2)
+
+
+def test_genres_share_the_vocabulary():
+    vocabulary = GenreVocabulary(['electronica'])
+    store = TrackStore.from_frame(_enriched_tracks(), genre_vocabulary=vocabulary)
+
+    assert vocabulary.genres == ['electronica', 'house']
+    assert store.genre_ids(0).tolist() == [1, 0, 1]
+    np.testing.assert_array_equal(store.genre_matrix().toarray(), [[1, 2], [0, 0]])
+    assert store['t1'].genres == ['house', 'electronica', 'house']
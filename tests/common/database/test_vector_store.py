@@ -0,0 +1,65 @@
+import numpy as np
+
+from common.database.vector_store import RepresentationVectorStore
+
+
+def test_write_and_memory_map(tmp_path):
+    path = str(tmp_path / 'vectors')
+    matrix = np.array([[0.1, 0.2, np.nan], [1.0, 2.0, 3.0]])
+    RepresentationVectorStore.write(path=path, ids=['t1', 't2'], matrix=matrix)
+
+    store = RepresentationVectorStore.open(path)
+
+    assert isinstance(store.matrix, np.memmap)
+    assert len(store) == 2 and store.dimension == 3
+    assert 't2' in store and 'unknown' not in store
+    np.testing.assert_array_equal(store['t1'], [0.1, 0.2, -1])
+    assert store.get('unknown') is None
+    assert store.row_of('t2') == 1 and store.id_of(1) == 't2'
+    assert store.keys() == ['t1', 't2']
+
+
+def test_legacy_csv(tmp_path):
+    path = str(tmp_path / 'vectors.csv')
+    with open(path, 'w') as f:
+        f.write("id,w1,w2\nt1,0.5,0.25\nt2,1.0,\n")
+
+    store = RepresentationVectorStore.from_csv(path)
+
+    np.testing.assert_array_equal(store.matrix, [[0.5, 0.25], [1.0, -1]])
+    np.testing.assert_array_equal(store['t2'], [1.0, -1])
+
+
+def test_append_in_place(tmp_path):
+    path = str(tmp_path / 'vectors')
+    RepresentationVectorStore.write(path=path, ids=['t1', 't2'], matrix=np.array([[0.1, 0.2], [1.0, 2.0]]))
+    before = RepresentationVectorStore.open(path)
+
+    # leftovers of an interrupted append are dropped
+    with open(str(tmp_path / 'vectors' / RepresentationVectorStore.MATRIX_FILE), 'ab') as f:
+        f.write(b'garbage')
+    RepresentationVectorStore.append(path=path, ids=['t3', 'long-id-4'], matrix=np.array([[3.0, np.nan], [4.0, 4.5]]))
+
+    store = RepresentationVectorStore.open(path)
+    assert store.keys() == ['t1', 't2', 't3', 'long-id-4']
+    np.testing.assert_array_equal(store.matrix, [[0.1, 0.2], [1.0, 2.0], [3.0, -1], [4.0, 4.5]])
+    # readers opened before the append still see their rows
+    assert len(before) == 2 and before.keys() == ['t1', 't2']
+
+
+def test_patch_and_remove_rows(tmp_path):
+    path = str(tmp_path / 'vectors')
+    RepresentationVectorStore.write(path=path, ids=['t1', 't2', 'long-id-3'], matrix=np.array([[0.1, 0.2], [1.0, 2.0], [3.0, 4.0]]))
+    reader = RepresentationVectorStore.open(path)
+
+    generation = RepresentationVectorStore.read_meta(path).get('generation', 0)
+    RepresentationVectorStore.patch(path, rows=np.array([1]), matrix=np.array([[5.0, np.nan]]))
+    # readers opened before the patch keep the previous vectors, meta.json moves to a new generation
+    np.testing.assert_array_equal(reader['t2'], [1.0, 2.0])
+    np.testing.assert_array_equal(RepresentationVectorStore.open(path)['t2'], [5.0, -1])
+    assert RepresentationVectorStore.read_meta(path)['generation'] == generation + 1
+
+    RepresentationVectorStore.remove_rows(path, rows=[0])
+    store = RepresentationVectorStore.open(path)
+    assert store.keys() == ['t2', 'long-id-3']
+    np.testing.assert_array_equal(store.matrix, [[5.0, -1], [3.0, 4.0]])
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+
+from datetime import datetime
+
+from common.database.write_back_log import WriteBackLog
+from common.domain.models import Track, Artist
+
+
+def _track(track_id: str) -> Track:
+    return Track(
+        id=track_id, name='Glue', release_date=datetime(2017, 9, 1), track_age=6, key=5, popularity=61,
+        danceability=0.618, tempo=129.981, valence=0.107, energy=0.774, loudness=-8.471, speechiness=0.0383,
+        acousticness=0.0193, instrumentalness=0.894, liveness=0.11, artist_mean_popularity=60,
+        artist_max_popularity=np.nan, genres=['house'], id_artists=['a1'], name_artists=['Bicep']
+    )
+
+
+def test_records_round_trip(tmp_path):
+    log = WriteBackLog(str(tmp_path / 'write_back.log'))
+    log.append_track(_track('t1'))
+    log.append_artist(Artist(id='a1', name='Bicep', popularity=60, genres=['house']))
+    log.append_vector('t1', np.array([0.5, np.nan, -1.0]))
+    log.append_vector('t2', None)
+    log.close()
+
+    tracks, artists, vectors = WriteBackLog(log.path).load()
+
+    assert tracks['t1'].dict().keys() == _track('t1').dict().keys()
+    assert tracks['t1'].release_date == datetime(2017, 9, 1)
+    assert np.isnan(tracks['t1'].artist_max_popularity)
+    assert artists['a1'].genres == ['house']
+    np.testing.assert_array_equal(vectors['t1'], [0.5, np.nan, -1.0])
+    assert vectors['t2'] is None
+
+
+def test_torn_record_is_dropped_and_overwritten(tmp_path):
+    log = WriteBackLog(str(tmp_path / 'write_back.log'))
+    log.append_track(_track('t1'))
+    log.append_track(_track('t2'))
+    log.close()
+
+    # crash in the middle of the last record
+    with open(log.path, 'r+b') as f:
+        f.truncate(os.path.getsize(log.path) - 10)
+    assert list(WriteBackLog(log.path).load()[0].keys()) == ['t1']
+
+    log = WriteBackLog(log.path)
+    log.append_track(_track('t3'))
+    log.close()
+    assert list(WriteBackLog(log.path).load()[0].keys()) == ['t1', 't3']
+
+
+def test_logged_objects_are_not_appended_again(tmp_path):
+    log = WriteBackLog(str(tmp_path / 'write_back.log'))
+    assert log.append_track(_track('t1'))
+    assert log.append_vector('t2', None)
+    log.close()
+
+    # a new writer knows the ids of the log
+    log = WriteBackLog(log.path)
+    assert not log.append_track(_track('t1'))
+    assert not log.append_vector('t2', None)
+    # a vector replaces a logged track without vector, once
+    assert log.append_vector('t2', np.array([0.5]))
+    assert not log.append_vector('t2', np.array([0.5]))
+    log.close()
+    assert len(list(WriteBackLog(log.path)._scan())) == 3
+
+    # the index of the logged ids is rebuilt from the log
+    os.remove(log.path + WriteBackLog.IDS_SUFFIX)
+    log = WriteBackLog(log.path)
+    assert not log.append_vector('t2', np.array([0.5]))
+    assert log.append_track(_track('t3'))
+    log.close()
+    assert len(list(WriteBackLog(log.path)._scan())) == 4
+
+
+def test_writers_append_to_the_same_log(tmp_path):
+    first, second = WriteBackLog(str(tmp_path / 'write_back.log')), WriteBackLog(str(tmp_path / 'write_back.log'))
+    first.append_track(_track('t1'))
+    second.append_track(_track('t2'))
+    first.append_track(_track('t3'))
+    # logged by the other writer since
+    assert not first.append_track(_track('t2'))
+    first.close()
+    second.close()
+
+    assert list(WriteBackLog(first.path).load()[0].keys()) == ['t1', 't2', 't3']
+
+
+def test_compaction_with_a_writer_open(tmp_path):
+    writer = WriteBackLog(str(tmp_path / 'write_back.log'))
+    writer.append_track(_track('t1'))
+
+    # compaction by another process, while the writer holds the log open
+    detached = WriteBackLog(writer.path).detach()
+    assert not os.path.exists(writer.path)
+    # records moved aside are still read until folded
+    assert list(WriteBackLog(writer.path).load()[0].keys()) == ['t1']
+
+    writer.append_track(_track('t2'))
+    assert list(detached.load()[0].keys()) == ['t1']
+    detached.clear()
+
+    assert not os.path.exists(detached.path)
+    assert list(WriteBackLog(writer.path).load()[0].keys()) == ['t2']
+    writer.append_track(_track('t3'))
+    writer.close()
+    assert list(WriteBackLog(writer.path).load()[0].keys()) == ['t2', 't3']
+    assert WriteBackLog(str(tmp_path / 'empty.log')).detach() is None
+
+
+def test_weighted_vectors_of_the_previous_format_are_dropped(tmp_path):
+    # a log of the previous format, with a weighted vector, held open by a writer
+    previous_writer = WriteBackLog(str(tmp_path / 'write_back.log'))
+    previous_writer.append_track(_track('t1'))
+    previous_writer.append_vector('t1', np.array([2.0, 2.0]))
+    with open(previous_writer.path, 'r+b') as f:
+        f.write(b'MOSWBL01')
+
+    tracks, _, vectors = WriteBackLog(previous_writer.path).load()
+    assert list(tracks) == ['t1'] and vectors == {}
+
+    # the vector is computed again, in a log of the current format
+    log = WriteBackLog(previous_writer.path)
+    assert log.append_vector('t1', np.array([1.0, 1.0]))
+    # the writer of the previous file reopens the log
+    assert previous_writer.append_track(_track('t2'))
+    log.close()
+    previous_writer.close()
+
+    with open(log.path, 'rb') as f:
+        assert f.read(len(WriteBackLog.MAGIC)) == WriteBackLog.MAGIC
+    tracks, _, vectors = WriteBackLog(log.path).load()
+    assert list(tracks) == ['t1', 't2']
+    np.testing.assert_array_equal(vectors['t1'], [1.0, 1.0])
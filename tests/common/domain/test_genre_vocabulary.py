@@ -0,0 +1,27 @@
+import numpy as np
+
+from common.domain.genre_vocabulary import GenreVocabulary
+
+
+def test_genres_are_normalized_once():
+    vocabulary = GenreVocabulary([' house', "'house'", 'electronica', ' ', ''])
+
+    assert vocabulary.genres == ['house', 'electronica']
+    assert vocabulary.id_of(' electronica ') == 1
+    assert vocabulary.encode(['house', 'techno', '']).tolist() == [0, -1, -1]
+    assert vocabulary.encode(['techno'], add_missing=True).tolist() == [2]
+    assert vocabulary.decode([2, 0]) == ['techno', 'house']
+
+
+def test_genre_lists_as_sparse_matrix_keep_order_and_duplicates():
+    vocabulary = GenreVocabulary()
+    matrix = vocabulary.encode_lists([['techno', ' house', 'techno'], [], ['', 'ambient']], add_missing=True)
+
+    assert matrix.shape == (3, 3)
+    assert matrix.indices.tolist() == [0, 1, 0, 2]
+    np.testing.assert_array_equal(matrix.toarray(), [[2, 1, 0], [0, 0, 0], [0, 0, 1]])
+
+
+def test_ids_containing_is_case_insensitive():
+    vocabulary = GenreVocabulary(['Deep House', 'house', 'techno'])
+    assert vocabulary.ids_containing('HOUSE').tolist() == [0, 1]
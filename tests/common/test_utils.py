@@ -16,4 +16,14 @@ def test_playlist_parser():
     pid = utils.get_spotify_object_id(
         "https://open.spotify.com/playlist/37i9dQZF1DX2TRYkJECvfC"
     )
-    assert pid[2] == "37i9dQZF1DX2TRYkJECvfC"
\ No newline at end of file
+    assert pid[2] == "37i9dQZF1DX2TRYkJECvfC"
+
+def test_files_fingerprint(tmp_path):
+    path = tmp_path / "tracks.csv"
+    path.write_text("id\n1\n")
+    fingerprint = utils.files_fingerprint([str(path)])
+
+    assert utils.files_fingerprint([str(path)]) == fingerprint
+
+    path.write_text("id\n1\n2\n")
+    assert utils.files_fingerprint([str(path)]) != fingerprint
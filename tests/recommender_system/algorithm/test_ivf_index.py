@@ -0,0 +1,72 @@
+import numpy as np
+
+from common.database.vector_store import RepresentationVectorStore
+from common.domain.models import VectorBlock
+from recommender_system.algorithm.ivf_index import IVFCosineIndex
+from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+
+
+BLOCKS = [
+    VectorBlock(name='audio_features', start=0, stop=4, weight=2),
+    VectorBlock(name='genres', start=4, stop=8, weight=1)
+]
+
+
+def _store(path: str, rows: int = 2000) -> RepresentationVectorStore:
+    rng = np.random.default_rng(0)
+    centers = rng.random((20, 8))
+    matrix = centers[rng.integers(0, len(centers), rows)] + 0.05 * rng.random((rows, 8))
+    RepresentationVectorStore.write(path, ids=[f"t{row}" for row in range(rows)], matrix=matrix, blocks=BLOCKS)
+    return RepresentationVectorStore.open(path)
+
+
+def test_all_lists_probed_is_exact(tmp_path):
+    store = _store(str(tmp_path))
+    index = BlockWeightedCosineIndex(store.matrix, blocks=store.blocks)
+    ivf_index = IVFCosineIndex.build(index, n_lists=30, n_probe=30)
+    queries = np.asarray(store.matrix[[3, 500, 1500]]) + 0.01
+
+    for weights in [None, {'genres': 3}]:
+        distances, neighbors = ivf_index.kneighbors(queries, n_neighbors=50, weights=weights)
+        expected_distances, expected_neighbors = index.kneighbors(queries, n_neighbors=50, weights=weights)
+        np.testing.assert_array_equal(neighbors, expected_neighbors)
+        np.testing.assert_allclose(distances, expected_distances, atol=1e-12)
+
+
+def test_probed_lists_have_enough_candidates(tmp_path):
+    store = _store(str(tmp_path))
+    ivf_index = IVFCosineIndex.build(BlockWeightedCosineIndex(store.matrix, blocks=store.blocks), n_lists=40, n_probe=1)
+
+    candidates = ivf_index.candidates(np.asarray(store.matrix[:5]), n_neighbors=300)
+    assert all(len(rows) >= 300 and np.all(np.diff(rows) > 0) for rows in candidates)
+    assert ivf_index.kneighbors(np.asarray(store.matrix[:5]), n_neighbors=300)[1].shape == (5, 300)
+
+
+def test_saved_next_to_the_vectors(tmp_path):
+    path = str(tmp_path)
+    store = _store(path)
+    index = BlockWeightedCosineIndex(store.matrix, blocks=store.blocks)
+    assert IVFCosineIndex.load(path, index) is None
+
+    ivf_index = IVFCosineIndex.build(index, n_lists=25, n_probe=4)
+    ivf_index.save(path)
+    loaded = IVFCosineIndex.load(path, index, n_probe=4)
+
+    np.testing.assert_array_equal(loaded.centroids, ivf_index.centroids)
+    np.testing.assert_array_equal(loaded.rows, ivf_index.rows)
+    queries = np.asarray(store.matrix[:10])
+    np.testing.assert_array_equal(loaded.kneighbors(queries, n_neighbors=20)[1], ivf_index.kneighbors(queries, n_neighbors=20)[1])
+
+    # the lists are not used with other default block weights, they were clustered with the stored ones
+    meta = RepresentationVectorStore.read_meta(path)
+    meta['blocks'][1]['weight'] = 3
+    RepresentationVectorStore.write_meta(path, meta)
+    assert IVFCosineIndex.load(path, index) is None
+    meta['blocks'][1]['weight'] = 1
+    RepresentationVectorStore.write_meta(path, meta)
+    assert IVFCosineIndex.load(path, index) is not None
+
+    # the lists are not used for other vectors
+    RepresentationVectorStore.append(path, ids=['new'], matrix=np.ones((1, 8)))
+    store = RepresentationVectorStore.open(path)
+    assert IVFCosineIndex.load(path, BlockWeightedCosineIndex(store.matrix, blocks=store.blocks)) is None
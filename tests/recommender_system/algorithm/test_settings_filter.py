@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from common.data_transfer.models import SessionSettings
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Track, RecommendedTrack
+from recommender_system.algorithm.settings_filter import SettingsFilter
+
+
+GENRES = [['deep house', 'techno'], ['indie rock'], ['ambient', 'deep house'], [], ['k-pop']]
+
+
+def _recommendations():
+    return [
+        RecommendedTrack(
+            track=Track(
+                id=str(i), name=str(i), release_date=datetime(2020, 1, 1), track_age=3, key=1, popularity=1,
+                danceability=0.5, tempo=120, valence=0.5, energy=0.5, loudness=-5, speechiness=0.1,
+                acousticness=0.1, instrumentalness=0.1, liveness=0.1, artist_mean_popularity=1,
+                artist_max_popularity=1, genres=genres, id_artists=[], name_artists=[]
+            ),
+            score=0.1,
+            category=0
+        ) for i, genres in enumerate(GENRES)
+    ]
+
+
+def test_genre_ids_filter_matches_text_filter():
+    # 'k-pop' is not in the vocabulary, such tracks are matched as text
+    vocabulary = GenreVocabulary(['deep house', 'techno', 'indie rock', 'ambient'])
+
+    for include, exclude in [(['house'], []), (['HOUSE', 'tech'], []), ([], ['rock', 'ambient']), (['pop'], ['house'])]:
+        settings = SessionSettings(include_genres=include, exclude_genres=exclude)
+        expected = [r.track.id for r in SettingsFilter(settings).filter(_recommendations())]
+        result = [r.track.id for r in SettingsFilter(settings, genre_vocabulary=vocabulary).filter(_recommendations())]
+        assert result == expected
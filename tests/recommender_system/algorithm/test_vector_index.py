@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from sklearn.neighbors import NearestNeighbors
+
+from common.domain.models import VectorBlock
+from recommender_system.algorithm.vector_index import BlockWeightedCosineIndex
+
+
+BLOCKS = [
+    VectorBlock(name='audio_features', start=0, stop=3, weight=2),
+    VectorBlock(name='track_age', start=3, stop=4, weight=5),
+    VectorBlock(name='genres', start=4, stop=8, weight=1)
+]
+
+
+@pytest.mark.parametrize('weights', [None, {'track_age': 0.5}, {'genres': 0, 'audio_features': 3}])
+def test_same_neighbors_as_sklearn_on_weighted_vectors(weights):
+    rng = np.random.default_rng(0)
+    matrix = rng.random((500, 8))
+    # a zero vector is at distance 1 of everything
+    matrix[7] = 0
+    queries = np.vstack([matrix[3], rng.random((4, 8))])
+
+    index = BlockWeightedCosineIndex(matrix, blocks=BLOCKS, chunk_size=64)
+    distances, neighbors = index.kneighbors(queries, n_neighbors=20, weights=weights)
+
+    column_weights = index.column_weights(weights)
+    model = NearestNeighbors(n_neighbors=20, metric='cosine').fit(matrix * column_weights)
+    expected_distances, expected_neighbors = model.kneighbors(queries * column_weights)
+
+    np.testing.assert_array_equal(neighbors, expected_neighbors)
+    np.testing.assert_allclose(distances, expected_distances, atol=1e-12)
+    assert neighbors[0, 0] == 3 and distances[0, 0] == 0
+
+
+def test_block_weights():
+    index = BlockWeightedCosineIndex(np.ones((2, 8)), blocks=BLOCKS)
+
+    np.testing.assert_array_equal(index.column_weights(), [2, 2, 2, 5, 1, 1, 1, 1])
+    np.testing.assert_array_equal(index.block_weights({'genres': 0.5}), [2, 5, 0.5])
+    with pytest.raises(ValueError):
+        index.block_weights({'artist': 1})
+    with pytest.raises(ValueError):
+        index.block_weights({'genres': -1})
+
+    # stores without a layout are compared as they are
+    np.testing.assert_array_equal(BlockWeightedCosineIndex(np.ones((2, 8))).column_weights(), np.ones(8))
+
+
+def test_batched_queries_match_single_queries():
+    rng = np.random.default_rng(1)
+    index = BlockWeightedCosineIndex(rng.random((300, 8)), blocks=BLOCKS)
+    queries = rng.random((6, 8))
+
+    distances, neighbors = index.kneighbors(queries, n_neighbors=15, weights={'genres': 2})
+
+    for query, query_distances, query_neighbors in zip(queries, distances, neighbors):
+        single_distances, single_neighbors = index.kneighbors(query.reshape(1, -1), n_neighbors=15, weights={'genres': 2})
+        np.testing.assert_array_equal(query_neighbors, single_neighbors[0])
+        # matrix-matrix and matrix-vector products may round differently
+        np.testing.assert_allclose(query_distances, single_distances[0], atol=1e-12)
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1000])
+def test_chunked_scan_matches_single_chunk(chunk_size):
+    rng = np.random.default_rng(2)
+    matrix = rng.random((300, 8))
+    queries = rng.random((3, 8))
+
+    distances, neighbors = BlockWeightedCosineIndex(matrix, blocks=BLOCKS, chunk_size=chunk_size).kneighbors(queries, n_neighbors=15)
+    expected_distances, expected_neighbors = BlockWeightedCosineIndex(matrix, blocks=BLOCKS, chunk_size=300).kneighbors(queries, n_neighbors=15)
+
+    np.testing.assert_array_equal(neighbors, expected_neighbors)
+    np.testing.assert_allclose(distances, expected_distances, atol=1e-12)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from gensim.models import KeyedVectors
+
+from settings import get_settings
+
+
+GENRES = ['house', 'techno', 'indie rock']
+
+
+class _Clock:
+    """Time of a RuntimeCache, moved by the test"""
+
+    def __init__(self):
+        self.now = 0.0
+
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> _Clock:
+    return _Clock()
+
+
+@pytest.fixture
+def environment(request, tmp_path, monkeypatch):
+    """Settings of a catalog with embeddings of the GENRES and of the artists a0 to a<n - 1>,
+    n is 4 unless parametrized (indirect) with another number"""
+    n_artists = getattr(request, 'param', 4)
+    rng = np.random.default_rng(0)
+    genre_path = str(tmp_path / 'genres.npy')
+    np.save(genre_path, {genre: rng.random(16) for genre in GENRES}, allow_pickle=True)
+    artist_embeddings = KeyedVectors(vector_size=16)
+    artist_embeddings.add_vectors([f"a{i}" for i in range(n_artists)], rng.random((n_artists, 16)))
+    artist_path = str(tmp_path / 'artists.kv')
+    artist_embeddings.save(artist_path)
+
+    for name, value in {
+        'artist_embeddings': artist_path,
+        'genre_embeddings': genre_path,
+        'genre_vocab_local_stored_path': str(tmp_path / 'genre_vocab.csv'),
+        'track_representation_vectors_stored_path': str(tmp_path / 'vectors')
+    }.items():
+        monkeypatch.setenv(name, value)
+    get_settings.cache_clear()
+    yield tmp_path
+    get_settings.cache_clear()
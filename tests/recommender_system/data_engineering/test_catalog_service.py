@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from common.domain.models import Artist
+from recommender_system.data_engineering.catalog_service import CatalogService, CatalogCapability
+
+
+ARTISTS = {
+    'a1': Artist(id='a1', name='Bicep', popularity=60, genres=['house']),
+    'a2': Artist(id='a2', name='Four Tet', popularity=55, genres=['electronica']),
+    'a3': Artist(id='a3', name='bicep ', popularity=1, genres=[]),
+}
+
+
+def test_one_instance_per_process():
+    CatalogService.set_instance(None)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            services = list(pool.map(lambda _: CatalogService.get(), range(32)))
+        assert all(service is services[0] for service in services)
+    finally:
+        CatalogService.set_instance(None)
+
+
+def test_artist_name_index():
+    index = CatalogService._create_artist_name_index(ARTISTS)
+
+    assert sorted(index.keys()) == ['b', 'f']
+    # same cleaned name: the first catalog artist wins
+    assert [artist.id for artist in index['b']] == ['a1', 'a3']
+    assert CatalogCapability.ARTIST_NAME_INDEX in CatalogCapability.MAPPER
+    assert CatalogCapability.TRACKS not in CatalogCapability.MAPPER
@@ -0,0 +1,203 @@
+import numpy as np
+
+from settings import get_settings
+from common.database.track_store import TrackStore
+from common.database.vector_store import RepresentationVectorStore
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import Artist, Track
+
+
+GENRES = ['house', 'techno', 'indie rock']
+
+
+def _tracks():
+    rng = np.random.default_rng(1)
+    tracks = []
+    for i in range(40):
+        # exact in the float32 columns of the TrackStore
+        features = {feature: rng.integers(0, 1000) / 8 for feature in Track.__scaled_features__}
+        tracks.append(Track(
+            id=f"t{i}",
+            name=f"Track {i}",
+            key=i % 12,
+            # unknown genres and artists, or none at all: no vector
+            genres=[GENRES[i % 3], " 'techno'"] if i % 7 else (['polka'] if i % 2 else []),
+            id_artists=[f" a{i % 5}", 'a0'] if i % 11 else [],
+            name_artists=[],
+            **features
+        ))
+    return tracks
+
+
+def test_batch_same_as_per_track(environment):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    tracks = _tracks()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+
+    expected = {}
+    for track in tracks:
+        vector = data_processor.create_track_representation_vector(track)
+        if vector is not None:
+            expected[track.id] = vector
+    assert 0 < len(expected) < len(tracks)
+
+    for catalog in [tracks, TrackStore.from_tracks(tracks)]:
+        representation_vectors = data_processor.construct_track_representation_vectors(catalog)
+
+        assert list(representation_vectors.keys()) == list(expected.keys())
+        store = RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path)
+        assert store.keys() == list(expected.keys())
+        np.testing.assert_array_equal(store.matrix, np.array(list(expected.values())))
+        assert store.blocks == data_processor.vector_blocks()
+        assert store.blocks[-1].stop == store.dimension
+
+        vocabulary = GenreVocabulary.from_csv(get_settings().genre_vocab_local_stored_path)
+        assert vocabulary.genres == ['techno', 'indie rock', 'house', 'polka']
+
+
+def test_parallel_build_byte_identical(environment):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    tracks = TrackStore.from_tracks(_tracks())
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    path = get_settings().track_representation_vectors_stored_path
+
+    def stored_files():
+        return {
+            name: open(f"{path}/{name}", 'rb').read()
+                for name in ['meta.json', 'matrix.bin', 'ids.data', 'ids.offsets']
+        }
+
+    data_processor.construct_track_representation_vectors(tracks)
+    serial = stored_files()
+
+    store = data_processor.construct_track_representation_vectors(tracks, workers=2, chunk_size=7)
+    assert stored_files() == serial
+    assert len(store) > 0
+
+
+def test_incremental_update_same_as_full_build(environment):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    tracks = _tracks()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+
+    # full build, then nothing to update
+    built = data_processor.construct_track_representation_vectors(tracks)
+    assert data_processor.update_track_representation_vectors(tracks) == (0, 0, 0)
+
+    # one track changes genres, one can no longer be processed, one leaves the catalog, two are added
+    changed = tracks[1].copy(update={'genres': ['house']})
+    unprocessable = tracks[2].copy(update={'id_artists': ['unknown']})
+    catalog = [changed, unprocessable] + tracks[4:] + [
+        track.copy(update={'id': f"new{track.id}"}) for track in tracks[5:7]
+    ]
+    removed = {unprocessable.id, tracks[3].id} & set(built.keys())
+
+    updated, added, removed_count = data_processor.update_track_representation_vectors(
+        TrackStore.from_tracks(catalog), chunk_size=3
+    )
+    assert (updated, added, removed_count) == (1, 2, len(removed))
+
+    _assert_store_matches(data_processor, catalog)
+
+    # the catalog only grows, stored rows are used as is
+    catalog = catalog + [tracks[3]]
+    catalog[3] = catalog[3].copy(update={'danceability': 0.5})
+    assert data_processor.update_track_representation_vectors(catalog) == (1, 1, 0)
+    _assert_store_matches(data_processor, catalog)
+    assert data_processor.update_track_representation_vectors(catalog) == (0, 0, 0)
+
+    # the catalog shrinks
+    assert data_processor.update_track_representation_vectors(catalog[1:]) == (0, 0, 1)
+    _assert_store_matches(data_processor, catalog[1:])
+
+    # new default block weights: only stored with the vectors
+    data_processor._genre_weight = 3
+    assert data_processor.update_track_representation_vectors(catalog[1:]) == (0, 0, 0)
+    _assert_store_matches(data_processor, catalog[1:])
+    path = get_settings().track_representation_vectors_stored_path
+    assert RepresentationVectorStore.read_blocks(path) == data_processor.vector_blocks()
+
+
+def _assert_store_matches(data_processor, catalog):
+    store = RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path)
+    expected = {}
+    for track in catalog:
+        vector = data_processor.create_track_representation_vector(track)
+        if vector is not None:
+            expected[track.id] = vector
+    assert sorted(store.keys()) == sorted(expected.keys())
+    for track_id, vector in expected.items():
+        np.testing.assert_array_equal(store[track_id], vector)
+
+
+def test_float32_vectors(environment, monkeypatch):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    tracks = _tracks()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    data_processor.construct_track_representation_vectors(tracks)
+    float64_store = RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path)
+    float64_matrix = np.array(float64_store.matrix)
+
+    monkeypatch.setenv('track_representation_vectors_dtype', 'float32')
+    get_settings.cache_clear()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+
+    # stored in another dtype: rebuilt as a whole
+    assert data_processor.update_track_representation_vectors(tracks) == (0, len(float64_matrix), 0)
+    store = RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path)
+    assert store.matrix.dtype == np.float32
+    # computed in float64, rounded once
+    np.testing.assert_array_equal(store.matrix, float64_matrix.astype(np.float32))
+    _assert_store_matches(data_processor, tracks)
+
+    assert float64_store.astype('float32').matrix.dtype == np.float32
+    assert store.astype('float32') is store
+
+
+def test_artist_embedding_table(environment, monkeypatch):
+    from recommender_system.data_engineering.artist_embeddings import ArtistEmbeddingTable
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    tracks = _tracks()
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    expected = {track.id: data_processor.create_track_representation_vector(track) for track in tracks}
+
+    # a4 is missing from the model, a5 has no embedded genre
+    artists = {
+        f"a{i}": Artist(id=f"a{i}", name=f"Artist {i}", popularity=1, genres=[GENRES[i % 3]] if i < 5 else ['polka'])
+            for i in range(6)
+    }
+    monkeypatch.setenv('artist_embedding_table', str(environment / 'artist_embeddings'))
+    get_settings.cache_clear()
+    assert DataProcessor().export_artist_embeddings(artists, n_neighbors=2) == (4, 1)
+
+    table = RepresentationVectorStore.open(str(environment / 'artist_embeddings'))
+    assert isinstance(table.matrix, np.memmap)
+    assert table.keys() == ['a0', 'a1', 'a2', 'a3', 'a4']
+    np.testing.assert_allclose(np.linalg.norm(table.matrix, axis=1), 1, rtol=1e-6)
+    assert RepresentationVectorStore.read_meta(str(environment / 'artist_embeddings'))[ArtistEmbeddingTable.FALLBACK_ROWS] == 1
+
+    data_processor = DataProcessor()
+    data_processor.fit_normalizer(tracks)
+    fallback_vectors = 0
+    for track in tracks:
+        vector = data_processor.create_track_representation_vector(track)
+        if track.id_artists and track.id_artists[0].strip() == 'a4':
+            # processed with the fallback of its artist
+            assert expected[track.id] is None
+            fallback_vectors += vector is not None
+        elif expected[track.id] is None:
+            assert vector is None
+        else:
+            np.testing.assert_array_equal(vector, expected[track.id])
+    assert fallback_vectors > 0
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from datetime import datetime
+from types import SimpleNamespace
+
+from common.database.vector_store import RepresentationVectorStore
+from common.database.write_back_log import WriteBackLog
+from common.domain.models import Track, Artist
+from recommender_system.data_engineering.data_provider import DataProvider
+from recommender_system.data_engineering.runtime_cache import RuntimeCache
+
+
+def _track(track_id: str) -> Track:
+    return Track(
+        id=track_id, name='Glue', release_date=datetime(2017, 9, 1), track_age=6, key=5, popularity=61,
+        danceability=0.618, tempo=129.981, valence=0.107, energy=0.774, loudness=-8.471, speechiness=0.0383,
+        acousticness=0.0193, instrumentalness=0.894, liveness=0.11, artist_mean_popularity=60,
+        artist_max_popularity=60, genres=['house'], id_artists=['a1'], name_artists=['Bicep']
+    )
+
+
+@pytest.fixture
+def catalog_service(tmp_path, clock):
+    """No catalog track or vector: tracks are fetched (artist a1) and vectors computed (none, e.g
+    an artist without embedding) into runtime caches of one entry, logged to a write-back log"""
+    artists = {}
+    log = WriteBackLog(str(tmp_path / 'write_back.log'))
+    db = SimpleNamespace(
+        get_tracks=dict,
+        get_artists=lambda: artists,
+        get_track_representation_vectors=lambda: RepresentationVectorStore(ids=[], matrix=np.empty((0, 4))),
+        get_write_back_log=lambda: log
+    )
+    spotify_web_api = SimpleNamespace(
+        get_enhanced_track=lambda track_id: SimpleNamespace(id=track_id, artists=[SimpleNamespace(id='a1')]),
+        get_artists=lambda artist_ids: [SimpleNamespace(id=artist_id) for artist_id in artist_ids]
+    )
+    data_processor = SimpleNamespace(create_track_representation_vector=lambda track: None)
+    runtime_tracks = RuntimeCache(max_size=1)
+    runtime_vectors = RuntimeCache(max_size=1, negative_ttl=600, clock=clock)
+    return SimpleNamespace(
+        require=lambda capabilities: None,
+        db=lambda: db,
+        runtime_tracks=lambda: runtime_tracks,
+        runtime_track_representation_vectors=lambda: runtime_vectors,
+        data_processor=lambda: data_processor,
+        spotify_web_api=lambda: spotify_web_api
+    )
+
+
+def test_evicted_and_expired_entries_are_logged_once(catalog_service, monkeypatch, clock):
+    monkeypatch.setattr(
+        'recommender_system.data_engineering.data_provider.TrackConversionInterface.convert_dto_to_domain',
+        lambda track: _track(track.id)
+    )
+    monkeypatch.setattr(
+        'recommender_system.data_engineering.data_provider.ArtistConversionInterface.convert_dto_to_domain',
+        lambda artist: Artist(id=artist.id, name='Bicep', popularity=60, genres=['house'])
+    )
+    log = catalog_service.db().get_write_back_log()
+    data_provider = DataProvider(catalog_service=catalog_service)
+
+    for _ in range(3):
+        # t1 is evicted by t2, then fetched again
+        for track_id in ['t1', 't2']:
+            track = data_provider.get_track(track_id)
+            assert data_provider.get_track_representation_vector(track) is None
+        # the negative vectors expire and are computed again
+        clock.now += 601
+
+    log.close()
+    tracks, artists, vectors = WriteBackLog(log.path).load()
+    assert list(tracks) == ['t1', 't2'] and vectors == {'t1': None, 't2': None}
+    # the artist of the tracks, so their genres resolve once compacted
+    assert list(artists) == ['a1']
+    assert len(list(WriteBackLog(log.path)._scan())) == 5
+    assert data_provider._runtime_track_representation_vectors.statistics()['evictions'] > 0
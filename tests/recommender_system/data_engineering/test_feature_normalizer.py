@@ -0,0 +1,24 @@
+import numpy as np
+
+from sklearn.preprocessing import MinMaxScaler
+
+from recommender_system.data_engineering.feature_normalizer import FeatureNormalizer
+
+
+def test_same_as_one_min_max_scaler_per_feature():
+    rng = np.random.default_rng(3)
+    matrix = rng.normal(size=(200, 4)) * [1, 100, 1e-3, 5]
+    matrix[:, 3] = 7.0
+    matrix[5, 0] = np.nan
+
+    normalizer = FeatureNormalizer(['a', 'b', 'c', 'd']).fit(matrix)
+    expected = np.column_stack([
+        MinMaxScaler().fit(matrix[:, [i]]).transform(matrix[:, [i]])[:, 0] for i in range(4)
+    ])
+
+    np.testing.assert_array_equal(normalizer.transform(matrix), expected)
+    np.testing.assert_array_equal(normalizer.transform_row(matrix[17]), expected[17])
+
+    # restored from the stored range
+    restored = FeatureNormalizer(['a', 'b', 'c', 'd']).set_range(normalizer.data_min, normalizer.data_max)
+    np.testing.assert_array_equal(restored.transform(matrix), expected)
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from datetime import datetime
+
+from settings import get_settings
+from common import utils
+from common.converters.interfaces import TrackConversionInterface
+from common.data_transfer.models import EnhancedTrack
+from common.database.catalog_snapshot import CatalogSnapshot
+from common.database.mongo_db import MongoDatabase
+from common.database.mongo_export import MongoSnapshotExporter
+from common.database.vector_store import RepresentationVectorStore
+from common.domain.models import Artist
+
+mongomock = pytest.importorskip('mongomock')
+# embeddings of the artists inserted after the export as well
+pytestmark = pytest.mark.parametrize('environment', [6], indirect=True)
+
+
+GENRES = ['house', 'techno', 'indie rock']
+
+
+def _artist(i: int, **fields):
+    return {
+        'id': f"a{i}", 'name': f"Artist {i}", 'href': '', 'type': 'artist', 'uri': '',
+        'genres': [GENRES[i % 3]], 'popularity': 10.0 * i, **fields
+    }
+
+
+def _track(i: int, **fields):
+    artists = [_artist(i % 4, genres=None, popularity=None)]
+    return {
+        'id': f"t{i}", 'name': f"Track {i}", 'popularity': float(i), 'href': '', 'available_markets': [],
+        'disc_number': 1, 'duration_ms': 1000 * i, 'uri': '', 'type': 'track', 'artists': artists,
+        'album': {
+            'id': f"al{i}", 'album_type': 'album', 'artists': artists, 'name': '', 'available_markets': [],
+            'release_date': datetime(1990 + i, 1, 1), 'release_date_precision': 'day', 'total_tracks': 1, 'uri': ''
+        },
+        'audio_features': dict(
+            danceability=0.1 * (i % 10), energy=0.5, key=i % 12, loudness=-float(i), mode=1, speechiness=0.1,
+            acousticness=0.2, instrumentalness=0.0, liveness=0.3, valence=0.05 * (i % 20), tempo=90.0 + i,
+            duration_ms=1000 * i, time_signature=4
+        ),
+        **fields
+    }
+
+
+def _domain_track(document, artists):
+    track = EnhancedTrack(**document)
+    track.artists = [artists[artist.id] for artist in track.artists]
+    return TrackConversionInterface.convert_dto_to_domain(track)
+
+
+def _exported_catalog(environment):
+    """Mongo catalog exported to a snapshot with its vectors and normalizer, then 4 tracks and 2 artists inserted"""
+    from recommender_system.data_engineering.data_processing import DataProcessor
+
+    db = MongoDatabase(client=mongomock.MongoClient())
+    db.collection_artists.insert_many([_artist(i) for i in range(4)])
+    db.collection_tracks.insert_many([_track(i) for i in range(10)])
+    artists = {f"a{i}": Artist(**_artist(i)) for i in range(6)}
+
+    snapshot = CatalogSnapshot(str(environment / 'snapshot'))
+    MongoSnapshotExporter(db, snapshot, lag=0).export()
+
+    # catalog vectors, normalizer stored for the snapshot
+    data_processor = DataProcessor()
+    catalog = [_domain_track(_track(i), artists) for i in range(10)]
+    data_processor.fit_normalizer(catalog)
+    RepresentationVectorStore.write(
+        path=get_settings().track_representation_vectors_stored_path,
+        ids=[track.id for track in catalog],
+        matrix=np.array([data_processor.create_track_representation_vector(track) for track in catalog])
+    )
+    data_processor.save_normalizer(fingerprint=utils.files_fingerprint(snapshot.manifest_files()))
+
+    # inserted after the export: at or past its watermark
+    inserted_at = MongoSnapshotExporter.load_watermark(snapshot)
+    db.collection_artists.insert_many([_artist(i, inserted_at=inserted_at) for i in (4, 5)])
+    db.collection_tracks.insert_many([_track(i, inserted_at=inserted_at) for i in range(10, 14)])
+    return db, snapshot, data_processor, artists
+
+
+def test_delta_sync(environment):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+    from recommender_system.data_engineering.mongo_sync import MongoDeltaSync
+
+    db, snapshot, data_processor, artists = _exported_catalog(environment)
+
+    sync = MongoDeltaSync(db, snapshot, lag=0)
+    assert sync.sync() == (4, 2, 4)
+    assert sync.sync() == (0, 0, 0)
+
+    store = RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path)
+    assert store.keys() == [f"t{i}" for i in range(14)]
+    # same vector as a runtime track, normalized with the catalog normalizer
+    expected = data_processor.create_track_representation_vector(_domain_track(_track(12), artists))
+    np.testing.assert_allclose(store['t12'], expected)
+
+    assert snapshot.read_tracks(columns=['id'])['id'].to_list() == [f"t{i}" for i in range(14)]
+    assert snapshot.read_artists(columns=['id'])['id'].to_list() == [f"a{i}" for i in range(6)]
+    # the stored normalizer follows the new catalog fingerprint
+    assert DataProcessor().load_normalizer(fingerprint=sync._catalog_fingerprint())
+
+
+def test_sync_interrupted_after_the_snapshot_runs_again(environment, monkeypatch):
+    from recommender_system.data_engineering.data_processing import DataProcessor
+    from recommender_system.data_engineering.mongo_sync import MongoDeltaSync
+
+    db, snapshot, _, _ = _exported_catalog(environment)
+
+    def crash(self, fingerprint, path=None):
+        raise KeyboardInterrupt()
+
+    # stopped once the snapshot is appended, before the normalizer is stored for it
+    with monkeypatch.context() as patch:
+        patch.setattr(DataProcessor, 'save_normalizer', crash)
+        with pytest.raises(KeyboardInterrupt):
+            MongoDeltaSync(db, snapshot, lag=0).sync()
+    assert len(snapshot.read_tracks(columns=['id'])) == 14
+
+    # the delta is already in the snapshot, the sync completes
+    sync = MongoDeltaSync(db, snapshot, lag=0)
+    assert sync.sync() == (0, 0, 0)
+    assert DataProcessor().load_normalizer(fingerprint=sync._catalog_fingerprint())
+    assert RepresentationVectorStore.open(get_settings().track_representation_vectors_stored_path).keys() == [f"t{i}" for i in range(14)]
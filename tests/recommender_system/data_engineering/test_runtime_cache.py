@@ -0,0 +1,42 @@
+import numpy as np
+
+from recommender_system.data_engineering.runtime_cache import RuntimeCache
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RuntimeCache(max_size=2)
+    cache['t1'] = np.ones(3)
+    cache['t2'] = np.zeros(3)
+
+    # t1 is used again, t2 is the least recently used one
+    assert cache.get('t1') is not RuntimeCache.MISSING
+    cache['t3'] = np.ones(3)
+
+    assert 't2' not in cache and 't1' in cache and 't3' in cache
+    assert cache.get('t2') is RuntimeCache.MISSING
+    assert cache.statistics() == {
+        'size': 2, 'max_size': 2, 'hits': 1, 'negative_hits': 0, 'misses': 1, 'evictions': 1, 'expirations': 0
+    }
+
+
+def test_negative_entries_expire(clock):
+    cache = RuntimeCache(max_size=10, negative_ttl=60, clock=clock)
+    cache['unvectorizable'] = None
+    cache['track'] = np.ones(3)
+
+    clock.now = 59
+    assert cache.get('unvectorizable') is None
+
+    # only negative entries expire
+    clock.now = 60
+    assert 'unvectorizable' not in cache
+    assert cache.get('unvectorizable') is RuntimeCache.MISSING
+    assert cache.get('track') is not RuntimeCache.MISSING
+
+    statistics = cache.statistics()
+    assert (statistics['negative_hits'], statistics['expirations'], statistics['size']) == (1, 1, 1)
+
+    # no negative caching at all
+    cache = RuntimeCache(max_size=10, negative_ttl=0)
+    cache['unvectorizable'] = None
+    assert len(cache) == 0
@@ -0,0 +1,130 @@
+import threading
+import numpy as np
+import pytest
+
+from pydantic import ValidationError
+
+from common.data_transfer.models import SessionSettings
+from common.database.vector_store import RepresentationVectorStore
+from common.domain.genre_vocabulary import GenreVocabulary
+from common.domain.models import VectorBlock
+from recommender_system.algorithm.nn_recommender import NearestNeighborsRecommender
+from recommender_system.data_engineering.catalog_service import CatalogService
+from recommender_system.musicos import MusicOs
+
+
+class _Db:
+    """Catalog loaded from one source file, with vectors of two blocks"""
+
+    def __init__(self, source_path: str):
+        self._source_path = source_path
+
+
+    def get_source_files(self):
+        return [self._source_path]
+
+
+    def get_genre_vocabulary(self) -> GenreVocabulary:
+        return GenreVocabulary()
+
+
+    def get_track_representation_vectors(self) -> RepresentationVectorStore:
+        return RepresentationVectorStore(ids=['t1', 't2'], matrix=np.eye(2, 4), blocks=[
+            VectorBlock(name='audio_features', start=0, stop=2, weight=1),
+            VectorBlock(name='genres', start=2, stop=4, weight=1)
+        ])
+
+
+class _CatalogService:
+
+    def __init__(self, source_path: str):
+        self._db = _Db(source_path)
+
+
+    def require(self, capabilities):
+        return self
+
+
+    def db(self) -> _Db:
+        return self._db
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # the process catalog service replaced by a reload is restored after the test
+    monkeypatch.setattr(CatalogService, '_instance', None)
+    source_path = tmp_path / 'tracks.csv'
+    source_path.write_text('v1')
+    return source_path
+
+
+def _music_os(sources, builds: list, fail: threading.Event, rebuilt: threading.Event = None) -> MusicOs:
+    def build_recommender(catalog_service=None):
+        builds.append(sources.read_text())
+        if rebuilt is not None and len(builds) > 1:
+            rebuilt.set()
+        if fail.is_set():
+            raise OSError("matrix.bin is truncated")
+        return NearestNeighborsRecommender(catalog_service=catalog_service)
+
+    return MusicOs(
+        catalog_service=_CatalogService(str(sources)),
+        catalog_service_factory=lambda: _CatalogService(str(sources)),
+        recommender_factory=build_recommender,
+        spotify_web_api=object()
+    )
+
+
+def test_reload_swaps_the_recommender_and_keeps_the_session(sources):
+    builds = []
+    music_os = _music_os(sources, builds, threading.Event())
+    session, recommender = music_os._session, music_os.recommender
+
+    sources.write_text('v2 rebuilt')
+    assert music_os.sources_changed()
+    assert music_os.reload(wait=True)
+
+    assert music_os.get_reload_status() == {'generation': 2, 'reloading': False, 'error': None}
+    assert music_os.recommender is not recommender
+    assert music_os._session is session
+    assert builds == ['v1', 'v2 rebuilt']
+    assert not music_os.sources_changed()
+
+
+def test_failed_reload_keeps_the_generation_and_is_not_retried(sources):
+    builds, fail, rebuilt = [], threading.Event(), threading.Event()
+    music_os = _music_os(sources, builds, fail, rebuilt)
+    recommender = music_os.recommender
+
+    fail.set()
+    sources.write_text('v2 truncated')
+    music_os.watch_sources(interval=0.001)
+    try:
+        # the watcher reloads once the files changed
+        assert rebuilt.wait(timeout=10)
+    finally:
+        # returns once the reload of the watcher is done
+        music_os.stop_watching()
+
+    status = music_os.get_reload_status()
+    assert status['generation'] == 1 and 'truncated' in status['error']
+    assert music_os.recommender is recommender
+    # one attempt for the changed files, not one per interval
+    assert builds == ['v1', 'v2 truncated']
+    assert not music_os.sources_changed()
+
+    sources.write_text('v3 fixed')
+    assert music_os.sources_changed()
+
+
+def test_session_settings_are_checked_against_the_vectors(sources):
+    music_os = _music_os(sources, [], threading.Event())
+
+    assert music_os.check_session_settings(None) is None
+    assert music_os.check_session_settings(SessionSettings(block_weights={'audio_features': 0.5})) is None
+    assert 'artist' in music_os.check_session_settings(SessionSettings(block_weights={'artist': 1}))
+
+    with pytest.raises(ValidationError):
+        SessionSettings(block_weights={'genres': -1})
+    with pytest.raises(ValidationError):
+        SessionSettings(block_weights={'genres': float('nan')})